@@ -1,16 +1,220 @@
+import csv
+
 from django.contrib import admin
-from .models import FarmInput, Recommendation
+from django.core.paginator import Paginator
+from django.core.exceptions import PermissionDenied
+from django.db import connection
+from django.db.models import F, FloatField, Max, Sum
+from django.http import StreamingHttpResponse
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils.functional import cached_property
+
+from .models import DistrictSummary, DistrictWeather, FarmInput, InputAnomaly, Recommendation, UserSummary
+from .summaries import refresh_district_summaries
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that never runs COUNT(*) over a whole large table"""
+
+    # Filtered lists count at most this many rows
+    count_cap = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = self._estimate_table_rows(queryset.model)
+            if estimate is not None:
+                return estimate
+        return queryset.order_by().values('pk')[:self.count_cap].count()
+
+    def _estimate_table_rows(self, model):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table])
+                row = cursor.fetchone()
+            # reltuples is -1 (or 0 on older versions) until the table has been analyzed
+            if row and row[0] > 0:
+                return row[0]
+        # Highest primary key: an index lookup, and an upper bound on the row count
+        return model.objects.aggregate(max_pk=Max('pk'))['max_pk'] or 0
+
+
+class Echo:
+    """File-like object whose write() hands the line straight back, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(filename, header, rows):
+    """Stream rows as a CSV download without building the file in memory"""
+    writer = csv.writer(Echo())
+
+    def generate():
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(generate(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+class StreamingExportMixin:
+    """Admin action that streams the selected rows (or the whole filtered list) as CSV"""
+    export_fields = []
+    export_filename = 'export.csv'
+    actions = ['export_csv']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @admin.action(description="Export selected rows to CSV")
+    def export_csv(self, request, queryset):
+        rows = queryset.order_by('pk').values_list(*self.export_fields).iterator(chunk_size=2000)
+        return stream_csv(self.export_filename, self.export_fields, rows)
+
 
 @admin.register(FarmInput)
-class FarmInputAdmin(admin.ModelAdmin):
+class FarmInputAdmin(StreamingExportMixin, admin.ModelAdmin):
     list_display = ['district', 'crop', 'season', 'field_area', 'irrigation', 'created_at']
     list_filter = ['district', 'crop', 'season', 'irrigation', 'soil_type']
     search_fields = ['district', 'crop']
     date_hierarchy = 'created_at'
+    export_filename = 'farm_inputs.csv'
+    export_fields = [
+        'id', 'district', 'crop', 'season', 'sowing_date', 'field_area', 'irrigation',
+        'soil_type', 'soil_health_card', 'seed_variety', 'pest_presence', 'created_at',
+    ]
 
 @admin.register(Recommendation)
-class RecommendationAdmin(admin.ModelAdmin):
+class RecommendationAdmin(StreamingExportMixin, admin.ModelAdmin):
     list_display = ['farm_input', 'predicted_yield', 'estimated_gain', 'created_at']
     list_filter = ['farm_input__district', 'farm_input__crop', 'created_at']
+    list_select_related = ['farm_input']
     search_fields = ['farm_input__district', 'farm_input__crop']
-    date_hierarchy = 'created_at'
\ No newline at end of file
+    date_hierarchy = 'created_at'
+    export_filename = 'recommendations.csv'
+    export_fields = [
+        'id', 'farm_input_id', 'farm_input__district', 'farm_input__crop', 'farm_input__season',
+        'predicted_yield', 'confidence_interval', 'estimated_gain', 'action_1', 'action_2',
+        'action_3', 'created_at',
+    ]
+
+@admin.register(DistrictSummary)
+class DistrictSummaryAdmin(StreamingExportMixin, admin.ModelAdmin):
+    list_display = [
+        'district', 'crop', 'season', 'submissions', 'total_area', 'avg_predicted_yield',
+        'avg_estimated_gain', 'last_submission', 'updated_at',
+    ]
+    list_filter = ['district', 'crop', 'season']
+    ordering = ['district', 'crop', 'season']
+    actions = ['export_csv', 'refresh_summaries']
+    export_filename = 'district_summaries.csv'
+    export_fields = [
+        'district', 'crop', 'season', 'submissions', 'total_area', 'avg_predicted_yield',
+        'avg_estimated_gain', 'first_submission', 'last_submission', 'updated_at',
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.action(description="Recompute all summaries now")
+    def refresh_summaries(self, request, queryset):
+        count = refresh_district_summaries()
+        self.message_user(request, f"Refreshed {count} district summaries.")
+
+    def get_urls(self):
+        urls = [
+            path('report/', self.admin_site.admin_view(self.report_view), name='advisory_districtsummary_report'),
+        ]
+        return urls + super().get_urls()
+
+    def report_view(self, request):
+        """Per-district totals, read from the precomputed summaries only"""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        districts = (
+            DistrictSummary.objects
+            .values('district')
+            .annotate(
+                district_submissions=Sum('submissions'),
+                district_area=Sum('total_area'),
+                weighted_yield=Sum(F('avg_predicted_yield') * F('submissions'), output_field=FloatField()),
+                weighted_gain=Sum(F('avg_estimated_gain') * F('submissions'), output_field=FloatField()),
+                latest_submission=Max('last_submission'),
+                latest_update=Max('updated_at'),
+            )
+            .order_by('district')
+        )
+        names = dict(FarmInput.DISTRICT_CHOICES)
+        rows = []
+        for row in districts:
+            submissions = row['district_submissions'] or 0
+            rows.append({
+                'district': names.get(row['district'], row['district']),
+                'submissions': submissions,
+                'total_area': row['district_area'],
+                'avg_predicted_yield': row['weighted_yield'] / submissions if submissions else 0,
+                'avg_estimated_gain': row['weighted_gain'] / submissions if submissions else 0,
+                'last_submission': row['latest_submission'],
+                'updated_at': row['latest_update'],
+            })
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'District report',
+            'opts': self.model._meta,
+            'rows': rows,
+            'total_submissions': sum(row['submissions'] for row in rows),
+        }
+        return TemplateResponse(request, 'admin/advisory/districtsummary/report.html', context)
+
+@admin.register(UserSummary)
+class UserSummaryAdmin(admin.ModelAdmin):
+    list_display = ['user', 'submissions', 'total_area', 'avg_predicted_yield', 'best_season', 'last_submission']
+    list_select_related = ['user']
+    search_fields = ['user__username']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(DistrictWeather)
+class DistrictWeatherAdmin(admin.ModelAdmin):
+    list_display = ['district', 'fetched_at', 'temperature', 'rain_5d', 'rainy_days', 'hot_days', 'humidity_mean_5d']
+    ordering = ['district']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(InputAnomaly)
+class InputAnomalyAdmin(StreamingExportMixin, admin.ModelAdmin):
+    list_display = ['farm_input', 'field', 'message', 'reviewed', 'created_at']
+    list_filter = ['reviewed', 'field', 'farm_input__district', 'farm_input__crop']
+    list_select_related = ['farm_input']
+    date_hierarchy = 'created_at'
+    readonly_fields = ['farm_input', 'field', 'message', 'created_at']
+    actions = ['mark_reviewed', 'export_csv']
+    export_filename = 'input_anomalies.csv'
+    export_fields = [
+        'id', 'farm_input_id', 'field', 'message', 'farm_input__district', 'farm_input__crop',
+        'farm_input__season', 'farm_input__field_area', 'reviewed', 'created_at',
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description="Mark selected anomalies as reviewed")
+    def mark_reviewed(self, request, queryset):
+        updated = queryset.update(reviewed=True)
+        self.message_user(request, f"Marked {updated} anomalies as reviewed.")
@@ -0,0 +1,141 @@
+"""
+"Farms like yours": nearest historical rows from combined_tables.txt.
+
+Rows are partitioned by (crop, season) and each partition keeps a matrix of
+normalized feature vectors: one-hot district and practices (irrigation, seed,
+soil) plus standardized field area and rainfall. A partition holds a few
+hundred rows, so an exact NumPy scan is as fast as a tree and keeps sklearn
+out of the serving process. The index is built once per worker process on
+first use.
+"""
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+from .features import category_values
+from .ml_model import yield_predictor
+
+# Relative importance of each block of the feature vector. A one-hot mismatch
+# adds 2 * weight**2 to the squared distance; numeric features are z-scores.
+DISTRICT_WEIGHT = 1.0
+PRACTICE_WEIGHT = 0.7
+NUMERIC_WEIGHT = 0.5
+
+CATEGORICAL_FIELDS = [
+    ('district', DISTRICT_WEIGHT),
+    ('irrigation', PRACTICE_WEIGHT),
+    ('seed_variety', PRACTICE_WEIGHT),
+    ('soil_type', PRACTICE_WEIGHT),
+]
+NUMERIC_FIELDS = ['field_area', 'rainfall']
+
+CATEGORY_POSITIONS = {
+    field: {value: i for i, value in enumerate(category_values(field))}
+    for field, _ in CATEGORICAL_FIELDS
+}
+
+
+class _Partition:
+    def __init__(self, rows):
+        self.rows = rows
+        numeric = np.array([[row[field] for field in NUMERIC_FIELDS] for row in rows], dtype=float)
+        self.mean = numeric.mean(axis=0)
+        self.std = numeric.std(axis=0)
+        self.std[self.std == 0] = 1.0
+        self.matrix = self.vectors(rows)
+        self.norms = (self.matrix ** 2).sum(axis=1)
+
+    def vectors(self, items):
+        """Feature vectors for history rows or query dicts"""
+        blocks = []
+        for field, weight in CATEGORICAL_FIELDS:
+            position = CATEGORY_POSITIONS[field]
+            block = np.zeros((len(items), len(position)))
+            for i, item in enumerate(items):
+                j = position.get(item[field])
+                if j is not None:
+                    block[i, j] = weight
+            blocks.append(block)
+        numeric = np.array([[item[field] for field in NUMERIC_FIELDS] for item in items], dtype=float)
+        blocks.append((numeric - self.mean) / self.std * NUMERIC_WEIGHT)
+        return np.hstack(blocks)
+
+    def nearest(self, vectors, k):
+        """(distances, row indices) of the k closest rows to each vector, closest first"""
+        k = min(k, len(self.rows))
+        squared = self.norms + (vectors ** 2).sum(axis=1)[:, None] - 2 * vectors @ self.matrix.T
+        candidates = np.argpartition(squared, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(squared, candidates, axis=1).argsort(axis=1, kind='stable')
+        indices = np.take_along_axis(candidates, order, axis=1)
+        distances = np.sqrt(np.maximum(np.take_along_axis(squared, indices, axis=1), 0))
+        return distances, indices
+
+
+class AnalogIndex:
+    """k-nearest historical farms, searched within the farm's (crop, season)"""
+
+    def __init__(self, rows):
+        partitions = defaultdict(list)
+        rainfall = defaultdict(list)
+        for row in rows:
+            partitions[(row['crop'], row['season'])].append(row)
+            rainfall[(row['district'], row['season'])].append(row['rainfall'])
+        self.partitions = {key: _Partition(part) for key, part in partitions.items()}
+        # The form does not ask for rainfall; use the district's seasonal mean
+        self.typical_rainfall = {key: float(np.mean(values)) for key, values in rainfall.items()}
+        self.season_rainfall = {}
+        for (district, season), values in rainfall.items():
+            self.season_rainfall.setdefault(season, []).extend(values)
+        self.season_rainfall = {season: float(np.mean(values)) for season, values in self.season_rainfall.items()}
+
+    def _query_dict(self, farm_input):
+        get = farm_input.get if isinstance(farm_input, dict) else lambda key: getattr(farm_input, key, None)
+        query = {field: get(field) for field, _ in CATEGORICAL_FIELDS}
+        query['field_area'] = float(get('field_area') or 0)
+        rainfall = get('rainfall')
+        if rainfall is None:
+            rainfall = self.typical_rainfall.get(
+                (query['district'], get('season')), self.season_rainfall.get(get('season'), 0.0)
+            )
+        query['rainfall'] = float(rainfall)
+        return (get('crop'), get('season')), query
+
+    def query(self, farm_input, k=5):
+        """The k closest historical rows for one farm"""
+        return self.query_batch([farm_input], k)[0]
+
+    def query_batch(self, farm_inputs, k=5):
+        """Nearest rows for many farms, with one distance matrix per (crop, season) partition"""
+        results = [[] for _ in farm_inputs]
+        grouped = defaultdict(list)
+        for i, farm_input in enumerate(farm_inputs):
+            key, query = self._query_dict(farm_input)
+            grouped[key].append((i, query))
+
+        for key, items in grouped.items():
+            partition = self.partitions.get(key)
+            if partition is None:
+                continue
+            vectors = partition.vectors([query for _, query in items])
+            distances, indices = partition.nearest(vectors, k)
+            for (i, _), row_distances, row_indices in zip(items, distances, indices):
+                results[i] = [
+                    {**partition.rows[j], 'distance': float(d)}
+                    for d, j in zip(row_distances, row_indices)
+                ]
+        return results
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_analog_index():
+    """The process-wide index, built from the history on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = AnalogIndex(yield_predictor.load_data())
+    return _index
@@ -0,0 +1,181 @@
+"""
+Flag farm inputs that look nothing like the historical records in combined_tables.txt.
+
+The history is reduced once per worker process to dense NumPy tables indexed
+by category code:
+
+- row counts per (district, crop, season): combinations never recorded are
+  flagged
+- frequency tables of soil type per district and irrigation per (crop,
+  season): values making up under RARE_SHARE of their group are flagged
+- field-area histograms on a log scale per (district, crop, season), pooled
+  to (crop, season), then crop, then everything while a level has fewer than
+  MIN_HISTOGRAM_ROWS rows: an area whose bin and neighbouring bins are all
+  empty is flagged (usually a typo such as 150 for 1.50 ha). Smallholdings
+  are common even where the records hold none, so areas from SMALL_PLOT_HA up
+  to the largest recorded are never flagged
+
+Each check is one array lookup, so a batch of inputs is checked with a few
+vectorized gathers (`check_batch`).
+"""
+import math
+import threading
+
+import numpy as np
+
+from .features import category_values
+from .ml_model import yield_predictor
+from .models import FarmInput, InputAnomaly
+from .throttling import metrics
+
+# Field-area histogram bins: BINS_PER_DECADE per factor of 10 from AREA_RANGE[0]
+# to AREA_RANGE[1] hectares; areas outside fall in the first or last bin
+AREA_RANGE = (0.01, 1000)
+BINS_PER_DECADE = 4
+# Empty bins this close to a recorded area still count as plausible
+NEIGHBOUR_BINS = 1
+MIN_HISTOGRAM_ROWS = 30
+# Smaller areas are flagged unless recorded; most are typos (0.01 for 1.0 ha)
+SMALL_PLOT_HA = 0.05
+
+# Flags on these fields become form errors with REJECT_INPUT_ANOMALIES
+REJECTED_FIELDS = ('field_area',)
+
+RARE_SHARE = 0.02
+# Groups with fewer rows than this are too small to call a value rare
+MIN_GROUP_ROWS = 30
+
+# Field -> the fields its frequency table is grouped by
+FREQUENCY_TABLES = {
+    'soil_type': ('district',),
+    'irrigation': ('crop', 'season'),
+}
+
+N_BINS = int(round(math.log10(AREA_RANGE[1] / AREA_RANGE[0]) * BINS_PER_DECADE))
+
+
+def area_bins(areas):
+    """Histogram bin of each field area"""
+    areas = np.asarray(areas, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bins = np.floor(np.log10(areas / AREA_RANGE[0]) * BINS_PER_DECADE)
+    return np.clip(np.nan_to_num(bins, nan=0, neginf=0), 0, N_BINS - 1).astype(np.int64)
+
+
+def _get(row, field):
+    return row.get(field) if isinstance(row, dict) else getattr(row, field, None)
+
+
+class InputProfile:
+    """Precomputed histograms and frequency tables of the historical inputs"""
+
+    def __init__(self, rows):
+        self.values = {
+            field: category_values(field)
+            for field in ('district', 'crop', 'season', *FREQUENCY_TABLES)
+        }
+        self.positions = {field: {value: i for i, value in enumerate(values)} for field, values in self.values.items()}
+        rows = [row for row in rows if all(_get(row, field) in self.positions[field] for field in self.positions)]
+        codes = {field: self._codes(rows, field) for field in self.positions}
+        shape = tuple(len(self.values[field]) for field in ('district', 'crop', 'season'))
+
+        self.combination_counts = np.zeros(shape, dtype=np.int64)
+        np.add.at(self.combination_counts, (codes['district'], codes['crop'], codes['season']), 1)
+
+        self.frequencies = {}
+        for field, groups in FREQUENCY_TABLES.items():
+            counts = np.zeros(tuple(len(self.values[g]) for g in groups) + (len(self.values[field]),), dtype=np.int64)
+            np.add.at(counts, tuple(codes[g] for g in groups) + (codes[field],), 1)
+            totals = counts.sum(axis=-1, keepdims=True)
+            # Rare only when the group has enough rows to tell
+            self.frequencies[field] = (counts < RARE_SHARE * totals) & (totals >= MIN_GROUP_ROWS)
+
+        # Histograms at each pooling level, broadcast back to (district, crop, season)
+        histogram = np.zeros(shape + (N_BINS,), dtype=np.int64)
+        np.add.at(histogram, (codes['district'], codes['crop'], codes['season'], area_bins([row['field_area'] for row in rows])), 1)
+        chosen = histogram
+        for axes in ((0,), (0, 2), (0, 1, 2)):
+            pooled = np.broadcast_to(histogram.sum(axis=axes, keepdims=True), histogram.shape)
+            chosen = np.where(chosen.sum(axis=-1, keepdims=True) >= MIN_HISTOGRAM_ROWS, chosen, pooled)
+        seen = chosen > 0
+        plausible = seen.copy()
+        for shift in range(1, NEIGHBOUR_BINS + 1):
+            plausible[..., shift:] |= seen[..., :-shift]
+            plausible[..., :-shift] |= seen[..., shift:]
+        self.plausible_areas = plausible
+        # Highest plausible bin per (district, crop, season); -1 where nothing was recorded
+        self.largest_bins = np.where(plausible.any(axis=-1), N_BINS - 1 - plausible[..., ::-1].argmax(axis=-1), -1)
+
+    def _codes(self, rows, field):
+        position = self.positions[field]
+        return np.array([position[_get(row, field)] for row in rows], dtype=np.int64)
+
+    def check_batch(self, farm_inputs):
+        """(field, message) flags for each of many inputs (dicts or FarmInput-like objects)"""
+        flags = [[] for _ in farm_inputs]
+        # Values without a category code cannot be looked up; the form rejects them anyway
+        known = [i for i, row in enumerate(farm_inputs) if all(_get(row, field) in self.positions[field] for field in self.positions)]
+        if not known:
+            return flags
+        rows = [farm_inputs[i] for i in known]
+        codes = {field: self._codes(rows, field) for field in self.positions}
+        combination = (codes['district'], codes['crop'], codes['season'])
+
+        unseen = self.combination_counts[combination] == 0
+        rare = {
+            field: self.frequencies[field][tuple(codes[g] for g in groups) + (codes[field],)]
+            for field, groups in FREQUENCY_TABLES.items()
+        }
+        areas = np.array([_get(row, 'field_area') for row in rows], dtype=np.float64)
+        bins = area_bins(areas)
+        small_plot = (areas >= SMALL_PLOT_HA) & (bins <= self.largest_bins[combination])
+        implausible = ~self.plausible_areas[combination + (bins,)] & ~small_plot
+
+        for j, (i, row) in enumerate(zip(known, rows)):
+            where = f"{_display(row, 'crop')} in {_display(row, 'district')} ({_display(row, 'season')})"
+            if unseen[j]:
+                flags[i].append(('combination', f"No records of {where}."))
+            if implausible[j]:
+                flags[i].append(('field_area', f"A field area of {areas[j]:g} ha is far outside the areas recorded for {where}."))
+            for field, groups in FREQUENCY_TABLES.items():
+                if rare[field][j]:
+                    group = ' '.join(_display(row, g) for g in groups)
+                    flags[i].append((field, f"{_display(row, field)} {field.replace('_', ' ')} is rare for {group} in the records."))
+        return flags
+
+    def check(self, farm_input):
+        """(field, message) flags for one input"""
+        return self.check_batch([farm_input])[0]
+
+
+def _display(row, field):
+    """Display value of a categorical field of a dict or FarmInput-like row"""
+    value = _get(row, field)
+    return dict(FarmInput._meta.get_field(field).choices).get(value, value)
+
+
+_profile = None
+_profile_lock = threading.Lock()
+
+
+def get_input_profile():
+    """The InputProfile of the loaded history, built on first use"""
+    global _profile
+    if _profile is None:
+        with _profile_lock:
+            if _profile is None:
+                _profile = InputProfile(yield_predictor.load_data())
+    return _profile
+
+
+def record_anomalies(farm_inputs, flags):
+    """Save the flags of saved farm inputs for review in the admin"""
+    anomalies = [
+        InputAnomaly(farm_input=farm_input, field=field, message=message[:255])
+        for farm_input, input_flags in zip(farm_inputs, flags)
+        for field, message in input_flags
+    ]
+    if anomalies:
+        InputAnomaly.objects.bulk_create(anomalies)
+        metrics.incr('anomalies.flagged', len(anomalies))
+    return anomalies
@@ -0,0 +1,186 @@
+"""
+Async versions of the prediction views for ASGI deployments (ASYNC_VIEWS=true).
+
+Under ASGI, Django runs sync views one at a time on a single shared thread.
+These views keep the event loop free: database work goes through the async
+ORM, the form is validated and saved and the template rendered through
+sync_to_async, predictions run on a bounded thread pool, and the weather API
+calls are made concurrently with httpx.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth import get_user
+from django.contrib.auth.views import redirect_to_login
+from django.db import close_old_connections
+from django.shortcuts import redirect, render
+
+from .anomalies import record_anomalies
+from .forms import FarmInputForm
+from .models import Recommendation
+from .throttling import check_rate_limit, metrics, prediction_flight, prediction_key
+from .views import (
+    _anomaly_warning, _client_id, _daily_forecasts, _predict, _previous_submission, _recommendation_context,
+    _recommendation_fields,
+)
+
+# Model inference and other CPU-bound work; sized so a burst of requests
+# cannot start more inference threads than the worker has cores for
+prediction_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'PREDICTION_WORKERS', 4),
+    thread_name_prefix='prediction',
+)
+
+arender = sync_to_async(render)
+
+
+def _with_db_cleanup(fn, *args):
+    """Call fn on an executor thread, closing the thread's stale database connections around it"""
+    # Predictions can touch the database (district weather rows), and nothing
+    # else closes connections opened on these threads
+    close_old_connections()
+    try:
+        return fn(*args)
+    finally:
+        close_old_connections()
+
+
+async def _run_in_executor(fn, *args):
+    # Unlike loop.run_in_executor, sync_to_async carries the request's context
+    # over to the thread, the active translation included
+    return await sync_to_async(_with_db_cleanup, thread_sensitive=False, executor=prediction_executor)(fn, *args)
+
+
+async def _login_redirect(request):
+    """Redirect to the login page unless the user is signed in (async @login_required)"""
+    # Resolve the lazy request.user here, off the event loop
+    request.user = await sync_to_async(get_user)(request)
+    if not request.user.is_authenticated:
+        return redirect_to_login(request.get_full_path(), '/login/')
+    return None
+
+
+async def farm_input(request):
+    """Farm input form view"""
+    response = await _login_redirect(request)
+    if response:
+        return response
+
+    if request.method == 'POST':
+        form = FarmInputForm(request.POST)
+        if not await sync_to_async(check_rate_limit)(request, 'farm_input'):
+            messages.error(request, "Too many requests. Please wait a minute and try again.")
+            return await arender(request, 'advisory/farm_input.html', {'form': form}, status=429)
+        if await sync_to_async(form.is_valid)():
+            try:
+                # A resubmitted form (retry after a dropped connection) returns the first result
+                client_id = _client_id(request.POST.get('client_id'))
+                previous = await sync_to_async(_previous_submission)(client_id) if client_id else None
+                if previous and previous.user_id != request.user.pk:
+                    # Someone else's client_id; save this one without it
+                    client_id = previous = None
+                elif previous and hasattr(previous, 'recommendation'):
+                    return redirect('recommendation', recommendation_id=previous.recommendation.id)
+
+                if previous:
+                    # The first attempt saved the input but failed before its recommendation
+                    farm_input_obj = previous
+                else:
+                    farm_input_obj = await sync_to_async(form.save)(commit=False)
+                    farm_input_obj.user = request.user
+                    farm_input_obj.client_id = client_id
+                    await farm_input_obj.asave()
+                    if form.anomalies:
+                        await sync_to_async(record_anomalies)([farm_input_obj], [form.anomalies])
+                        messages.warning(request, _anomaly_warning(form.anomalies))
+
+                # Identical concurrent submissions share one computation
+                metrics.incr('prediction.requests')
+                predicted_yield, confidence, recommendations = await _run_in_executor(
+                    prediction_flight.do, prediction_key(farm_input_obj), lambda: _predict(farm_input_obj)
+                )
+
+                recommendation = await Recommendation.objects.acreate(
+                    **_recommendation_fields(farm_input_obj, predicted_yield, confidence, recommendations)
+                )
+
+                messages.success(request, "AI recommendation generated successfully!")
+                return redirect('recommendation', recommendation_id=recommendation.id)
+
+            except Exception as e:
+                messages.error(request, f"Error generating recommendation: {str(e)}. Please try again.")
+                print(f"Error in farm_input view: {e}")  # For debugging
+        else:
+            messages.error(request, "Please correct the errors in the form.")
+
+    else:
+        form = FarmInputForm()
+
+    return await arender(request, 'advisory/farm_input.html', {'form': form})
+
+
+async def recommendation(request, recommendation_id):
+    """Display recommendation results"""
+    response = await _login_redirect(request)
+    if response:
+        return response
+
+    try:
+        # Only the user's own recommendations; ids are sequential
+        recommendation = await Recommendation.objects.filter(user=request.user).select_related('farm_input').aget(
+            id=recommendation_id
+        )
+        context = await _run_in_executor(_recommendation_context, recommendation)
+        return await arender(request, 'advisory/recommendation.html', context)
+    except Recommendation.DoesNotExist:
+        messages.error(request, "Recommendation not found. Please try generating a new recommendation.")
+        return redirect('farm_input')
+    except Exception as e:
+        messages.error(request, f"Error loading recommendation: {str(e)}")
+        return redirect('farm_input')
+
+
+async def weather_forecast(request):
+    """Weather forecast view"""
+    request.user = await sync_to_async(get_user)(request)
+    if not await sync_to_async(check_rate_limit)(request, 'weather'):
+        error_msg = "Too many weather requests. Please wait a minute and try again."
+        messages.error(request, error_msg)
+        return await arender(request, 'advisory/weather.html', {'error': error_msg}, status=429)
+
+    location = request.GET.get('location', 'Bhubaneswar')  # Default to Bhubaneswar
+    api_key = settings.WEATHER_API_KEY
+    base_url = settings.WEATHER_API_BASE_URL
+
+    if api_key == 'your-weather-api-key-here':
+        messages.error(request, "Weather API key not configured. Please set WEATHER_API_KEY in settings.")
+        return await arender(request, 'advisory/weather.html', {'error': 'API key not configured'})
+
+    try:
+        params = {'q': location, 'appid': api_key, 'units': 'metric'}
+        # Current weather and the 5-day forecast are fetched concurrently
+        async with httpx.AsyncClient(timeout=10) as client:
+            current_response, forecast_response = await asyncio.gather(
+                client.get(f"{base_url}/weather", params=params),
+                client.get(f"{base_url}/forecast", params=params),
+            )
+
+        if current_response.status_code != 200 or forecast_response.status_code != 200:
+            error_msg = f"API Error - Current: {current_response.status_code} ({current_response.text}), Forecast: {forecast_response.status_code} ({forecast_response.text})"
+            messages.error(request, error_msg)
+            return await arender(request, 'advisory/weather.html', {'error': error_msg})
+
+        context = {
+            'current_weather': current_response.json(),
+            'daily_forecasts': _daily_forecasts(forecast_response.json()),
+            'location': location
+        }
+        return await arender(request, 'advisory/weather.html', context)
+
+    except Exception as e:
+        messages.error(request, f"Error fetching weather data: {str(e)}")
+        return await arender(request, 'advisory/weather.html', {'error': str(e)})
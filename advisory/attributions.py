@@ -0,0 +1,140 @@
+"""
+Per-prediction feature attributions: how much each input moved the predicted yield.
+
+Rule engine: the yield is a base per crop times one multiplier per field, so
+its log is a sum of per-field terms. A field's attribution is its log
+multiplier minus the mean over the field's values, which is its exact Shapley
+value against a uniform background over the input grid. These are
+precomputed once per field value.
+
+Trained model: Saabas path attributions from CompactForest.contributions,
+summed over each form field's one-hot columns and cached per encoded input
+row. The forest only sees district, crop, season, soil type and year.
+
+Attributions are reported as the fractional change in yield against an
+average farm (-0.2 is about 20% lower). They also order the recommended
+actions: the action addressing the largest yield loss comes first.
+"""
+import threading
+
+import numpy as np
+
+from .features import category_values
+from .rules_engine import ACTIONS, RULE_DIMENSIONS
+
+# Fields a farmer can change; only these order the actions
+ACTIONABLE_FIELDS = ('irrigation', 'seed_variety', 'soil_health_card', 'pest_presence')
+
+# Form fields behind the trained model's one-hot columns ('district_Puri', ...)
+MODEL_COLUMN_FIELDS = ('district', 'season', 'crop', 'soil_type')
+
+FIELD_NOUNS = {'district': 'district', 'season': 'season', 'irrigation': 'irrigation', 'seed_variety': 'seed', 'soil_type': 'soil'}
+
+# Attributions smaller than this are left out of the reasoning text
+MIN_REPORTED_EFFECT = 0.01
+
+
+class RuleAttributions:
+    """Exact log-space attributions for the rule-based yield, precomputed per field value"""
+
+    def __init__(self, base_yields, multipliers, default_base_yield):
+        self.effects = []
+        for field in RULE_DIMENSIONS:
+            values = category_values(field)
+            if field == 'crop':
+                factors = [base_yields.get(value, default_base_yield) for value in values]
+            else:
+                factors = [multipliers.get(field, {}).get(value, 1.0) for value in values]
+            logs = np.log(factors)
+            self.effects.append(logs - logs.mean())
+
+    def log_effects(self, coords):
+        """Log-yield attribution per RULE_DIMENSIONS field for RuleTable coordinates, shape (n, n_fields)"""
+        coords = np.asarray(coords)
+        return np.stack([effects[coords[:, axis]] for axis, effects in enumerate(self.effects)], axis=1)
+
+
+def _column_field(column):
+    if column == 'year':
+        return 'year'
+    for field in MODEL_COLUMN_FIELDS:
+        if column.startswith(f'{field}_'):
+            return field
+    # Inputs the form does not collect (imputed to constants)
+    return 'other'
+
+
+class ForestAttributions:
+    """Saabas attributions of a CompactForest grouped by form field, cached per encoded row"""
+
+    def __init__(self, model, max_cached=10000):
+        self.model = model
+        columns = [_column_field(name) for name in model.features]
+        self.fields = list(dict.fromkeys(columns))
+        self._grouping = np.zeros((len(columns), len(self.fields)))
+        for column, field in enumerate(columns):
+            self._grouping[column, self.fields.index(field)] = 1.0
+        self.max_cached = max_cached
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def fractions(self, X):
+        """Fractional yield change per field in self.fields for encoded rows, shape (n, n_fields)"""
+        X = np.asarray(X, dtype=np.float64)
+        keys = [row.tobytes() for row in X]
+        with self._lock:
+            rows = [self._cache.get(key) for key in keys]
+        missing = [i for i, row in enumerate(rows) if row is None]
+        if missing:
+            bias, contributions = self.model.contributions(X[missing])
+            grouped = contributions @ self._grouping / bias
+            with self._lock:
+                if len(self._cache) + len(missing) > self.max_cached:
+                    self._cache.clear()
+                for i, row in zip(missing, grouped):
+                    self._cache[keys[i]] = rows[i] = row
+        return np.array(rows).reshape(len(keys), len(self.fields))
+
+
+def order_actions(table, result, log_effects):
+    """Action text ids per RuleTable.evaluate result, reordered by the yield loss each action addresses"""
+    addresses = np.array([
+        [field in fields and field in ACTIONABLE_FIELDS for field in RULE_DIMENSIONS]
+        for fields in table.text_fields
+    ])
+    texts = np.stack([result[action] for action in ACTIONS], axis=1)
+    # Yield lost to the fields behind each action; nothing when they are above average
+    loss = np.maximum(0.0, -(addresses[texts] * log_effects[:, np.newaxis, :]).sum(axis=2))
+    ordered = np.take_along_axis(texts, np.argsort(-loss, axis=1, kind='stable'), axis=1)
+    return {action: ordered[:, i] for i, action in enumerate(ACTIONS)}
+
+
+def factor_label(farm_input, field):
+    """How a field's value reads in the reasoning text, or None to leave it out"""
+    if field == 'crop':
+        # Crop yields differ tenfold, so the crop's effect against the average crop says nothing useful
+        return None
+    if field == 'soil_health_card':
+        return 'soil health card' if farm_input.soil_health_card else 'no soil health card'
+    if field == 'pest_presence':
+        return 'pests present' if farm_input.pest_presence else 'no pests reported'
+    if field == 'year':
+        return f'sowing in {farm_input.sowing_date.year}' if farm_input.sowing_date else None
+    if field == 'weather':
+        return 'weather forecast'
+    display = getattr(farm_input, f'get_{field}_display', None)
+    if display is None:
+        return None
+    return f"{display()} {FIELD_NOUNS.get(field, '')}".strip()
+
+
+def describe(farm_input, attributions, limit=3):
+    """'Hybrid seed (+15%), Saline soil (-15%)' for the largest attributions"""
+    parts = []
+    for field, effect in attributions.items():
+        label = factor_label(farm_input, field)
+        if label and abs(effect) >= MIN_REPORTED_EFFECT:
+            parts.append(f"{label} ({effect:+.0%})")
+        if len(parts) == limit:
+            break
+    return ', '.join(parts)
@@ -0,0 +1,183 @@
+"""
+Flat, array-based storage and inference for the tree ensemble in farm_model.pkl.
+
+The fitted forest is exported once (manage.py export_model) into plain .npy
+arrays: one row per node across all trees, with global child indices. The
+bundle's imputer medians and StandardScaler statistics are stored alongside,
+so inference needs nothing but NumPy and the arrays can be memory-mapped
+instead of unpickled.
+"""
+import json
+import os
+
+import numpy as np
+
+ARRAYS = (
+    'feature', 'threshold', 'children_left', 'children_right', 'value', 'roots',
+    'fill_values', 'scale_mean', 'scale_std',
+)
+META_FILE = 'meta.json'
+FORMAT_VERSION = 1
+
+
+def export_bundle(bundle, out_dir):
+    """Flatten a {'model', 'imputer', 'scaler', 'features'} bundle into out_dir"""
+    model = bundle['model']
+    scaler = bundle.get('scaler')
+    imputer = bundle.get('imputer')
+    n_features = len(bundle['features'])
+
+    mean = scaler.mean_ if scaler is not None and scaler.with_mean else np.zeros(n_features)
+    scale = scaler.scale_ if scaler is not None and scaler.with_std else np.ones(n_features)
+
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        n = tree.node_count
+        is_leaf = tree.children_left == -1
+        node_ids = np.arange(n, dtype=np.int32) + offset
+
+        feature = np.where(is_leaf, 0, tree.feature).astype(np.int32)
+        # Leaves point at themselves and always "go left", so a sample that
+        # has reached one stays there
+        threshold = np.where(is_leaf, np.inf, tree.threshold)
+        left = np.where(is_leaf, node_ids, tree.children_left + offset).astype(np.int32)
+        right = np.where(is_leaf, node_ids, tree.children_right + offset).astype(np.int32)
+
+        features.append(feature)
+        thresholds.append(threshold)
+        lefts.append(left)
+        rights.append(right)
+        values.append(tree.value[:, 0, 0])
+        roots.append(offset)
+        offset += n
+        max_depth = max(max_depth, tree.max_depth)
+
+    if imputer is not None:
+        fill_values = np.asarray(imputer.statistics_, dtype=np.float64)
+    else:
+        fill_values = np.zeros(n_features)
+
+    arrays = {
+        'feature': np.concatenate(features),
+        'threshold': np.concatenate(thresholds).astype(np.float64),
+        'children_left': np.concatenate(lefts),
+        'children_right': np.concatenate(rights),
+        'value': np.concatenate(values).astype(np.float64),
+        'roots': np.asarray(roots, dtype=np.int32),
+        'fill_values': fill_values,
+        'scale_mean': np.asarray(mean, dtype=np.float64),
+        'scale_std': np.asarray(scale, dtype=np.float64),
+    }
+
+    os.makedirs(out_dir, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(out_dir, f'{name}.npy'), array)
+
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'features': list(bundle['features']),
+        'target': bundle.get('target'),
+        'n_trees': len(roots),
+        'n_nodes': int(offset),
+        'max_depth': int(max_depth),
+    }
+    with open(os.path.join(out_dir, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+class CompactForest:
+    """Batch inference over an exported forest using only NumPy"""
+
+    def __init__(self, arrays, meta):
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.children_left = arrays['children_left']
+        self.children_right = arrays['children_right']
+        self.value = arrays['value']
+        self.roots = arrays['roots']
+        self.fill_values = arrays['fill_values']
+        self.scale_mean = arrays['scale_mean']
+        self.scale_std = arrays['scale_std']
+        self.is_leaf = np.asarray(self.children_left) == np.arange(len(self.children_left))
+        self.features = meta['features']
+        self.target = meta.get('target')
+        self.max_depth = meta['max_depth']
+        self.meta = meta
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load an exported forest; arrays are memory-mapped unless mmap=False"""
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        if meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported compact model format: {meta.get('format_version')}")
+        arrays = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r' if mmap else None)
+            for name in ARRAYS
+        }
+        return cls(arrays, meta)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ARRAYS)
+
+    def transform(self, X):
+        """Impute and scale raw features the way the fitted bundle did"""
+        X = np.asarray(X, dtype=np.float64)
+        X = np.where(np.isnan(X), self.fill_values, X)
+        # scikit-learn trees compare float32 features against float64 thresholds
+        return ((X - self.scale_mean) / self.scale_std).astype(np.float32)
+
+    def leaves(self, X):
+        """Leaf node index reached in every tree, shape (n_trees, n_samples)"""
+        X = self.transform(X)
+        n_samples, n_features = X.shape
+        flat_X = X.ravel()
+        nodes = np.repeat(self.roots[:, np.newaxis], n_samples, axis=1).ravel()
+        offsets = np.tile(np.arange(n_samples) * n_features, len(self.roots))
+
+        # Walk all (tree, sample) pairs one level at a time, dropping pairs
+        # as soon as they land on a leaf
+        active = np.flatnonzero(~self.is_leaf[nodes])
+        while active.size:
+            current = nodes[active]
+            go_left = flat_X[offsets[active] + self.feature[current]] <= self.threshold[current]
+            current = np.where(go_left, self.children_left[current], self.children_right[current])
+            nodes[active] = current
+            active = active[~self.is_leaf[current]]
+        return nodes.reshape(len(self.roots), n_samples)
+
+    def predict(self, X):
+        """Mean of the tree outputs, in the model's target unit"""
+        return self.value[self.leaves(X)].mean(axis=0)
+
+    def contributions(self, X):
+        """Per-feature contributions along each decision path (Saabas), averaged over the trees
+
+        Every split moves the prediction from the parent node's mean to the
+        child's; that change is credited to the split feature. Returns
+        (bias, contributions of shape (n_samples, n_features)), where
+        bias + contributions.sum(axis=1) == predict(X).
+        """
+        X = self.transform(X)
+        n_samples, n_features = X.shape
+        flat_X = X.ravel()
+        nodes = np.repeat(self.roots[:, np.newaxis], n_samples, axis=1).ravel()
+        samples = np.tile(np.arange(n_samples), len(self.roots))
+        contributions = np.zeros((n_samples, n_features))
+
+        # Same level-at-a-time walk as leaves()
+        active = np.flatnonzero(~self.is_leaf[nodes])
+        while active.size:
+            current = nodes[active]
+            feature = self.feature[current]
+            go_left = flat_X[samples[active] * n_features + feature] <= self.threshold[current]
+            child = np.where(go_left, self.children_left[current], self.children_right[current])
+            np.add.at(contributions, (samples[active], feature), self.value[child] - self.value[current])
+            nodes[active] = child
+            active = active[~self.is_leaf[child]]
+        return float(self.value[self.roots].mean()), contributions / len(self.roots)
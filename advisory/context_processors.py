@@ -0,0 +1,6 @@
+from django.conf import settings
+
+
+def pwa(request):
+    """Whether pages should register the offline service worker"""
+    return {'pwa_enabled': getattr(settings, 'PWA_ENABLED', False)}
@@ -0,0 +1,354 @@
+"""
+Offline evaluation of the yield predictors against combined_tables.txt.
+
+Compares the trained model (farm_model.pkl), the rule engine in
+YieldPredictor and a historical district-average baseline using
+year-split (expanding window) cross-validation, and profiles how much each
+one costs per prediction. In each fold the model's imputer, scaler and
+estimator are refitted on the training years with the shipped
+hyperparameters; the shipped forest itself is scored as `model_shipped`.
+"""
+import copy
+import hashlib
+import math
+import os
+import statistics
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import numpy as np
+from django.conf import settings
+
+from .compact_model import CompactForest
+from .ml_model import (
+    COMPACT_MODEL_DIR, MODEL_CROPS, MODEL_UNIT_TO_KG, encode_model_features, yield_predictor,
+)
+
+MODEL_PATH = os.path.join(settings.BASE_DIR, 'advisory/models/farm_model.pkl')
+
+# Approaches scored only on the crops the model was trained on
+MODEL_APPROACHES = ('model', 'model_shipped')
+
+# Per-process state for the pool workers
+_rows = None
+_model = None
+
+
+def row_to_input(row):
+    """Turn a history row into a FarmInput-like object for the rule engine"""
+    # The history has no soil health card / pest columns; assume neither
+    return SimpleNamespace(
+        district=row['district'], crop=row['crop'], season=row['season'],
+        irrigation=row['irrigation'], soil_type=row['soil_type'],
+        seed_variety=row['seed_variety'], field_area=row['field_area'],
+        year=row['year'], soil_health_card=False, pest_presence=False,
+    )
+
+
+class RuleEngine:
+    name = 'rules'
+
+    def fit(self, rows):
+        pass
+
+    def predict_one(self, row):
+        return yield_predictor.rule_based_yield(row_to_input(row))
+
+    def predict(self, rows):
+        return np.array([self.predict_one(row) for row in rows])
+
+
+class DistrictAverage:
+    """Mean historical yield of the district/crop/season in the training years"""
+    name = 'district_average'
+
+    def fit(self, rows):
+        sums = defaultdict(lambda: [0.0, 0])
+        for row in rows:
+            for key in self._keys(row):
+                sums[key][0] += row['yield']
+                sums[key][1] += 1
+        self.means = {key: total / count for key, (total, count) in sums.items()}
+
+    def _keys(self, row):
+        return [
+            (row['district'], row['crop'], row['season']),
+            (row['crop'], row['season']),
+        ]
+
+    def predict_one(self, row):
+        for key in self._keys(row):
+            if key in self.means:
+                return self.means[key]
+        return yield_predictor.get_district_average(row['district'], row['crop'], row['season'])
+
+    def predict(self, rows):
+        return np.array([self.predict_one(row) for row in rows])
+
+
+class TrainedModel:
+    """The fitted estimator bundle in farm_model.pkl, fed through its own imputer and scaler"""
+    name = 'model'
+
+    def __init__(self, path=MODEL_PATH):
+        # farm_model.pkl was written with joblib, plain pickle cannot read it
+        import joblib
+        bundle = joblib.load(path)
+        self.model = bundle['model']
+        self.imputer = bundle['imputer']
+        self.scaler = bundle['scaler']
+        self.features = list(bundle['features'])
+
+    def fit(self, rows):
+        """Refit unfitted copies of the imputer, scaler and estimator on the rows of covered crops"""
+        from sklearn.base import clone
+        rows = [row for row in rows if self.covers(row)]
+        X = encode_model_features(rows, self.features)
+        y = np.array([row['yield'] for row in rows]) / MODEL_UNIT_TO_KG
+        self.imputer = clone(self.imputer)
+        self.scaler = clone(self.scaler)
+        self.model = clone(self.model)
+        self.model.fit(self.scaler.fit_transform(self.imputer.fit_transform(X)), y)
+
+    def covers(self, row):
+        return row['crop'] in MODEL_CROPS
+
+    def predict(self, rows):
+        X = encode_model_features(rows, self.features)
+        X = self.scaler.transform(self.imputer.transform(X))
+        return self.model.predict(X) * MODEL_UNIT_TO_KG
+
+    def predict_one(self, row):
+        return self.predict([row])[0]
+
+
+class CompactModel(TrainedModel):
+    """The same model exported by manage.py export_model, as served by YieldPredictor"""
+    name = 'model_compact'
+
+    def __init__(self, path=COMPACT_MODEL_DIR):
+        self.forest = CompactForest.load(path)
+        self.features = self.forest.features
+
+    def predict(self, rows):
+        X = encode_model_features(rows, self.features)
+        return self.forest.predict(X) * MODEL_UNIT_TO_KG
+
+
+def _load_trained_model():
+    try:
+        return TrainedModel()
+    except Exception as e:
+        print(f"Error loading model for evaluation: {e}")
+        return None
+
+
+def _init_worker():
+    global _rows, _model
+    _rows = yield_predictor.load_data()
+    _model = _load_trained_model()
+
+
+def _evaluate_fold(test_year):
+    """Fit on all years before test_year, predict test_year; runs in a pool worker"""
+    train = [row for row in _rows if row['year'] < test_year]
+    test = [row for row in _rows if row['year'] == test_year]
+    actual = [row['yield'] for row in test]
+    crops = [row['crop'] for row in test]
+
+    predictions = {}
+    for approach in (RuleEngine(), DistrictAverage()):
+        approach.fit(train)
+        predictions[approach.name] = approach.predict(test).tolist()
+
+    covered = None
+    if _model is not None:
+        refitted = copy.copy(_model)
+        refitted.fit(train)
+        model_pred = refitted.predict(test)
+        covered = [_model.covers(row) for row in test]
+        predictions['model'] = model_pred.tolist()
+        # The shipped forest was trained on another table and is not refitted
+        predictions['model_shipped'] = _model.predict(test).tolist()
+        # What production would serve: the model where it has seen the crop, rules elsewhere
+        predictions['model_with_fallback'] = [
+            m if c else r for m, r, c in zip(model_pred, predictions['rules'], covered)
+        ]
+
+    return {
+        'year': test_year,
+        'train_rows': len(train),
+        'actual': actual,
+        'crops': crops,
+        'covered': covered,
+        'predictions': predictions,
+    }
+
+
+def error_metrics(actual, predicted):
+    """MAE, RMSE, MAPE and R^2 for paired arrays"""
+    actual = np.asarray(actual, dtype=float)
+    predicted = np.asarray(predicted, dtype=float)
+    if len(actual) == 0:
+        return {'n': 0}
+    errors = predicted - actual
+    ss_tot = float(np.sum((actual - actual.mean()) ** 2))
+    return {
+        'n': int(len(actual)),
+        'mae': float(np.mean(np.abs(errors))),
+        'rmse': float(math.sqrt(np.mean(errors ** 2))),
+        'mape': float(np.mean(np.abs(errors) / actual) * 100),
+        'r2': float(1 - np.sum(errors ** 2) / ss_tot) if ss_tot else None,
+    }
+
+
+def _summarise(folds):
+    """Pool the per-fold predictions into overall, per-fold and per-crop metrics"""
+    approaches = list(folds[0]['predictions']) if folds else []
+    summary = {}
+    for name in approaches:
+        actual, predicted, crops = [], [], []
+        per_fold = []
+        for fold in folds:
+            fold_actual = fold['actual']
+            fold_pred = fold['predictions'][name]
+            fold_crops = fold['crops']
+            if name in MODEL_APPROACHES:
+                # Only score the model on crops it was trained on
+                keep = fold['covered']
+                fold_actual = [a for a, k in zip(fold_actual, keep) if k]
+                fold_pred = [p for p, k in zip(fold_pred, keep) if k]
+                fold_crops = [c for c, k in zip(fold_crops, keep) if k]
+            per_fold.append({'year': fold['year'], **error_metrics(fold_actual, fold_pred)})
+            actual += fold_actual
+            predicted += fold_pred
+            crops += fold_crops
+
+        by_crop = {}
+        for crop in sorted(set(crops)):
+            idx = [i for i, c in enumerate(crops) if c == crop]
+            by_crop[crop] = error_metrics([actual[i] for i in idx], [predicted[i] for i in idx])
+
+        summary[name] = {
+            'overall': error_metrics(actual, predicted),
+            'folds': per_fold,
+            'by_crop': by_crop,
+        }
+    total = sum(len(fold['actual']) for fold in folds)
+    for name in MODEL_APPROACHES:
+        if name in summary:
+            summary[name]['coverage'] = summary[name]['overall']['n'] / total if total else 0
+    return summary
+
+
+def _profile(approach, rows, samples):
+    """Single-row and batch latency plus peak memory for one approach"""
+    single = []
+    for row in rows[:samples]:
+        start = time.perf_counter()
+        approach.predict_one(row)
+        single.append((time.perf_counter() - start) * 1e6)
+    single.sort()
+
+    start = time.perf_counter()
+    approach.predict(rows)
+    batch_seconds = time.perf_counter() - start
+
+    # Separate pass: tracemalloc slows allocation-heavy code down noticeably
+    tracemalloc.start()
+    approach.predict(rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'single_row_us': {
+            'mean': statistics.fmean(single),
+            'p50': single[len(single) // 2],
+            'p95': single[min(len(single) - 1, int(len(single) * 0.95))],
+        },
+        'batch_rows': len(rows),
+        'batch_ms': batch_seconds * 1000,
+        'batch_us_per_row': batch_seconds * 1e6 / len(rows),
+        'batch_peak_kb': peak / 1024,
+    }
+
+
+def profile_approaches(rows, samples=200):
+    """Latency and memory for every approach, measured in this process"""
+    results = {}
+
+    rules = RuleEngine()
+    results['rules'] = _profile(rules, rows, samples)
+
+    baseline = DistrictAverage()
+    baseline.fit(rows)
+    results['district_average'] = _profile(baseline, rows, samples)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    model = _load_trained_model()
+    load_seconds = time.perf_counter() - start
+    _, load_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if model is not None:
+        results['model'] = _profile(model, rows, samples)
+        results['model']['load_ms'] = load_seconds * 1000
+        results['model']['load_peak_kb'] = load_peak / 1024
+        results['model']['file_kb'] = os.path.getsize(MODEL_PATH) / 1024
+
+    try:
+        start = time.perf_counter()
+        compact = CompactModel()
+        load_seconds = time.perf_counter() - start
+    except Exception as e:
+        print(f"Error loading compact model for evaluation: {e}")
+    else:
+        results['model_compact'] = _profile(compact, rows, samples)
+        results['model_compact']['load_ms'] = load_seconds * 1000
+        results['model_compact']['file_kb'] = compact.forest.nbytes / 1024
+    return results
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def run_evaluation(workers=None, min_train_years=3, latency_samples=200):
+    """Run the year-split cross-validation across a process pool and build the report"""
+    rows = yield_predictor.load_data()
+    years = sorted({row['year'] for row in rows})
+    test_years = years[min_train_years:]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        folds = list(pool.map(_evaluate_fold, test_years))
+
+    data_path = os.path.join(settings.BASE_DIR, 'combined_tables.txt')
+    return {
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'data': {
+            'path': 'combined_tables.txt',
+            'sha256': _sha256(data_path),
+            'rows': len(rows),
+            'years': years,
+        },
+        'model': {
+            'path': 'advisory/models/farm_model.pkl',
+            'sha256': _sha256(MODEL_PATH) if os.path.exists(MODEL_PATH) else None,
+        },
+        'cv': {
+            'scheme': 'expanding window, one test year per fold',
+            'refitted_per_fold': ['district_average', 'model'],
+            'min_train_years': min_train_years,
+            'test_years': test_years,
+        },
+        'accuracy': _summarise(folds),
+        'performance': profile_approaches(rows, latency_samples),
+    }
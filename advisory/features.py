@@ -0,0 +1,32 @@
+"""Integer encodings of the FarmInput categorical fields, shared by the predictors"""
+
+CROP_CODES = {'rice': 1, 'maize': 2, 'wheat': 3, 'groundnut': 4, 'mung': 5, 'cotton': 6, 'sugarcane': 7, 'turmeric': 8}
+DISTRICT_CODES = {
+    'angul': 1, 'balangir': 2, 'balasore': 3, 'bargarh': 4, 'bhadrak': 5, 'boudh': 6,
+    'cuttack': 7, 'deogarh': 8, 'dhenkanal': 9, 'gajapati': 10, 'ganjam': 11, 'jagatsinghpur': 12,
+    'jajpur': 13, 'jharsuguda': 14, 'kalahandi': 15, 'kandhamal': 16, 'kendrapara': 17, 'keonjhar': 18,
+    'khordha': 19, 'koraput': 20, 'malkangiri': 21, 'mayurbhanj': 22, 'nabarangpur': 23, 'nayagarh': 24,
+    'nuapada': 25, 'puri': 26, 'rayagada': 27, 'sambalpur': 28, 'sonepur': 29, 'sundargarh': 30
+}
+SEASON_CODES = {'kharif': 1, 'rabi': 2, 'zaid': 3}
+IRRIGATION_CODES = {'none': 0, 'drip': 1, 'tubewell': 2, 'canal': 3, 'lift': 4}
+SEED_CODES = {'local': 0, 'hyv': 1, 'hybrid': 2}
+SOIL_CODES = {'alluvial': 1, 'red_black': 2, 'lateritic': 3, 'saline': 4}
+FLAG_CODES = {False: 0, True: 1}
+
+FEATURE_CODES = {
+    'crop': CROP_CODES,
+    'district': DISTRICT_CODES,
+    'season': SEASON_CODES,
+    'irrigation': IRRIGATION_CODES,
+    'seed_variety': SEED_CODES,
+    'soil_type': SOIL_CODES,
+    'soil_health_card': FLAG_CODES,
+    'pest_presence': FLAG_CODES,
+}
+
+
+def category_values(field):
+    """The values of a categorical field, ordered by their code"""
+    codes = FEATURE_CODES[field]
+    return sorted(codes, key=codes.get)
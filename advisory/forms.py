@@ -1,13 +1,37 @@
 from django import forms
+from django.conf import settings
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from .models import FarmInput, Contact
 
 class FarmInputForm(forms.ModelForm):
+    def __init__(self, *args, check_anomalies=True, **kwargs):
+        # Batch callers pass check_anomalies=False and use InputProfile.check_batch
+        super().__init__(*args, **kwargs)
+        self.check_anomalies = check_anomalies
+        self.anomalies = []
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.check_anomalies and not self.errors:
+            # Imported here: the anomalies module loads the yield predictor on import
+            from .anomalies import get_input_profile
+            self.anomalies = get_input_profile().check(cleaned_data)
+            self.reject_anomalies(self.anomalies)
+        return cleaned_data
+
+    def reject_anomalies(self, anomalies):
+        """Turn flags on REJECTED_FIELDS into field errors when REJECT_INPUT_ANOMALIES is set"""
+        if settings.REJECT_INPUT_ANOMALIES:
+            from .anomalies import REJECTED_FIELDS
+            for field, message in anomalies:
+                if field in REJECTED_FIELDS:
+                    self.add_error(field, f"{message} Please check the value.")
+
     class Meta:
         model = FarmInput
         fields = '__all__'
-        exclude = ['created_at']
+        exclude = ['created_at', 'user']
         
         widgets = {
             'district': forms.Select(attrs={'class': 'form-select'}),
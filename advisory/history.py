@@ -0,0 +1,89 @@
+"""
+A user's past recommendations, newest first, with keyset (cursor) pagination.
+
+Each page continues strictly after the (created_at, id) of the last row of the
+previous one, so the database seeks straight into the (user, created_at) index
+instead of skipping OFFSET rows, and rows added meanwhile don't shift pages.
+"""
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Recommendation
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(recommendation):
+    value = f"{recommendation.created_at.isoformat()}|{recommendation.pk}"
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from a cursor string"""
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+    if created_at is None:
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+    return created_at, pk
+
+
+def history_page(user, cursor=None, limit=PAGE_SIZE):
+    """One page of the user's recommendations and the cursor for the next page (None on the last)"""
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    queryset = (
+        Recommendation.objects
+        .filter(user=user)
+        .select_related('farm_input')
+        .order_by('-created_at', '-id')
+    )
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+    # One extra row tells us whether there is a next page
+    rows = list(queryset[:limit + 1])
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def history_item(recommendation):
+    """JSON-serializable row for the history API"""
+    farm_input = recommendation.farm_input
+    return {
+        'id': recommendation.id,
+        'created_at': recommendation.created_at.isoformat(),
+        'district': farm_input.district,
+        'crop': farm_input.crop,
+        'season': farm_input.season,
+        'sowing_date': farm_input.sowing_date.isoformat(),
+        'field_area': farm_input.field_area,
+        'predicted_yield': recommendation.predicted_yield,
+        'confidence_interval': recommendation.confidence_interval,
+        'estimated_gain': recommendation.estimated_gain,
+    }
+
+
+def summary_item(summary):
+    """JSON-serializable UserSummary (None for users without submissions)"""
+    if summary is None:
+        return None
+    return {
+        'submissions': summary.submissions,
+        'total_area': summary.total_area,
+        'avg_predicted_yield': summary.avg_predicted_yield,
+        'avg_estimated_gain': summary.avg_estimated_gain,
+        'best_season': summary.best_season,
+        'last_submission': summary.last_submission.isoformat() if summary.last_submission else None,
+    }
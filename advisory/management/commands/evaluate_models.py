@@ -0,0 +1,62 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from advisory.evaluation import run_evaluation
+from advisory.profiling import require_passing_profile
+
+DATA_PATH = os.path.join(settings.BASE_DIR, 'combined_tables.txt')
+PROFILE_PATH = os.path.join(settings.BASE_DIR, 'reports', 'data_profile.json')
+
+
+class Command(BaseCommand):
+    help = "Compare the trained model, rule engine and district-average baseline with year-split cross-validation"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help="Process pool size (default: CPU count)")
+        parser.add_argument('--min-train-years', type=int, default=3, help="Years of history before the first test fold")
+        parser.add_argument('--latency-samples', type=int, default=200, help="Rows timed one at a time per approach")
+        parser.add_argument(
+            '--output', default=os.path.join(settings.BASE_DIR, 'reports', 'model_evaluation.json'),
+            help="Where to write the JSON report",
+        )
+        parser.add_argument('--profile', default=PROFILE_PATH, help="Data profile from manage.py profile_data")
+        parser.add_argument('--skip-data-gate', action='store_true', help="Evaluate even without a passing data profile")
+
+    def handle(self, *args, **options):
+        if not options['skip_data_gate']:
+            problem = require_passing_profile(DATA_PATH, options['profile'])
+            if problem:
+                raise CommandError(problem)
+
+        report = run_evaluation(
+            workers=options['workers'],
+            min_train_years=options['min_train_years'],
+            latency_samples=options['latency_samples'],
+        )
+
+        os.makedirs(os.path.dirname(options['output']) or '.', exist_ok=True)
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+
+        self.stdout.write(f"Test years: {report['cv']['test_years']}")
+        self.stdout.write(f"{'approach':<22}{'n':>7}{'MAE':>10}{'RMSE':>10}{'MAPE %':>9}{'R2':>8}")
+        for name, result in report['accuracy'].items():
+            m = result['overall']
+            r2 = f"{m['r2']:.3f}" if m.get('r2') is not None else '-'
+            self.stdout.write(
+                f"{name:<22}{m['n']:>7}{m.get('mae', 0):>10.0f}{m.get('rmse', 0):>10.0f}{m.get('mape', 0):>9.1f}{r2:>8}"
+            )
+        if 'model' in report['accuracy']:
+            self.stdout.write(f"Model covers {report['accuracy']['model']['coverage']:.0%} of test rows")
+
+        self.stdout.write("")
+        self.stdout.write(f"{'approach':<22}{'p50 us':>10}{'p95 us':>10}{'batch us/row':>14}{'peak KB':>10}")
+        for name, perf in report['performance'].items():
+            self.stdout.write(
+                f"{name:<22}{perf['single_row_us']['p50']:>10.1f}{perf['single_row_us']['p95']:>10.1f}"
+                f"{perf['batch_us_per_row']:>14.2f}{perf['batch_peak_kb']:>10.0f}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
@@ -0,0 +1,79 @@
+import os
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from advisory.compact_model import CompactForest, export_bundle
+from advisory.ml_model import COMPACT_MODEL_DIR, encode_model_features, yield_predictor
+
+PICKLE_PATH = os.path.join(settings.BASE_DIR, 'advisory/models/farm_model.pkl')
+
+
+def _best_of(fn, repeat):
+    """Fastest of `repeat` runs in milliseconds, plus the last result"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+class Command(BaseCommand):
+    help = "Convert farm_model.pkl into the flat .npy format loaded by YieldPredictor"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=PICKLE_PATH, help="Fitted joblib bundle to convert")
+        parser.add_argument('--output', default=COMPACT_MODEL_DIR, help="Directory for the exported arrays")
+        parser.add_argument('--benchmark', action='store_true', help="Compare load and predict time against the pickle")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per benchmark measurement")
+
+    def handle(self, *args, **options):
+        try:
+            import joblib
+        except ImportError:
+            raise CommandError("Exporting needs scikit-learn/joblib installed to read the pickle")
+
+        bundle = joblib.load(options['source'])
+        meta = export_bundle(bundle, options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {meta['n_trees']} trees / {meta['n_nodes']} nodes (max depth {meta['max_depth']}) "
+            f"to {options['output']}"
+        ))
+
+        if options['benchmark']:
+            self._benchmark(options['source'], options['output'], options['repeat'])
+
+    def _benchmark(self, source, output, repeat):
+        import joblib
+
+        pickle_load_ms, bundle = _best_of(lambda: joblib.load(source), repeat)
+        compact_load_ms, forest = _best_of(lambda: CompactForest.load(output), repeat)
+        eager_load_ms, _ = _best_of(lambda: CompactForest.load(output, mmap=False), repeat)
+
+        rows = yield_predictor.load_data()
+        X = encode_model_features(rows, forest.features)
+
+        def sklearn_predict(X):
+            Xt = bundle['scaler'].transform(bundle['imputer'].transform(X))
+            return bundle['model'].predict(Xt)
+
+        # Silence the "X does not have valid feature names" warnings
+        import warnings
+        warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+        pickle_single_ms, _ = _best_of(lambda: sklearn_predict(X[:1]), repeat)
+        compact_single_ms, _ = _best_of(lambda: forest.predict(X[:1]), repeat)
+        pickle_batch_ms, expected = _best_of(lambda: sklearn_predict(X), repeat)
+        compact_batch_ms, actual = _best_of(lambda: forest.predict(X), repeat)
+
+        self.stdout.write(f"{'':<24}{'pickle':>12}{'compact':>12}")
+        self.stdout.write(f"{'load (ms)':<24}{pickle_load_ms:>12.1f}{compact_load_ms:>12.1f}")
+        self.stdout.write(f"{'load, no mmap (ms)':<24}{'':>12}{eager_load_ms:>12.1f}")
+        self.stdout.write(f"{'predict 1 row (ms)':<24}{pickle_single_ms:>12.2f}{compact_single_ms:>12.2f}")
+        self.stdout.write(f"{f'predict {len(X)} rows (ms)':<24}{pickle_batch_ms:>12.1f}{compact_batch_ms:>12.1f}")
+        self.stdout.write(f"{'on-disk size (KB)':<24}{os.path.getsize(source) / 1024:>12.0f}{forest.nbytes / 1024:>12.0f}")
+        self.stdout.write(f"Max abs difference: {np.max(np.abs(actual - expected)):.6g} {forest.target or ''}")
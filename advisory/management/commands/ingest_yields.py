@@ -0,0 +1,66 @@
+import csv
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from advisory.features import category_values
+from advisory.ml_model import yield_predictor
+
+HISTORY_PATH = os.path.join(settings.BASE_DIR, 'combined_tables.txt')
+CATEGORICAL_COLUMNS = ('district', 'crop', 'season', 'irrigation', 'soil_type', 'seed_variety')
+
+
+class Command(BaseCommand):
+    help = "Append new seasons' yields to combined_tables.txt and update the trend fits incrementally"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Tab-separated file with the same columns as combined_tables.txt")
+        parser.add_argument('--dry-run', action='store_true', help="Show the forecast changes without saving anything")
+
+    def handle(self, *args, **options):
+        with open(HISTORY_PATH) as f:
+            headers = f.readline().strip().split('\t')
+
+        rows, lines = [], []
+        with open(options['path'], newline='') as f:
+            reader = csv.DictReader(f, delimiter='\t')
+            if reader.fieldnames != headers:
+                raise CommandError(f"Expected columns: {', '.join(headers)}")
+            allowed = {column: set(category_values(column)) for column in CATEGORICAL_COLUMNS}
+            for line_number, row in enumerate(reader, start=2):
+                for column in CATEGORICAL_COLUMNS:
+                    if row[column] not in allowed[column]:
+                        raise CommandError(f"Line {line_number}: unknown {column} {row[column]!r}")
+                lines.append('\t'.join(row[h] or '' for h in headers))
+                try:
+                    row['yield'] = float(row['yield'])
+                    row['field_area'] = float(row['field_area'])
+                    row['rainfall'] = float(row['rainfall'])
+                    row['year'] = int(row['year'])
+                except (TypeError, ValueError):
+                    raise CommandError(f"Line {line_number}: non-numeric year, field_area, rainfall or yield")
+                rows.append(row)
+
+        if not rows:
+            self.stdout.write("No rows to ingest")
+            return
+
+        trends = yield_predictor.trend_model()
+        keys = sorted({(row['district'], row['crop'], row['season']) for row in rows})
+        before = {key: trends.forecast_series(*key) for key in keys}
+
+        if options['dry_run']:
+            trends = type(trends).fit(yield_predictor.load_data() + rows)
+        else:
+            with open(HISTORY_PATH, 'a') as f:
+                f.write('\n'.join(lines) + '\n')
+            trends = yield_predictor.ingest_history(rows)
+
+        for key in keys:
+            old, new = before[key], trends.forecast_series(*key)
+            old_text = f"{old['forecast']:.0f} ({old['year']})" if old else "-"
+            self.stdout.write(f"{' / '.join(key)}: {old_text} -> {new['forecast']:.0f} ({new['year']}, {new['method']})")
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Checked' if options['dry_run'] else 'Ingested'} {len(rows)} rows for {len(keys)} series"
+        ))
@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from advisory.weather import DISTRICT_COORDINATES, REQUEST_TIMEOUT, prefetch_district_weather
+
+
+class Command(BaseCommand):
+    help = "Fetch current weather and 5-day forecasts for every district and store them for yield adjustments"
+
+    def add_arguments(self, parser):
+        parser.add_argument('districts', nargs='*', help="Districts to fetch (default: all 30)")
+        parser.add_argument('--workers', type=int, default=8, help="Concurrent requests")
+        parser.add_argument('--timeout', type=float, default=REQUEST_TIMEOUT, help="Per-request timeout in seconds")
+
+    def handle(self, *args, **options):
+        if not settings.WEATHER_API_KEY or not settings.WEATHER_API_BASE_URL:
+            raise CommandError("Set WEATHER_API_KEY and WEATHER_API_BASE_URL")
+        unknown = set(options['districts']) - set(DISTRICT_COORDINATES)
+        if unknown:
+            raise CommandError(f"Unknown districts: {', '.join(sorted(unknown))}")
+
+        start = time.perf_counter()
+        fetched, failures = prefetch_district_weather(options['districts'], options['workers'], options['timeout'])
+        elapsed = time.perf_counter() - start
+
+        for district in sorted(fetched):
+            weather = fetched[district]
+            self.stdout.write(
+                f"{district:<15}{weather['temperature']:>6.1f} °C{weather['rain_5d']:>8.1f} mm"
+                f"{weather['rainy_days']:>3} rainy{weather['hot_days']:>3} hot"
+            )
+        for district, error in sorted(failures.items()):
+            self.stderr.write(f"{district}: {error}")
+        self.stdout.write(f"Fetched {len(fetched)} districts in {elapsed:.1f}s")
+        if failures:
+            raise CommandError(f"{len(failures)} districts failed")
+        self.stdout.write(self.style.SUCCESS("District weather saved"))
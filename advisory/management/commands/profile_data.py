@@ -0,0 +1,63 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from advisory.profiling import DEFAULT_CHUNK_SIZE, DEFAULT_GATE, profile_file
+
+DATA_PATH = os.path.join(settings.BASE_DIR, 'combined_tables.txt')
+REPORT_PATH = os.path.join(settings.BASE_DIR, 'reports', 'data_profile.json')
+
+
+class Command(BaseCommand):
+    help = "Profile the training table in bounded memory and write a data-quality report that gates evaluation"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=DATA_PATH, help="combined_tables.txt or an .xlsx with the same columns")
+        parser.add_argument('--output', default=REPORT_PATH, help="Where to write the JSON report")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Rows held in memory at a time")
+        parser.add_argument('--min-rows', type=int, default=DEFAULT_GATE['min_rows'])
+        parser.add_argument('--max-reject-rate', type=float, default=DEFAULT_GATE['max_reject_rate'])
+        parser.add_argument('--max-outlier-rate', type=float, default=DEFAULT_GATE['max_outlier_rate'])
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['source']):
+            raise CommandError(f"No such file: {options['source']}")
+
+        report = profile_file(options['source'], options['chunk_size'], {
+            'min_rows': options['min_rows'],
+            'max_reject_rate': options['max_reject_rate'],
+            'max_outlier_rate': options['max_outlier_rate'],
+        })
+
+        os.makedirs(os.path.dirname(options['output']) or '.', exist_ok=True)
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+
+        if 'rows' in report:
+            rows = report['rows']
+            self.stdout.write(f"Rows: {rows['total']} read, {rows['accepted']} accepted, {rows['rejected']} rejected")
+            for reason, count in report['reject_reasons'].items():
+                self.stdout.write(f"  {reason:<28}{count:>7}")
+
+            self.stdout.write("")
+            self.stdout.write(f"{'column':<14}{'mean':>12}{'std':>12}{'min':>12}{'max':>12}")
+            for column, stats in report['numeric'].items():
+                if stats['count']:
+                    self.stdout.write(
+                        f"{column:<14}{stats['mean']:>12.1f}{stats['std']:>12.1f}{stats['min']:>12.1f}{stats['max']:>12.1f}"
+                    )
+
+            self.stdout.write("")
+            self.stdout.write(f"{'crop':<14}{'rows':>7}{'median':>10}{'low':>10}{'high':>10}{'outliers':>10}")
+            for crop, fence in report['yield_by_crop'].items():
+                self.stdout.write(
+                    f"{crop:<14}{fence['rows']:>7}{fence['median']:>10.0f}{fence['low']:>10.0f}"
+                    f"{fence['high']:>10.0f}{report['outliers']['by_crop'].get(crop, 0):>10}"
+                )
+
+        self.stdout.write(f"Report written to {options['output']}")
+        if not report['gate']['passed']:
+            raise CommandError("Data gate failed: " + '; '.join(report['gate']['failures']))
+        self.stdout.write(self.style.SUCCESS("Data gate passed"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from advisory.summaries import refresh_district_summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-district/crop/season summaries shown in the admin report"
+
+    def handle(self, *args, **options):
+        count = refresh_district_summaries()
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {count} district summaries"))
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advisory', '0002_contact'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='farminput',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='farminput',
+            name='crop',
+            field=models.CharField(choices=[('rice', 'Rice'), ('maize', 'Maize'), ('wheat', 'Wheat'), ('groundnut', 'Groundnut'), ('mung', 'Mung'), ('cotton', 'Cotton'), ('sugarcane', 'Sugarcane'), ('turmeric', 'Turmeric')], db_index=True, max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='farminput',
+            name='district',
+            field=models.CharField(choices=[('angul', 'Angul'), ('balangir', 'Balangir'), ('balasore', 'Balasore'), ('bargarh', 'Bargarh'), ('bhadrak', 'Bhadrak'), ('boudh', 'Boudh'), ('cuttack', 'Cuttack'), ('deogarh', 'Deogarh'), ('dhenkanal', 'Dhenkanal'), ('gajapati', 'Gajapati'), ('ganjam', 'Ganjam'), ('jagatsinghpur', 'Jagatsinghpur'), ('jajpur', 'Jajpur'), ('jharsuguda', 'Jharsuguda'), ('kalahandi', 'Kalahandi'), ('kandhamal', 'Kandhamal'), ('kendrapara', 'Kendrapara'), ('keonjhar', 'Keonjhar'), ('khordha', 'Khordha'), ('koraput', 'Koraput'), ('malkangiri', 'Malkangiri'), ('mayurbhanj', 'Mayurbhanj'), ('nabarangpur', 'Nabarangpur'), ('nayagarh', 'Nayagarh'), ('nuapada', 'Nuapada'), ('puri', 'Puri'), ('rayagada', 'Rayagada'), ('sambalpur', 'Sambalpur'), ('sonepur', 'Sonepur'), ('sundargarh', 'Sundargarh')], db_index=True, max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='recommendation',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name='DistrictSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('district', models.CharField(choices=[('angul', 'Angul'), ('balangir', 'Balangir'), ('balasore', 'Balasore'), ('bargarh', 'Bargarh'), ('bhadrak', 'Bhadrak'), ('boudh', 'Boudh'), ('cuttack', 'Cuttack'), ('deogarh', 'Deogarh'), ('dhenkanal', 'Dhenkanal'), ('gajapati', 'Gajapati'), ('ganjam', 'Ganjam'), ('jagatsinghpur', 'Jagatsinghpur'), ('jajpur', 'Jajpur'), ('jharsuguda', 'Jharsuguda'), ('kalahandi', 'Kalahandi'), ('kandhamal', 'Kandhamal'), ('kendrapara', 'Kendrapara'), ('keonjhar', 'Keonjhar'), ('khordha', 'Khordha'), ('koraput', 'Koraput'), ('malkangiri', 'Malkangiri'), ('mayurbhanj', 'Mayurbhanj'), ('nabarangpur', 'Nabarangpur'), ('nayagarh', 'Nayagarh'), ('nuapada', 'Nuapada'), ('puri', 'Puri'), ('rayagada', 'Rayagada'), ('sambalpur', 'Sambalpur'), ('sonepur', 'Sonepur'), ('sundargarh', 'Sundargarh')], max_length=50)),
+                ('crop', models.CharField(choices=[('rice', 'Rice'), ('maize', 'Maize'), ('wheat', 'Wheat'), ('groundnut', 'Groundnut'), ('mung', 'Mung'), ('cotton', 'Cotton'), ('sugarcane', 'Sugarcane'), ('turmeric', 'Turmeric')], max_length=50)),
+                ('season', models.CharField(choices=[('kharif', 'Kharif'), ('rabi', 'Rabi'), ('zaid', 'Zaid')], max_length=20)),
+                ('submissions', models.PositiveIntegerField(default=0)),
+                ('total_area', models.FloatField(default=0, help_text='Hectares')),
+                ('avg_predicted_yield', models.FloatField(default=0)),
+                ('avg_estimated_gain', models.FloatField(default=0)),
+                ('first_submission', models.DateTimeField(null=True)),
+                ('last_submission', models.DateTimeField(null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'district summaries',
+                'unique_together': {('district', 'crop', 'season')},
+            },
+        ),
+    ]
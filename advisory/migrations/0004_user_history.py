@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('advisory', '0003_district_summary_and_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('submissions', models.PositiveIntegerField(default=0)),
+                ('total_area', models.FloatField(default=0, help_text='Hectares')),
+                ('total_predicted_yield', models.FloatField(default=0)),
+                ('total_estimated_gain', models.FloatField(default=0)),
+                ('season_totals', models.JSONField(default=dict)),
+                ('best_season', models.CharField(blank=True, choices=[('kharif', 'Kharif'), ('rabi', 'Rabi'), ('zaid', 'Zaid')], max_length=20)),
+                ('last_submission', models.DateTimeField(null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'user summaries',
+            },
+        ),
+        migrations.AddField(
+            model_name='farminput',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='farm_inputs', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='recommendation',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='recommendations', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='farminput',
+            index=models.Index(fields=['user', 'created_at'], name='farminput_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='recommendation',
+            index=models.Index(fields=['user', 'created_at'], name='recommendation_user_created'),
+        ),
+        migrations.AddField(
+            model_name='usersummary',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='farm_summary', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
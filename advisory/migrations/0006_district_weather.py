@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advisory', '0005_farminput_client_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DistrictWeather',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('district', models.CharField(choices=[('angul', 'Angul'), ('balangir', 'Balangir'), ('balasore', 'Balasore'), ('bargarh', 'Bargarh'), ('bhadrak', 'Bhadrak'), ('boudh', 'Boudh'), ('cuttack', 'Cuttack'), ('deogarh', 'Deogarh'), ('dhenkanal', 'Dhenkanal'), ('gajapati', 'Gajapati'), ('ganjam', 'Ganjam'), ('jagatsinghpur', 'Jagatsinghpur'), ('jajpur', 'Jajpur'), ('jharsuguda', 'Jharsuguda'), ('kalahandi', 'Kalahandi'), ('kandhamal', 'Kandhamal'), ('kendrapara', 'Kendrapara'), ('keonjhar', 'Keonjhar'), ('khordha', 'Khordha'), ('koraput', 'Koraput'), ('malkangiri', 'Malkangiri'), ('mayurbhanj', 'Mayurbhanj'), ('nabarangpur', 'Nabarangpur'), ('nayagarh', 'Nayagarh'), ('nuapada', 'Nuapada'), ('puri', 'Puri'), ('rayagada', 'Rayagada'), ('sambalpur', 'Sambalpur'), ('sonepur', 'Sonepur'), ('sundargarh', 'Sundargarh')], max_length=50, unique=True)),
+                ('fetched_at', models.DateTimeField()),
+                ('temperature', models.FloatField(help_text='Current temperature (°C)')),
+                ('humidity', models.FloatField(help_text='Current relative humidity (%)')),
+                ('rain_5d', models.FloatField(help_text='Forecast rain over the next 5 days (mm)')),
+                ('rainy_days', models.PositiveSmallIntegerField(help_text='Forecast days with at least 2.5 mm of rain')),
+                ('temp_max_5d', models.FloatField(help_text='Highest forecast temperature (°C)')),
+                ('temp_min_5d', models.FloatField(help_text='Lowest forecast temperature (°C)')),
+                ('hot_days', models.PositiveSmallIntegerField(help_text='Forecast days reaching 38 °C')),
+                ('humidity_mean_5d', models.FloatField(help_text='Mean forecast relative humidity (%)')),
+                ('wind_max_5d', models.FloatField(help_text='Highest forecast wind speed (m/s)')),
+            ],
+            options={
+                'verbose_name_plural': 'district weather',
+            },
+        ),
+    ]
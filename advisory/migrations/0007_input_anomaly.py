@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('advisory', '0006_district_weather'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InputAnomaly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(choices=[('combination', 'District, crop and season'), ('field_area', 'Field area'), ('soil_type', 'Soil type'), ('irrigation', 'Irrigation')], db_index=True, max_length=20)),
+                ('message', models.CharField(max_length=255)),
+                ('reviewed', models.BooleanField(db_index=True, default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('farm_input', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomalies', to='advisory.farminput')),
+            ],
+            options={
+                'verbose_name_plural': 'input anomalies',
+            },
+        ),
+    ]
@@ -2,13 +2,91 @@ import random
 import os
 from django.conf import settings
 import statistics
-import pickle
+from collections import Counter
+import numpy as np
+from .attributions import ForestAttributions, RuleAttributions, describe, order_actions
+from .compact_model import CompactForest
+from .features import (
+    CROP_CODES, DISTRICT_CODES, IRRIGATION_CODES, SEASON_CODES, SEED_CODES, SOIL_CODES,
+)
+from .profiling import iter_valid_rows
+from .rules_engine import ACTIONS, RULE_DIMENSIONS, RecommendationRules, crop_label
+from .trends import TrendModel, history_signature
+from .weather import district_weather
+
+COMPACT_MODEL_DIR = os.path.join(settings.BASE_DIR, 'advisory/models/farm_model')
+RULES_PATH = os.path.join(settings.BASE_DIR, 'advisory/rules/recommendations.json')
+TREND_CACHE_PATH = os.path.join(settings.BASE_DIR, 'advisory/models/trends.npz')
+
+# The trained model was fitted on one-hot columns named after the source
+# dataset's spellings ('district_Bolangir', 'season_Summer', ...). These map
+# our form values onto those columns; values without a column fall onto the
+# dropped reference category (all zeros).
+MODEL_COLUMN_ALIASES = {
+    'district': {'balangir': 'Bolangir'},
+    'season': {'kharif': 'Kharif', 'rabi': 'Rabi', 'zaid': 'Summer'},
+    'crop': {'mung': 'Pulses'},
+    'soil_type': {'lateritic': 'Laterite', 'red_black': 'Red'},
+}
+
+# Crops the trained model has actually seen (everything else is extrapolation)
+MODEL_CROPS = {'rice', 'maize', 'wheat', 'groundnut', 'mung', 'cotton'}
+
+# The model predicts quintals per hectare; the rest of the app uses kg/ha
+MODEL_UNIT_TO_KG = 100.0
+
+# Rule-based yield: a base yield per crop (kg/ha) times one multiplier per
+# farming practice; values not listed leave the yield unchanged
+BASE_YIELDS = {
+    'rice': 3200, 'maize': 4200, 'wheat': 3500, 'groundnut': 2200,
+    'mung': 1100, 'cotton': 1600, 'sugarcane': 75000, 'turmeric': 5200
+}
+DEFAULT_BASE_YIELD = 2500
+YIELD_MULTIPLIERS = {
+    'irrigation': {'drip': 1.25, 'tubewell': 1.15, 'canal': 1.15, 'lift': 1.08, 'none': 0.85},
+    'seed_variety': {'hybrid': 1.20, 'hyv': 1.10, 'local': 0.95},
+    'soil_type': {'alluvial': 1.05, 'red_black': 1.02, 'lateritic': 0.98, 'saline': 0.85},
+    # Monsoon advantage, better conditions, summer challenges
+    'season': {'kharif': 1.05, 'rabi': 1.10, 'zaid': 0.95},
+    'soil_health_card': {True: 1.05},
+    'pest_presence': {True: 0.92},
+}
+FLAG_FIELDS = ('soil_health_card', 'pest_presence')
+
+
+def encode_model_features(rows, feature_names):
+    """Encode rows (dicts or FarmInput-like objects) into the trained model's column layout"""
+    index = {name: i for i, name in enumerate(feature_names)}
+    X = np.zeros((len(rows), len(feature_names)))
+    for i, row in enumerate(rows):
+        get = row.get if isinstance(row, dict) else lambda key: getattr(row, key, None)
+        if 'year' in index:
+            year = get('year')
+            if year is None and get('sowing_date') is not None:
+                year = get('sowing_date').year
+            X[i, index['year']] = year if year is not None else np.nan
+        if 'avg_temp_c' in index:
+            # Not collected by the form; left for the imputer
+            X[i, index['avg_temp_c']] = np.nan
+        for column, aliases in MODEL_COLUMN_ALIASES.items():
+            value = get(column)
+            if value is None:
+                continue
+            j = index.get(f"{column}_{aliases.get(value, value.title())}")
+            if j is not None:
+                X[i, j] = 1.0
+    return X
 
 class YieldPredictor:
     def __init__(self):
         self.data = None
         self.is_loaded = False
         self.model = None
+        self.forest_attributions = None
+        self.trends = None
+        self.rejected_rows = Counter()
+        self.rules = RecommendationRules(RULES_PATH)
+        self.rule_attributions = RuleAttributions(BASE_YIELDS, YIELD_MULTIPLIERS, DEFAULT_BASE_YIELD)
         self.load_model()
         
     def load_data(self):
@@ -18,24 +96,13 @@ class YieldPredictor:
             
         try:
             data_path = os.path.join(settings.BASE_DIR, 'combined_tables.txt')
-            data = []
-            with open(data_path, 'r') as f:
-                lines = f.readlines()
-                headers = lines[0].strip().split('\t')
-                for line in lines[1:]:
-                    values = line.strip().split('\t')
-                    if len(values) == len(headers):
-                        row = dict(zip(headers, values))
-                        # Convert numeric fields
-                        try:
-                            row['yield'] = float(row['yield'])
-                            row['field_area'] = float(row['field_area'])
-                            row['rainfall'] = float(row['rainfall'])
-                            row['year'] = int(row['year'])
-                        except:
-                            continue
-                        data.append(row)
+            rejected = Counter()
+            data = list(iter_valid_rows(data_path, rejected=rejected))
+            if rejected:
+                # manage.py profile_data reports which rows and why
+                print(f"Skipped rows in combined_tables.txt, kept {len(data)}: {dict(rejected)}")
             self.data = data
+            self.rejected_rows = rejected
             self.is_loaded = True
             return data
         except Exception as e:
@@ -43,39 +110,33 @@ class YieldPredictor:
             return []
 
     def load_model(self):
-        """Load the trained model from pickle file"""
-        model_path = os.path.join(settings.BASE_DIR, 'advisory/models/farm_model.pkl')
+        """Load the exported model arrays (see manage.py export_model)"""
         try:
-            with open(model_path, 'rb') as f:
-                self.model = pickle.load(f)
+            self.model = CompactForest.load(COMPACT_MODEL_DIR)
+            self.forest_attributions = ForestAttributions(self.model)
             print("Model loaded successfully")
         except Exception as e:
             print(f"Error loading model: {e}")
             self.model = None
 
+    def uses_model(self, farm_input):
+        """Whether this input should be served by the trained model rather than the rules"""
+        # Off by default: see reports/model_evaluation.json before turning it on
+        return (
+            self.model is not None
+            and getattr(settings, 'USE_TRAINED_MODEL', False)
+            and farm_input.crop in MODEL_CROPS
+        )
+
     def prepare_features(self, farm_input):
         """Prepare numerical features for the model"""
-        # Encode categorical variables
-        crop_map = {'rice': 1, 'maize': 2, 'wheat': 3, 'groundnut': 4, 'mung': 5, 'cotton': 6, 'sugarcane': 7, 'turmeric': 8}
-        district_map = {
-            'angul': 1, 'balangir': 2, 'balasore': 3, 'bargarh': 4, 'bhadrak': 5, 'boudh': 6,
-            'cuttack': 7, 'deogarh': 8, 'dhenkanal': 9, 'gajapati': 10, 'ganjam': 11, 'jagatsinghpur': 12,
-            'jajpur': 13, 'jharsuguda': 14, 'kalahandi': 15, 'kandhamal': 16, 'kendrapara': 17, 'keonjhar': 18,
-            'khordha': 19, 'koraput': 20, 'malkangiri': 21, 'mayurbhanj': 22, 'nabarangpur': 23, 'nayagarh': 24,
-            'nuapada': 25, 'puri': 26, 'rayagada': 27, 'sambalpur': 28, 'sonepur': 29, 'sundargarh': 30
-        }
-        season_map = {'kharif': 1, 'rabi': 2, 'zaid': 3}
-        irrigation_map = {'none': 0, 'drip': 1, 'tubewell': 2, 'canal': 3, 'lift': 4}
-        seed_map = {'local': 0, 'hyv': 1, 'hybrid': 2}
-        soil_map = {'alluvial': 1, 'red_black': 2, 'lateritic': 3, 'saline': 4}
-
         features = [
-            crop_map.get(farm_input.crop, 0),
-            district_map.get(farm_input.district, 0),
-            season_map.get(farm_input.season, 0),
-            irrigation_map.get(farm_input.irrigation, 0),
-            seed_map.get(farm_input.seed_variety, 0),
-            soil_map.get(farm_input.soil_type, 0),
+            CROP_CODES.get(farm_input.crop, 0),
+            DISTRICT_CODES.get(farm_input.district, 0),
+            SEASON_CODES.get(farm_input.season, 0),
+            IRRIGATION_CODES.get(farm_input.irrigation, 0),
+            SEED_CODES.get(farm_input.seed_variety, 0),
+            SOIL_CODES.get(farm_input.soil_type, 0),
             1 if farm_input.soil_health_card else 0,
             1 if farm_input.pest_presence else 0
         ]
@@ -83,10 +144,10 @@ class YieldPredictor:
 
     def predict_yield(self, farm_input):
         """Predict yield based on farm input using the trained model or rule-based fallback"""
-        if self.model:
+        if self.uses_model(farm_input):
             try:
-                features = self.prepare_features(farm_input)
-                prediction = self.model.predict([features])[0]
+                features = encode_model_features([farm_input], self.model.features)
+                prediction = self.model.predict(features)[0] * MODEL_UNIT_TO_KG * self.weather_factor(farm_input)
                 # Ensure positive prediction
                 prediction = max(prediction, 100)
                 # Calculate confidence interval (simplified)
@@ -97,65 +158,9 @@ class YieldPredictor:
                 print(f"Model prediction failed: {e}, falling back to rule-based")
 
         # Fallback to rule-based prediction
-        data = self.load_data()
+        prediction = self.rule_based_yield(farm_input)
 
-        # Base yields for different crops (kg/ha)
-        base_yields = {
-            'rice': 3200, 'maize': 4200, 'wheat': 3500, 'groundnut': 2200,
-            'mung': 1100, 'cotton': 1600, 'sugarcane': 75000, 'turmeric': 5200
-        }
-
-        base_yield = base_yields.get(farm_input.crop, 2500)
-
-        # Apply adjustments based on farming practices
-        multiplier = 1.0
-
-        # Irrigation adjustment
-        if farm_input.irrigation == 'drip':
-            multiplier *= 1.25
-        elif farm_input.irrigation in ['tubewell', 'canal']:
-            multiplier *= 1.15
-        elif farm_input.irrigation == 'lift':
-            multiplier *= 1.08
-        elif farm_input.irrigation == 'none':
-            multiplier *= 0.85
-
-        # Seed variety adjustment
-        if farm_input.seed_variety == 'hybrid':
-            multiplier *= 1.20
-        elif farm_input.seed_variety == 'hyv':
-            multiplier *= 1.10
-        elif farm_input.seed_variety == 'local':
-            multiplier *= 0.95
-
-        # Soil type adjustment
-        if farm_input.soil_type == 'alluvial':
-            multiplier *= 1.05
-        elif farm_input.soil_type == 'red_black':
-            multiplier *= 1.02
-        elif farm_input.soil_type == 'lateritic':
-            multiplier *= 0.98
-        elif farm_input.soil_type == 'saline':
-            multiplier *= 0.85
-
-        # Season adjustment
-        if farm_input.season == 'kharif':
-            multiplier *= 1.05  # Monsoon advantage
-        elif farm_input.season == 'rabi':
-            multiplier *= 1.10  # Better conditions
-        elif farm_input.season == 'zaid':
-            multiplier *= 0.95  # Summer challenges
-
-        # Soil health card bonus
-        if farm_input.soil_health_card:
-            multiplier *= 1.05
-
-        # Pest presence penalty
-        if farm_input.pest_presence:
-            multiplier *= 0.92
-
-        # Calculate final prediction
-        prediction = base_yield * multiplier
+        prediction *= self.weather_factor(farm_input)
 
         # Add some randomness for realism
         variation = random.uniform(0.95, 1.05)
@@ -167,88 +172,115 @@ class YieldPredictor:
 
         return max(prediction, 100), confidence
     
+    def expected_yields(self, farm_inputs, weather=True):
+        """Deterministic predicted yields (kg/ha) for many farms in one pass, without the random variation"""
+        yields = np.array([self.rule_based_yield(farm_input) for farm_input in farm_inputs], dtype=float)
+        covered = np.array([self.uses_model(farm_input) for farm_input in farm_inputs], dtype=bool)
+        if covered.any():
+            rows = [farm_input for farm_input, use in zip(farm_inputs, covered) if use]
+            yields[covered] = self.model.predict(encode_model_features(rows, self.model.features)) * MODEL_UNIT_TO_KG
+        if weather:
+            yields *= np.array([self.weather_factor(farm_input) for farm_input in farm_inputs])
+        return np.maximum(yields, 100)
+
+    def weather_factor(self, farm_input):
+        """Yield multiplier from the district's prefetched forecast (1.0 when disabled or unavailable)"""
+        if not getattr(settings, 'WEATHER_ADJUSTMENTS', False):
+            return 1.0
+        return district_weather.factor(farm_input)
+
+    def rule_based_yield(self, farm_input):
+        """Deterministic rule-based yield (kg/ha) before the random variation"""
+        multiplier = 1.0
+        for field, multipliers in YIELD_MULTIPLIERS.items():
+            value = getattr(farm_input, field)
+            if field in FLAG_FIELDS:
+                value = bool(value)
+            multiplier *= multipliers.get(value, 1.0)
+        return BASE_YIELDS.get(farm_input.crop, DEFAULT_BASE_YIELD) * multiplier
+
     def generate_recommendations(self, farm_input, predicted_yield):
-        """Generate actionable recommendations"""
-        # Calculate potential gain based on best practices
-        potential_gain = self._calculate_potential_gain(farm_input)
-        
-        recommendations = {
-            'action_1': self._get_priority_action_1(farm_input),
-            'action_2': self._get_priority_action_2(farm_input),
-            'action_3': self._get_priority_action_3(farm_input),
-            'reasoning': f"AI analysis of {farm_input.get_crop_display()} in {farm_input.get_district_display()} during {farm_input.get_season_display()} season using {farm_input.get_irrigation_display()} irrigation on {farm_input.get_soil_type_display()} soil.",
-            'estimated_gain': potential_gain
-        }
-        
+        """Generate actionable recommendations from the compiled rules table"""
+        return self.generate_recommendations_batch([farm_input])[0]
+
+    def generate_recommendations_batch(self, farm_inputs):
+        """Recommendations for many farms with one decision-table lookup"""
+        table = self.rules.table()
+        coords = table.encode(farm_inputs)
+        result = self.rule_actions(table, coords)
+        attributions = self.feature_attributions(farm_inputs, coords)
+        recommendations = []
+        for i, farm_input in enumerate(farm_inputs):
+            recommendation = {action: table.text(result[action][i], crop_label(farm_input.crop)) for action in ACTIONS}
+            recommendation['estimated_gain'] = float(result['estimated_gain'][i])
+            recommendation['reasoning'] = self._reasoning(farm_input, attributions[i])
+            recommendations.append(recommendation)
         return recommendations
-    
-    def _calculate_potential_gain(self, farm_input):
-        """Calculate potential yield gain from improved practices"""
-        gain = 0
-        
-        # Irrigation improvement potential
-        if farm_input.irrigation == 'none':
-            gain += 20
-        elif farm_input.irrigation in ['lift', 'canal']:
-            gain += 8
-        elif farm_input.irrigation == 'tubewell':
-            gain += 5
-        
-        # Seed variety improvement
-        if farm_input.seed_variety == 'local':
-            gain += 15
-        elif farm_input.seed_variety == 'hyv':
-            gain += 8
-        
-        # Soil health improvement
-        if not farm_input.soil_health_card:
-            gain += 10
-        
-        # Pest management
-        if farm_input.pest_presence:
-            gain += 12
-        
-        # Cap the gain between 5-25%
-        return min(max(gain, 5), 25)
-    
-    def _get_priority_action_1(self, farm_input):
-        """Get highest priority immediate action"""
-        if farm_input.irrigation == 'none' and farm_input.crop in ['rice', 'sugarcane']:
-            return "URGENT: Install irrigation system immediately - these crops need consistent water supply for survival and yield"
-        elif farm_input.pest_presence:
-            return "IMMEDIATE: Apply integrated pest management - spray neem oil and set up pheromone traps within 2 days"
-        elif not farm_input.soil_health_card:
-            return "HIGH PRIORITY: Get soil health card from nearest agriculture office to optimize fertilizer application"
-        elif farm_input.irrigation == 'none':
-            return "CRITICAL: Install drip irrigation system to increase water efficiency and boost yield by 20-25%"
-        else:
-            return "OPTIMIZE: Monitor soil moisture daily and apply irrigation at critical crop growth stages"
-    
-    def _get_priority_action_2(self, farm_input):
-        """Get second priority action"""
-        if farm_input.soil_health_card:
-            crop_fertilizer = {
-                'rice': "Apply 120:60:40 NPK kg/ha in 3 splits - 50% basal, 25% tillering, 25% panicle stage",
-                'maize': "Apply 150:75:40 NPK kg/ha - 1/3 at sowing, 1/3 at knee-high, 1/3 at tasseling",
-                'wheat': "Apply 120:60:40 NPK kg/ha in 3 splits based on soil test recommendations",
-                'groundnut': "Apply 20:60:40 NPK kg/ha - groundnut fixes nitrogen naturally",
-                'cotton': "Apply 150:75:75 NPK kg/ha in splits with micronutrients",
-                'sugarcane': "Apply 300:150:150 NPK kg/ha in 4 splits throughout growing season"
-            }
-            return crop_fertilizer.get(farm_input.crop, "Apply balanced NPK fertilizer as per soil test in 2-3 splits")
-        else:
-            return "Apply balanced NPK fertilizer (consult agriculture officer) and get soil testing done immediately"
-    
-    def _get_priority_action_3(self, farm_input):
-        """Get third priority action"""
-        if farm_input.seed_variety == 'local':
-            return f"UPGRADE: Switch to hybrid or HYV {farm_input.crop} varieties for 15-20% higher yield next season"
-        elif farm_input.season == 'kharif':
-            return "WEATHER PREP: Monitor weather forecasts and provide drainage during heavy rains to prevent waterlogging"
-        elif farm_input.season == 'rabi':
-            return "TIMING: Ensure timely sowing and harvest to avoid heat stress and maximize market prices"
-        else:
-            return "FIELD MANAGEMENT: Maintain proper plant spacing, weed control, and regular field monitoring for diseases"
+
+    def rule_actions(self, table, coords):
+        """Rules table lookup with each farm's actions ordered by the yield loss they address"""
+        result = table.evaluate(coords)
+        result.update(order_actions(table, result, self.rule_attributions.log_effects(coords)))
+        return result
+
+    def feature_attributions(self, farm_inputs, coords=None):
+        """Per farm, {field: fractional yield change against an average farm}, largest first"""
+        if coords is None:
+            coords = self.rules.table().encode(farm_inputs)
+        fractions = np.expm1(self.rule_attributions.log_effects(coords))
+        attributions = [dict(zip(RULE_DIMENSIONS, row)) for row in fractions]
+
+        covered = [i for i, farm_input in enumerate(farm_inputs) if self.uses_model(farm_input)]
+        if covered:
+            X = encode_model_features([farm_inputs[i] for i in covered], self.model.features)
+            for i, row in zip(covered, self.forest_attributions.fractions(X)):
+                attributions[i] = dict(zip(self.forest_attributions.fields, row))
+
+        for farm_input, attribution in zip(farm_inputs, attributions):
+            weather = self.weather_factor(farm_input)
+            if weather != 1.0:
+                attribution['weather'] = weather - 1.0
+        return [
+            dict(sorted(((field, float(effect)) for field, effect in attribution.items()), key=lambda item: -abs(item[1])))
+            for attribution in attributions
+        ]
+
+    def _reasoning(self, farm_input, attributions):
+        reasoning = f"AI analysis of {farm_input.get_crop_display()} in {farm_input.get_district_display()} during {farm_input.get_season_display()} season using {farm_input.get_irrigation_display()} irrigation on {farm_input.get_soil_type_display()} soil."
+        factors = describe(farm_input, attributions)
+        if factors:
+            reasoning += f" Biggest factors against an average farm: {factors}."
+        return reasoning
+
+    def trend_model(self):
+        """Trend fits for all district/crop/season series, from the cache when the history is unchanged"""
+        if self.trends is None:
+            data = self.load_data()
+            signature = history_signature(data)
+            trends = TrendModel.load(TREND_CACHE_PATH, signature)
+            if trends is None:
+                trends = TrendModel.fit(data)
+                try:
+                    trends.save(TREND_CACHE_PATH, signature)
+                except OSError as e:
+                    print(f"Error caching trend model: {e}")
+            self.trends = trends
+        return self.trends
+
+    def forecast_next_year(self, district, crop, season):
+        """Next year's yield forecast (kg/ha) from the district's own history, or None without history"""
+        return self.trend_model().forecast_series(district, crop, season)
+
+    def ingest_history(self, rows):
+        """Add newly harvested seasons to the history and update the trend fits incrementally"""
+        trends = self.trend_model()
+        self.data = self.load_data() + list(rows)
+        trends.ingest(rows)
+        try:
+            trends.save(TREND_CACHE_PATH, history_signature(self.data))
+        except OSError as e:
+            print(f"Error caching trend model: {e}")
+        return trends
 
     def get_district_average(self, district, crop, season):
         """Get average yield for district, crop, season combination"""
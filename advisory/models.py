@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 
 class FarmInput(models.Model):
@@ -38,8 +39,8 @@ class FarmInput(models.Model):
         ('local', 'Local'), ('hyv', 'HYV'), ('hybrid', 'Hybrid')
     ]
     
-    district = models.CharField(max_length=50, choices=DISTRICT_CHOICES)
-    crop = models.CharField(max_length=50, choices=CROP_CHOICES)
+    district = models.CharField(max_length=50, choices=DISTRICT_CHOICES, db_index=True)
+    crop = models.CharField(max_length=50, choices=CROP_CHOICES, db_index=True)
     season = models.CharField(max_length=20, choices=SEASON_CHOICES)
     sowing_date = models.DateField()
     field_area = models.FloatField(help_text="Area in hectares")
@@ -48,7 +49,13 @@ class FarmInput(models.Model):
     soil_health_card = models.BooleanField(default=False)
     seed_variety = models.CharField(max_length=20, choices=SEED_CHOICES)
     pest_presence = models.BooleanField(default=False)
-    created_at = models.DateTimeField(auto_now_add=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='farm_inputs')
+    # Generated by the browser so retried or offline-synced submissions are saved once
+    client_id = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'created_at'], name='farminput_user_created')]
     
     def __str__(self):
         return f"{self.crop} - {self.district} - {self.season}"
@@ -62,7 +69,12 @@ class Recommendation(models.Model):
     action_2 = models.TextField()
     action_3 = models.TextField()
     reasoning = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Copied from farm_input so a user's history is read from one index
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='recommendations')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'created_at'], name='recommendation_user_created')]
 
     def __str__(self):
         return f"Recommendation for {self.farm_input}"
@@ -76,3 +88,103 @@ class Contact(models.Model):
 
     def __str__(self):
         return f"Contact from {self.name}: {self.subject}"
+
+class DistrictSummary(models.Model):
+    """Precomputed recommendation aggregates per district/crop/season (manage.py refresh_district_summaries)"""
+    district = models.CharField(max_length=50, choices=FarmInput.DISTRICT_CHOICES)
+    crop = models.CharField(max_length=50, choices=FarmInput.CROP_CHOICES)
+    season = models.CharField(max_length=20, choices=FarmInput.SEASON_CHOICES)
+    submissions = models.PositiveIntegerField(default=0)
+    total_area = models.FloatField(default=0, help_text="Hectares")
+    avg_predicted_yield = models.FloatField(default=0)
+    avg_estimated_gain = models.FloatField(default=0)
+    first_submission = models.DateTimeField(null=True)
+    last_submission = models.DateTimeField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['district', 'crop', 'season']
+        verbose_name_plural = 'district summaries'
+
+    def __str__(self):
+        return f"{self.district} - {self.crop} - {self.season}"
+
+class UserSummary(models.Model):
+    """Running per-user recommendation aggregates, updated as each recommendation is saved"""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='farm_summary')
+    submissions = models.PositiveIntegerField(default=0)
+    total_area = models.FloatField(default=0, help_text="Hectares")
+    total_predicted_yield = models.FloatField(default=0)
+    total_estimated_gain = models.FloatField(default=0)
+    # {season: [submissions, total predicted yield]}
+    season_totals = models.JSONField(default=dict)
+    best_season = models.CharField(max_length=20, choices=FarmInput.SEASON_CHOICES, blank=True)
+    last_submission = models.DateTimeField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'user summaries'
+
+    @property
+    def avg_predicted_yield(self):
+        return self.total_predicted_yield / self.submissions if self.submissions else 0
+
+    @property
+    def avg_estimated_gain(self):
+        return self.total_estimated_gain / self.submissions if self.submissions else 0
+
+    def add(self, recommendation):
+        """Fold one new recommendation (with its farm_input) into the totals"""
+        farm_input = recommendation.farm_input
+        self.submissions += 1
+        self.total_area += farm_input.field_area
+        self.total_predicted_yield += recommendation.predicted_yield
+        self.total_estimated_gain += recommendation.estimated_gain
+        count, total = self.season_totals.get(farm_input.season, [0, 0.0])
+        self.season_totals[farm_input.season] = [count + 1, total + recommendation.predicted_yield]
+        # Season with the highest average predicted yield
+        self.best_season = max(self.season_totals, key=lambda season: self.season_totals[season][1] / self.season_totals[season][0])
+        if self.last_submission is None or recommendation.created_at > self.last_submission:
+            self.last_submission = recommendation.created_at
+
+    def __str__(self):
+        return f"Summary for {self.user}"
+
+class DistrictWeather(models.Model):
+    """Latest prefetched weather features for a district (manage.py prefetch_weather)"""
+    district = models.CharField(max_length=50, choices=FarmInput.DISTRICT_CHOICES, unique=True)
+    fetched_at = models.DateTimeField()
+    temperature = models.FloatField(help_text="Current temperature (°C)")
+    humidity = models.FloatField(help_text="Current relative humidity (%)")
+    rain_5d = models.FloatField(help_text="Forecast rain over the next 5 days (mm)")
+    rainy_days = models.PositiveSmallIntegerField(help_text="Forecast days with at least 2.5 mm of rain")
+    temp_max_5d = models.FloatField(help_text="Highest forecast temperature (°C)")
+    temp_min_5d = models.FloatField(help_text="Lowest forecast temperature (°C)")
+    hot_days = models.PositiveSmallIntegerField(help_text="Forecast days reaching 38 °C")
+    humidity_mean_5d = models.FloatField(help_text="Mean forecast relative humidity (%)")
+    wind_max_5d = models.FloatField(help_text="Highest forecast wind speed (m/s)")
+
+    class Meta:
+        verbose_name_plural = 'district weather'
+
+    def __str__(self):
+        return f"{self.get_district_display()} weather at {self.fetched_at:%Y-%m-%d %H:%M}"
+
+class InputAnomaly(models.Model):
+    """A submitted farm input that does not match the historical records (advisory/anomalies.py)"""
+    FIELD_CHOICES = [
+        ('combination', 'District, crop and season'), ('field_area', 'Field area'),
+        ('soil_type', 'Soil type'), ('irrigation', 'Irrigation'),
+    ]
+
+    farm_input = models.ForeignKey(FarmInput, on_delete=models.CASCADE, related_name='anomalies')
+    field = models.CharField(max_length=20, choices=FIELD_CHOICES, db_index=True)
+    message = models.CharField(max_length=255)
+    reviewed = models.BooleanField(default=False, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name_plural = 'input anomalies'
+
+    def __str__(self):
+        return f"{self.get_field_display()}: {self.farm_input}"
@@ -0,0 +1,89 @@
+"""
+Prediction bundles for the offline (PWA) mode.
+
+A bundle holds everything the browser needs to answer the farm input form
+for one district without the server: the predicted yield, the three action
+texts and the estimated gain for every cell of the rule grid
+(crop x season x irrigation x seed x soil x soil health card x pest, 5,760
+cells), plus district averages and trend forecasts per crop and season.
+
+Arrays are flattened in C order over RULE_DIMENSIONS, so the cell for a farm
+is sum(position[axis] * stride[axis]). The version is a hash of the content:
+the service worker refetches a bundle only when its version changes.
+"""
+import hashlib
+import json
+from functools import lru_cache
+from types import SimpleNamespace
+
+import numpy as np
+from django.conf import settings
+from django.utils.translation import get_language
+
+from .ml_model import yield_predictor
+from .rules_engine import ACTIONS, RULE_DIMENSIONS, crop_label
+
+BUNDLE_FORMAT = 1
+
+# The server adds ±5% random variation and reports ±12%; offline results
+# use the deterministic yield with the same interval
+CONFIDENCE_FRACTION = 0.12
+
+
+def _grid_inputs(district, table):
+    """One FarmInput-like object per cell of the rule grid, in C order"""
+    cells = np.indices(table.shape).reshape(len(RULE_DIMENSIONS), -1).T
+    farm_inputs = []
+    for cell in cells:
+        values = {field: table.axes[axis][i] for axis, (field, i) in enumerate(zip(RULE_DIMENSIONS, cell))}
+        farm_inputs.append(SimpleNamespace(district=district, sowing_date=None, **values))
+    return farm_inputs
+
+
+@lru_cache(maxsize=128)
+def _build_bundle(district, language, table, use_model):
+    # `table` is part of the key so an edited rules file yields new bundles
+    farm_inputs = _grid_inputs(district, table)
+    # Actions in the same order the server gives them
+    result = yield_predictor.rule_actions(table, table.encode(farm_inputs))
+    texts = [table.text(i, '{crop}') for i in range(len(table.texts))]
+
+    by_crop_season = {}
+    for crop in table.axes[RULE_DIMENSIONS.index('crop')]:
+        for season in table.axes[RULE_DIMENSIONS.index('season')]:
+            forecast = yield_predictor.forecast_next_year(district, crop, season)
+            by_crop_season[f'{crop}|{season}'] = {
+                'district_avg': yield_predictor.get_district_average(district, crop, season),
+                'forecast': round(forecast['forecast']) if forecast else None,
+                'forecast_year': forecast['year'] if forecast else None,
+            }
+
+    payload = {
+        'format': BUNDLE_FORMAT,
+        'district': district,
+        'language': language,
+        'dimensions': [
+            {'field': field, 'values': [str(value).lower() if isinstance(value, bool) else value for value in axis]}
+            for field, axis in zip(RULE_DIMENSIONS, table.axes)
+        ],
+        # Weather adjustments change through the day, so bundles leave them out
+        'yield': np.round(yield_predictor.expected_yields(farm_inputs, weather=False)).astype(int).tolist(),
+        'confidence_fraction': CONFIDENCE_FRACTION,
+        'actions': {action: result[action].ravel().tolist() for action in ACTIONS},
+        'estimated_gain': np.round(result['estimated_gain'].ravel(), 1).tolist(),
+        'texts': texts,
+        # {crop} in the texts is filled with these, as on the server
+        'crop_labels': {crop: crop_label(crop) for crop in table.axes[RULE_DIMENSIONS.index('crop')]},
+        'by_crop_season': by_crop_season,
+    }
+    body = json.dumps(payload, separators=(',', ':'), sort_keys=True)
+    payload['version'] = hashlib.sha256(body.encode()).hexdigest()[:16]
+    return payload
+
+
+def district_bundle(district):
+    """The offline prediction bundle for a district in the active language"""
+    return _build_bundle(
+        district, get_language() or settings.LANGUAGE_CODE, yield_predictor.rules.table(),
+        bool(getattr(settings, 'USE_TRAINED_MODEL', False)),
+    )
@@ -0,0 +1,370 @@
+"""
+Crop planning across a farmer's plots: which crop, seed and irrigation to use on each.
+
+Every crop × seed × irrigation option of every plot is scored in one
+`yield_predictor.expected_yields` call and valued at the crop's price, less the
+seed cost, per season the crop occupies the field (sugarcane's 75 t/ha are
+worth far less per kg than a pulse's 1.1 t/ha). Choosing one option per plot
+to maximize the total value under a shared irrigation-water limit and seed
+budget is a multiple-choice knapsack with two constraints. It is solved by
+dynamic programming over the seed budget, discretized into
+KNAPSACK_RESOLUTION steps (costs rounded up, so plans always fit). Water
+enters the objective with a Lagrange multiplier, found by bisection. A greedy
+pass then spends what rounding and the multiplier left unused. The same
+program with costs rounded down gives an upper bound on the best possible
+total, reported with the gap to the plan.
+"""
+import math
+import time
+from datetime import date
+from types import SimpleNamespace
+
+import numpy as np
+
+from .ml_model import yield_predictor
+from .models import FarmInput
+
+MAX_PLOTS = 50
+KNAPSACK_RESOLUTION = 500
+BISECTION_STEPS = 30
+# Plots whose options are mixed exhaustively after the bisection (2^n plans)
+MAX_COMBINED_PLOTS = 14
+
+# Crop water requirement over the season (mm), and the rain each season
+# typically leaves in the root zone (mm)
+WATER_NEED_MM = {
+    'rice': 1200, 'maize': 550, 'wheat': 450, 'groundnut': 500,
+    'mung': 350, 'cotton': 700, 'sugarcane': 1800, 'turmeric': 1300,
+}
+EFFECTIVE_RAIN_MM = {'kharif': 700, 'rabi': 50, 'zaid': 30}
+# Share of pumped or diverted water that reaches the crop; rainfed plots use none
+IRRIGATION_EFFICIENCY = {'drip': 0.9, 'tubewell': 0.7, 'lift': 0.65, 'canal': 0.5}
+
+# Indicative farm-gate price (₹/kg of the predicted yield), around the
+# 2024-25 minimum support prices; requests can override them with "prices"
+CROP_PRICE_PER_KG = {
+    'rice': 23, 'maize': 22, 'wheat': 23, 'groundnut': 68,
+    'mung': 87, 'cotton': 71, 'sugarcane': 3.4, 'turmeric': 14,
+}
+# Seasons a crop holds the field; its value is spread over them
+SEASONS_OCCUPIED = {'sugarcane': 3, 'turmeric': 2}
+
+# Indicative seed cost per hectare (₹)
+SEED_COST_PER_HA = {
+    'rice': {'local': 1200, 'hyv': 1800, 'hybrid': 4500},
+    'maize': {'local': 1500, 'hyv': 2500, 'hybrid': 6000},
+    'wheat': {'local': 3000, 'hyv': 4000, 'hybrid': 6000},
+    'groundnut': {'local': 8000, 'hyv': 10000, 'hybrid': 12000},
+    'mung': {'local': 1500, 'hyv': 2000, 'hybrid': 3000},
+    'cotton': {'local': 1500, 'hyv': 2500, 'hybrid': 4000},
+    'sugarcane': {'local': 25000, 'hyv': 30000, 'hybrid': 35000},
+    'turmeric': {'local': 40000, 'hyv': 50000, 'hybrid': 60000},
+}
+
+CROPS = [value for value, _ in FarmInput.CROP_CHOICES]
+SEEDS = [value for value, _ in FarmInput.SEED_CHOICES]
+IRRIGATIONS = [value for value, _ in FarmInput.IRRIGATION_CHOICES]
+
+
+class PlanError(ValueError):
+    pass
+
+
+def water_m3(crop, season, irrigation, field_area):
+    """Irrigation water a plot needs over the season (m³)"""
+    if irrigation == 'none':
+        return 0.0
+    deficit_mm = max(0, WATER_NEED_MM[crop] - EFFECTIVE_RAIN_MM[season])
+    # 1 mm over 1 ha is 10 m³
+    return field_area * 10 * deficit_mm / IRRIGATION_EFFICIENCY[irrigation]
+
+
+def _choice(data, key, choices, default=None):
+    value = data.get(key, default)
+    if value not in choices:
+        raise PlanError(f"Invalid {key}: {value!r}")
+    return value
+
+
+def _choices(data, key, choices, default, allow_empty=False):
+    values = data.get(key, default)
+    if isinstance(values, str):
+        values = [values]
+    if not isinstance(values, list) or not (values or allow_empty) or any(value not in choices for value in values):
+        raise PlanError(f"Invalid {key}: {values!r}")
+    return list(dict.fromkeys(values))
+
+
+def _limit(data, key):
+    value = data.get(key)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value < 0:
+        raise PlanError(f"Invalid {key}: {value!r}")
+    return float(value)
+
+
+def parse_plan_request(data):
+    """Validated plan parameters from a request body; raises PlanError"""
+    if not isinstance(data, dict):
+        raise PlanError('Expected a JSON object')
+    district = _choice(data, 'district', dict(FarmInput.DISTRICT_CHOICES))
+    season = _choice(data, 'season', dict(FarmInput.SEASON_CHOICES))
+    try:
+        sowing_date = date.fromisoformat(data['sowing_date']) if data.get('sowing_date') else date.today()
+    except (TypeError, ValueError):
+        raise PlanError(f"Invalid sowing_date: {data.get('sowing_date')!r}")
+    crops = _choices(data, 'crops', CROPS, CROPS)
+    prices = data.get('prices', {})
+    if not isinstance(prices, dict) or any(crop not in CROP_PRICE_PER_KG for crop in prices):
+        raise PlanError(f"Invalid prices: {prices!r}")
+
+    plots = data.get('plots')
+    if not isinstance(plots, list) or not plots or not all(isinstance(plot, dict) for plot in plots):
+        raise PlanError('Expected a non-empty list of plots')
+    if len(plots) > MAX_PLOTS:
+        raise PlanError(f'At most {MAX_PLOTS} plots per plan')
+
+    parsed = []
+    for i, plot in enumerate(plots):
+        area = plot.get('field_area')
+        if isinstance(area, bool) or not isinstance(area, (int, float)) or not math.isfinite(area) or area <= 0:
+            raise PlanError(f"Invalid field_area for plot {i + 1}: {area!r}")
+        parsed.append({
+            'name': str(plot.get('name') or f'Plot {i + 1}'),
+            'field_area': float(area),
+            'soil_type': _choice(plot, 'soil_type', dict(FarmInput.SOIL_CHOICES)),
+            # Any plot can be left rainfed
+            'irrigation': list(dict.fromkeys(_choices(plot, 'irrigation', IRRIGATIONS, [], allow_empty=True) + ['none'])),
+            'soil_health_card': bool(plot.get('soil_health_card', False)),
+            'pest_presence': bool(plot.get('pest_presence', False)),
+            'crops': _choices(plot, 'crops', crops, crops),
+        })
+    return {
+        'district': district,
+        'season': season,
+        'sowing_date': sowing_date,
+        'water_limit_m3': _limit(data, 'water_limit_m3'),
+        'seed_budget': _limit(data, 'seed_budget'),
+        'prices': {**CROP_PRICE_PER_KG, **{crop: _limit(prices, crop) for crop in prices}},
+        'plots': parsed,
+    }
+
+
+def _discretize(costs, limit):
+    """Integer knapsack weights rounded up and down, and the capacity, for a limit"""
+    if limit > 0:
+        unit = limit / KNAPSACK_RESOLUTION
+        capacity = KNAPSACK_RESOLUTION
+    else:
+        unit, capacity = 1.0, 0
+    scaled = costs / unit
+    # The tolerance keeps float noise from pushing an exact fit up a step
+    return np.ceil(scaled - 1e-9).astype(np.int64), np.floor(scaled + 1e-9).astype(np.int64), capacity
+
+
+def _frontier(values, costs):
+    """Per plot, the options no cheaper-or-equal option beats, packed to the left; others get -inf"""
+    order = np.lexsort((-values, costs))
+    sorted_values = np.take_along_axis(values, order, axis=1)
+    best_before = np.maximum.accumulate(
+        np.concatenate([np.full((len(values), 1), -np.inf), sorted_values[:, :-1]], axis=1), axis=1
+    )
+    keep = sorted_values > best_before
+    width = max(int(keep.sum(axis=1).max()), 1)
+    packed = np.argsort(~keep, axis=1, kind='stable')[:, :width]
+    options = np.take_along_axis(order, packed, axis=1)
+    kept = np.take_along_axis(keep, packed, axis=1)
+    return options, np.where(kept, np.take_along_axis(values, options, axis=1), -np.inf)
+
+
+def _knapsack(values, costs, capacity):
+    """One option per plot maximizing total value with integer costs summing to at most capacity"""
+    options, values = _frontier(values, costs)
+    costs = np.take_along_axis(costs, options, axis=1)
+    steps = np.arange(capacity + 1)
+    # best[k]: highest total of the plots so far with cost at most k
+    best = np.zeros(capacity + 1)
+    picks = np.empty((len(values), capacity + 1), dtype=np.int64)
+    for i in range(len(values)):
+        before = steps - costs[i][:, np.newaxis]
+        totals = np.where(before >= 0, best[np.maximum(before, 0)], -np.inf) + values[i][:, np.newaxis]
+        picks[i] = totals.argmax(axis=0)
+        best = totals[picks[i], steps]
+
+    choice = np.empty(len(values), dtype=np.int64)
+    k = capacity
+    for i in reversed(range(len(values))):
+        choice[i] = options[i, picks[i, k]]
+        k -= costs[i, picks[i, k]]
+    return choice, float(best[capacity])
+
+
+def _improve(choice, values, constraints):
+    """Switch plots to better options while every (costs, limit) constraint still holds"""
+    rows = np.arange(len(values))
+    choice = choice.copy()
+    while True:
+        gain = values - values[rows, choice][:, np.newaxis]
+        fits = gain > 0
+        for costs, limit in constraints:
+            used = costs[rows, choice]
+            fits &= used.sum() - used[:, np.newaxis] + costs <= limit + 1e-6
+        if not fits.any():
+            return choice
+        i, j = np.unravel_index(np.where(fits, gain, 0).argmax(), gain.shape)
+        choice[i] = j
+
+
+def _combine(feasible, other, values, constraints):
+    """Best plan within the constraints taking each plot's option from one of two plans"""
+    rows = np.arange(len(values))
+    differ = np.flatnonzero(feasible != other)
+    gain = values[differ, other[differ]] - values[differ, feasible[differ]]
+    # Plots that add the most production first; others keep the feasible option
+    differ = differ[np.argsort(-gain, kind='stable')][:MAX_COMBINED_PLOTS]
+    masks = (np.arange(2 ** len(differ))[:, np.newaxis] >> np.arange(len(differ))) & 1
+    fits = np.ones(len(masks), dtype=bool)
+    for costs, limit in constraints:
+        change = costs[differ, other[differ]] - costs[differ, feasible[differ]]
+        fits &= costs[rows, feasible].sum() + masks @ change <= limit + 1e-6
+    totals = np.where(fits, masks @ (values[differ, other[differ]] - values[differ, feasible[differ]]), -np.inf)
+    choice = feasible.copy()
+    best = masks[totals.argmax()].astype(bool)
+    choice[differ[best]] = other[differ[best]]
+    return choice
+
+
+def _lagrangian(values, dp_costs, dp_limit, penalty, penalty_limit, constraints):
+    """Knapsack over dp_costs with penalty priced into the values; returns (choice, upper bound)"""
+    rows = np.arange(len(values))
+    ceil_costs, floor_costs, capacity = _discretize(dp_costs, dp_limit)
+
+    def relaxed(multiplier, weights):
+        adjusted = values if penalty is None else values - multiplier * penalty
+        return _knapsack(adjusted, weights, capacity)
+
+    multiplier = 0.0
+    choice, _ = relaxed(multiplier, ceil_costs)
+    if penalty is not None and penalty[rows, choice].sum() > penalty_limit + 1e-6:
+        # Past the highest value per unit of penalty, no option that uses it is worth choosing
+        priced = penalty > 0
+        low, high = 0.0, float((values[priced] / penalty[priced]).max()) * (1 + 1e-6) + 1e-9
+        over = choice
+        choice, _ = relaxed(high, ceil_costs)
+        for _ in range(BISECTION_STEPS):
+            middle = (low + high) / 2
+            candidate, _ = relaxed(middle, ceil_costs)
+            if penalty[rows, candidate].sum() <= penalty_limit + 1e-6:
+                high = middle
+                if values[rows, candidate].sum() >= values[rows, choice].sum():
+                    choice = candidate
+            else:
+                low = middle
+                over = candidate
+        multiplier = high
+        # The plans either side of the multiplier can leave much of the limit unused; mix them
+        choice = _combine(choice, over, values, constraints)
+
+    choice = _improve(choice, values, constraints)
+    _, bound = relaxed(multiplier, floor_costs)
+    if penalty is not None:
+        bound += multiplier * penalty_limit
+    return choice, bound
+
+
+def solve(values, water, costs, water_limit=None, budget=None):
+    """Option index per plot maximizing total value within the water limit and budget, and an upper bound on that total
+
+    Each plot must have a zero-water, zero-cost option so a plan always exists.
+    """
+    rows = np.arange(len(values))
+    if water_limit is None and budget is None:
+        choice = values.argmax(axis=1)
+        return choice, float(values[rows, choice].sum())
+
+    constraints = [(c, limit) for c, limit in ((water, water_limit), (costs, budget)) if limit is not None]
+    if water_limit is None or budget is None:
+        (dp_costs, dp_limit), = constraints
+        return _lagrangian(values, dp_costs, dp_limit, None, None, constraints)
+
+    # With both limits, price each into the other's knapsack and keep the better plan
+    plans = [
+        _lagrangian(values, costs, budget, water, water_limit, constraints),
+        _lagrangian(values, water, water_limit, costs, budget, constraints),
+    ]
+    choice = max(plans, key=lambda plan: values[rows, plan[0]].sum())[0]
+    return choice, min(bound for _, bound in plans)
+
+
+def plan_crops(request_data):
+    """Best crop, seed and irrigation per plot for a plan request (see parse_plan_request)"""
+    start = time.perf_counter()
+    plan = parse_plan_request(request_data)
+    season = plan['season']
+
+    # Option 0 of every plot leaves it fallow
+    options = []
+    for plot in plan['plots']:
+        plot_options = [None]
+        for crop in plot['crops']:
+            for seed_variety in SEEDS:
+                for irrigation in plot['irrigation']:
+                    plot_options.append(SimpleNamespace(
+                        district=plan['district'], season=season, sowing_date=plan['sowing_date'],
+                        crop=crop, seed_variety=seed_variety, irrigation=irrigation,
+                        field_area=plot['field_area'], soil_type=plot['soil_type'],
+                        soil_health_card=plot['soil_health_card'], pest_presence=plot['pest_presence'],
+                    ))
+        options.append(plot_options)
+
+    scored = [option for plot_options in options for option in plot_options[1:]]
+    yields = iter(yield_predictor.expected_yields(scored))
+
+    width = max(len(plot_options) for plot_options in options)
+    values = np.full((len(options), width), -np.inf)
+    water = np.zeros((len(options), width))
+    costs = np.zeros((len(options), width))
+    predicted = np.zeros((len(options), width))
+    for i, plot_options in enumerate(options):
+        values[i, 0] = 0.0
+        for j, option in enumerate(plot_options[1:], start=1):
+            predicted[i, j] = next(yields)
+            water[i, j] = water_m3(option.crop, season, option.irrigation, option.field_area)
+            costs[i, j] = SEED_COST_PER_HA[option.crop][option.seed_variety] * option.field_area
+            revenue = predicted[i, j] * option.field_area * plan['prices'][option.crop]
+            values[i, j] = (revenue - costs[i, j]) / SEASONS_OCCUPIED.get(option.crop, 1)
+
+    choice, bound = solve(values, water, costs, plan['water_limit_m3'], plan['seed_budget'])
+
+    rows = []
+    for i, (plot, j) in enumerate(zip(plan['plots'], choice)):
+        option = options[i][j]
+        rows.append({
+            'name': plot['name'],
+            'field_area': plot['field_area'],
+            'crop': option.crop if option else None,
+            'seed_variety': option.seed_variety if option else None,
+            'irrigation': option.irrigation if option else None,
+            'predicted_yield': round(float(predicted[i, j])),
+            'production': round(float(predicted[i, j] * plot['field_area'])) if option else 0,
+            'value': round(float(values[i, j])),
+            'water_m3': round(float(water[i, j])),
+            'seed_cost': round(float(costs[i, j])),
+        })
+    chosen = np.arange(len(choice)), choice
+    total = float(values[chosen].sum())
+    return {
+        'plots': rows,
+        'total_value': round(total),
+        'total_production': sum(row['production'] for row in rows),
+        'total_water_m3': round(float(water[chosen].sum())),
+        'total_seed_cost': round(float(costs[chosen].sum())),
+        'water_limit_m3': plan['water_limit_m3'],
+        'seed_budget': plan['seed_budget'],
+        'upper_bound': round(bound),
+        # Rounding can leave the plan a hair above the bound; never report -0.0
+        'gap': max(0.0, round(1 - total / bound, 4)) if bound > 0 else 0.0,
+        'options_scored': len(scored),
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 1),
+    }
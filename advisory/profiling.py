@@ -0,0 +1,425 @@
+"""
+Streaming data-quality profile of the training table (combined_tables.txt/.xlsx).
+
+The table is read in fixed-size chunks and each chunk is checked and
+summarised with NumPy, so memory stays bounded by the chunk size no matter
+how long the file is. Two passes are made:
+
+1. Validate rows and count the reject reasons. For accepted rows, merge
+   per-column moments, min/max, category counts and per-crop histograms of
+   log10(yield).
+2. Flag yield outliers against per-crop fences read from those histograms.
+   A sugarcane yield of 75,000 kg/ha is normal next to other sugarcane, but
+   would look extreme next to the cereals at about 3,000.
+
+The JSON report ends in a `gate` section that training/evaluation checks
+before using the data (see `require_passing_profile`). YieldPredictor.load_data
+reads the table through the same checks (`iter_valid_rows`), so the profile
+describes exactly the rows that are used.
+"""
+import hashlib
+import json
+import os
+from collections import Counter
+from datetime import datetime, timezone
+from itertools import islice
+
+import numpy as np
+
+from .features import category_values
+
+COLUMNS = [
+    'year', 'district', 'crop', 'season', 'irrigation', 'soil_type',
+    'seed_variety', 'field_area', 'rainfall', 'yield',
+]
+NUMERIC_COLUMNS = ['year', 'field_area', 'rainfall', 'yield']
+CATEGORICAL_COLUMNS = ['district', 'crop', 'season', 'irrigation', 'soil_type', 'seed_variety']
+
+# Inclusive plausible ranges; values outside reject the row
+RANGES = {
+    'year': (1950, 2100),
+    'field_area': (0.01, 1000),
+    'rainfall': (0, 10000),
+    'yield': (1, 500000),
+}
+
+# log10(yield) histogram used for the per-crop quantiles
+HIST_BINS = 1200
+HIST_RANGE = (0.0, 6.0)
+
+# Outside [Q1 - k*IQR, Q3 + k*IQR] of the crop's log10 yield is an outlier
+OUTLIER_IQR_K = 1.5
+
+DEFAULT_CHUNK_SIZE = 5000
+MAX_EXAMPLES = 20
+
+DEFAULT_GATE = {
+    'min_rows': 1000,
+    'max_reject_rate': 0.01,
+    'max_outlier_rate': 0.02,
+}
+
+
+class SchemaError(ValueError):
+    pass
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_header(path):
+    if path.endswith('.xlsx'):
+        workbook = _open_workbook(path)
+        try:
+            first = next(workbook.worksheets[0].iter_rows(values_only=True), ())
+        finally:
+            workbook.close()
+        return [str(value).strip() if value is not None else '' for value in first]
+    with open(path) as f:
+        return f.readline().rstrip('\r\n').split('\t')
+
+
+def _open_workbook(path):
+    try:
+        import openpyxl
+    except ImportError:
+        raise SchemaError("Reading .xlsx needs openpyxl (pip install openpyxl)")
+    return openpyxl.load_workbook(path, read_only=True, data_only=True)
+
+
+def _iter_rows(path):
+    """(line number, cell values) for every data row of a .txt (tab-separated) or .xlsx table"""
+    if path.endswith('.xlsx'):
+        workbook = _open_workbook(path)
+        try:
+            sheet_rows = workbook.worksheets[0].iter_rows(min_row=2, values_only=True)
+            for line_number, values in enumerate(sheet_rows, start=2):
+                # Trailing empty cells are padding, not columns
+                values = list(values)
+                while values and values[-1] is None:
+                    values.pop()
+                if values:
+                    yield line_number, ['' if value is None else value for value in values]
+        finally:
+            workbook.close()
+        return
+
+    with open(path) as f:
+        f.readline()
+        for line_number, line in enumerate(f, start=2):
+            line = line.rstrip('\r\n')
+            if line:
+                yield line_number, line.split('\t')
+
+
+def iter_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield (header width, column positions, rows) chunks; SchemaError if a column is missing"""
+    header = _read_header(path)
+    missing = [column for column in COLUMNS if column not in header]
+    if missing:
+        raise SchemaError(f"Missing columns: {', '.join(missing)} (found: {', '.join(header[:12])})")
+    positions = [header.index(column) for column in COLUMNS]
+
+    rows = _iter_rows(path)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield len(header), positions, chunk
+
+
+def _parse_numeric(values):
+    """Float array and validity mask for an object array of cells"""
+    try:
+        parsed = values.astype(float)
+    except (TypeError, ValueError):
+        # Some cell is not a number; parse one by one for this chunk only
+        parsed = np.full(len(values), np.nan)
+        for i, value in enumerate(values):
+            try:
+                parsed[i] = float(value)
+            except (TypeError, ValueError):
+                pass
+    return parsed, np.isfinite(parsed)
+
+
+def known_categories():
+    """Accepted values of each categorical column"""
+    return {column: np.array(category_values(column), dtype=object) for column in CATEGORICAL_COLUMNS}
+
+
+def check_rows(width, positions, chunk, known):
+    """Validate a chunk of rows; returns (failure masks by reason, line numbers, parsed columns)"""
+    line_numbers = np.array([line_number for line_number, _ in chunk])
+    widths = np.array([len(values) for _, values in chunk])
+    well_formed = widths == width
+    failures = {'wrong_column_count': ~well_formed}
+
+    # Pad short rows so the chunk is rectangular; they are rejected anyway
+    matrix = np.array(
+        [values if len(values) >= width else list(values) + [''] * (width - len(values))
+         for _, values in chunk],
+        dtype=object,
+    )[:, :width] if len(chunk) else np.empty((0, width), dtype=object)
+    columns = {}
+    for column, position in zip(COLUMNS, positions):
+        values = matrix[:, position]
+        if column in NUMERIC_COLUMNS:
+            parsed, valid = _parse_numeric(values)
+            low, high = RANGES[column]
+            failures[f'non_numeric:{column}'] = well_formed & ~valid
+            failures[f'out_of_range:{column}'] = well_formed & valid & ((parsed < low) | (parsed > high))
+            columns[column] = parsed
+        else:
+            values = values.astype(str)
+            failures[f'unknown:{column}'] = well_formed & ~np.isin(values, known[column])
+            columns[column] = values
+    return failures, line_numbers, columns
+
+
+def iter_valid_rows(path, chunk_size=DEFAULT_CHUNK_SIZE, rejected=None):
+    """Rows that pass the profile's checks, as dicts of the header's columns.
+
+    Reject reasons are counted into `rejected` (a Counter) when given.
+    """
+    header = _read_header(path)
+    known = known_categories()
+    for width, positions, chunk in iter_chunks(path, chunk_size):
+        failures, _, columns = check_rows(width, positions, chunk, known)
+        accepted = np.ones(len(chunk), dtype=bool)
+        for reason, mask in failures.items():
+            accepted &= ~mask
+            if rejected is not None and mask.any():
+                rejected[reason] += int(mask.sum())
+        for i in np.flatnonzero(accepted):
+            row = dict(zip(header, chunk[i][1]))
+            for column in NUMERIC_COLUMNS:
+                row[column] = float(columns[column][i])
+            row['year'] = int(row['year'])
+            yield row
+
+
+class _Moments:
+    """Count, mean, variance, min and max, merged chunk by chunk (Chan et al.)"""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        if not len(values):
+            return
+        n, mean = len(values), float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        total = self.n + n
+        delta = mean - self.mean
+        self.m2 += m2 + delta ** 2 * self.n * n / total
+        self.mean += delta * n / total
+        self.n = total
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def summary(self):
+        if not self.n:
+            return {'count': 0}
+        return {
+            'count': self.n,
+            'mean': self.mean,
+            'std': (self.m2 / self.n) ** 0.5,
+            'min': self.min,
+            'max': self.max,
+        }
+
+
+def _histogram_quantile(counts, q):
+    """Approximate quantile (in histogram units) of a binned distribution"""
+    cumulative = np.cumsum(counts)
+    if not cumulative[-1]:
+        return None
+    edges = np.linspace(*HIST_RANGE, HIST_BINS + 1)
+    i = int(np.searchsorted(cumulative, q * cumulative[-1]))
+    return float((edges[i] + edges[i + 1]) / 2)
+
+
+class DataProfiler:
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.known = known_categories()
+        self.crops = list(self.known['crop'])
+        self._crop_order = np.argsort(self.known['crop'])
+        self.rows_total = 0
+        self.rows_accepted = 0
+        self.reasons = Counter()
+        self.reject_examples = []
+        self.unknown_values = {column: Counter() for column in CATEGORICAL_COLUMNS}
+        self.moments = {column: _Moments() for column in NUMERIC_COLUMNS}
+        self.categories = {column: Counter() for column in CATEGORICAL_COLUMNS}
+        self.crop_histograms = np.zeros((len(self.crops), HIST_BINS), dtype=np.int64)
+        self.fences = {}
+        self.outliers = Counter()
+        self.outlier_examples = []
+
+    def _crop_index(self, crops):
+        """Positions in self.crops of an array of known crop names"""
+        return self._crop_order[np.searchsorted(self.known['crop'], crops, sorter=self._crop_order)]
+
+    def _check_chunk(self, width, positions, chunk, record=True):
+        """Validate one chunk; returns (accepted mask, line numbers, columns dict).
+
+        With record=True the reject reasons are added to the report counters.
+        """
+        failures, line_numbers, columns = check_rows(width, positions, chunk, self.known)
+        well_formed = ~failures['wrong_column_count']
+        rejected = np.zeros(len(chunk), dtype=bool)
+        for reason, mask in failures.items():
+            rejected |= mask
+            count = int(mask.sum())
+            if count and record:
+                self.reasons[reason] += count
+                for i in np.flatnonzero(mask)[:MAX_EXAMPLES - len(self.reject_examples)]:
+                    self.reject_examples.append({'line': int(line_numbers[i]), 'reason': reason})
+        if record:
+            for column in CATEGORICAL_COLUMNS:
+                unknown = failures[f'unknown:{column}'] & well_formed
+                self.unknown_values[column].update(columns[column][unknown].tolist())
+        return ~rejected, line_numbers, columns
+
+    def _first_pass(self, width, positions, chunk):
+        accepted, _, columns = self._check_chunk(width, positions, chunk)
+        self.rows_total += len(chunk)
+        self.rows_accepted += int(accepted.sum())
+
+        for column in NUMERIC_COLUMNS:
+            self.moments[column].update(columns[column][accepted])
+        for column in CATEGORICAL_COLUMNS:
+            values, counts = np.unique(columns[column][accepted], return_counts=True)
+            self.categories[column].update(dict(zip(values.tolist(), counts.tolist())))
+
+        crop_index = self._crop_index(columns['crop'][accepted])
+        bins = np.clip(
+            ((np.log10(columns['yield'][accepted]) - HIST_RANGE[0]) / (HIST_RANGE[1] - HIST_RANGE[0]) * HIST_BINS).astype(int),
+            0, HIST_BINS - 1,
+        )
+        np.add.at(self.crop_histograms, (crop_index, bins), 1)
+
+    def _compute_fences(self):
+        for i, crop in enumerate(self.crops):
+            counts = self.crop_histograms[i]
+            if not counts.sum():
+                continue
+            q1, median, q3 = (_histogram_quantile(counts, q) for q in (0.25, 0.5, 0.75))
+            iqr = q3 - q1
+            self.fences[crop] = {
+                'rows': int(counts.sum()),
+                'median': 10 ** median,
+                'q1': 10 ** q1,
+                'q3': 10 ** q3,
+                'low': 10 ** (q1 - OUTLIER_IQR_K * iqr),
+                'high': 10 ** (q3 + OUTLIER_IQR_K * iqr),
+            }
+
+    def _second_pass(self, width, positions, chunk):
+        # Rejects were already counted in the first pass
+        accepted, line_numbers, columns = self._check_chunk(width, positions, chunk, record=False)
+
+        crops, yields, lines = columns['crop'][accepted], columns['yield'][accepted], line_numbers[accepted]
+        low = np.array([self.fences.get(crop, {}).get('low', 0) for crop in self.crops])
+        high = np.array([self.fences.get(crop, {}).get('high', np.inf) for crop in self.crops])
+        crop_index = self._crop_index(crops)
+        outlier = (yields < low[crop_index]) | (yields > high[crop_index])
+        for i in np.flatnonzero(outlier):
+            self.outliers[crops[i]] += 1
+            if len(self.outlier_examples) < MAX_EXAMPLES:
+                self.outlier_examples.append({'line': int(lines[i]), 'crop': crops[i], 'yield': float(yields[i])})
+
+    def profile(self, path):
+        for width, positions, chunk in iter_chunks(path, self.chunk_size):
+            self._first_pass(width, positions, chunk)
+        self._compute_fences()
+        for width, positions, chunk in iter_chunks(path, self.chunk_size):
+            self._second_pass(width, positions, chunk)
+        return self
+
+    def report(self, gate=None):
+        rows_rejected = self.rows_total - self.rows_accepted
+        outlier_rows = sum(self.outliers.values())
+        return {
+            'rows': {
+                'total': self.rows_total,
+                'accepted': self.rows_accepted,
+                'rejected': rows_rejected,
+                'reject_rate': rows_rejected / self.rows_total if self.rows_total else 0.0,
+            },
+            'reject_reasons': dict(self.reasons.most_common()),
+            'reject_examples': self.reject_examples,
+            'unknown_values': {
+                column: dict(counter.most_common(MAX_EXAMPLES))
+                for column, counter in self.unknown_values.items() if counter
+            },
+            'numeric': {column: moments.summary() for column, moments in self.moments.items()},
+            'categories': {
+                column: {'cardinality': len(counter), 'counts': dict(sorted(counter.items()))}
+                for column, counter in self.categories.items()
+            },
+            'yield_by_crop': self.fences,
+            'outliers': {
+                'rule': f'log10(yield) outside per-crop [Q1 - {OUTLIER_IQR_K}*IQR, Q3 + {OUTLIER_IQR_K}*IQR]',
+                'rows': outlier_rows,
+                'rate': outlier_rows / self.rows_accepted if self.rows_accepted else 0.0,
+                'by_crop': dict(self.outliers.most_common()),
+                'examples': self.outlier_examples,
+            },
+        }
+
+
+def evaluate_gate(report, thresholds=None):
+    """Gate section for a report: passed plus the reasons it failed"""
+    thresholds = {**DEFAULT_GATE, **(thresholds or {})}
+    failures = []
+    if 'schema_error' in report:
+        failures.append(report['schema_error'])
+    else:
+        if report['rows']['accepted'] < thresholds['min_rows']:
+            failures.append(f"{report['rows']['accepted']} usable rows < {thresholds['min_rows']}")
+        if report['rows']['reject_rate'] > thresholds['max_reject_rate']:
+            failures.append(f"reject rate {report['rows']['reject_rate']:.2%} > {thresholds['max_reject_rate']:.2%}")
+        if report['outliers']['rate'] > thresholds['max_outlier_rate']:
+            failures.append(f"outlier rate {report['outliers']['rate']:.2%} > {thresholds['max_outlier_rate']:.2%}")
+    return {'passed': not failures, 'failures': failures, 'thresholds': thresholds}
+
+
+def profile_file(path, chunk_size=DEFAULT_CHUNK_SIZE, thresholds=None):
+    """Profile a table and return the full report, gate included"""
+    report = {
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'source': {'path': os.path.basename(path), 'sha256': file_sha256(path), 'bytes': os.path.getsize(path)},
+        'chunk_size': chunk_size,
+    }
+    try:
+        report.update(DataProfiler(chunk_size).profile(path).report())
+    except SchemaError as e:
+        report['schema_error'] = str(e)
+    report['gate'] = evaluate_gate(report, thresholds)
+    return report
+
+
+def require_passing_profile(data_path, report_path):
+    """None if the saved profile covers this exact data file and passed, else why not"""
+    try:
+        with open(report_path) as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        return f"No data profile at {report_path}; run `manage.py profile_data` first"
+    if report.get('source', {}).get('sha256') != file_sha256(data_path):
+        return f"{report_path} was made for a different version of {os.path.basename(data_path)}; re-run `manage.py profile_data`"
+    if not report.get('gate', {}).get('passed'):
+        return "Data profile gate failed: " + '; '.join(report.get('gate', {}).get('failures', []))
+    return None
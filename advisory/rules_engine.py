@@ -0,0 +1,166 @@
+"""
+Recommendation rules compiled into a decision table.
+
+The rules live in advisory/rules/recommendations.json. Each action is an
+ordered list of {"when": {field: [values]}, "text": ...} rules where the first
+match wins; the estimated gain is the clipped sum of every matching term. At
+load time every rule is evaluated over the full grid of encoded categorical
+inputs (see features.py), so answering a farm, or an array of farms, is a
+single index into the table. The file is re-read when it changes on disk.
+
+Texts are translated with gettext when a recommendation is generated, and
+{crop} is filled with the crop's display name in the same language.
+makemessages does not scan the JSON file, so new or edited texts have to be
+added to locale/*/LC_MESSAGES/django.po by hand.
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+from django.utils.translation import gettext
+
+from .features import category_values
+from .models import FarmInput
+
+# Fields a rule may test; district is left out because no rule depends on it
+RULE_DIMENSIONS = ('crop', 'season', 'irrigation', 'seed_variety', 'soil_type', 'soil_health_card', 'pest_presence')
+ACTIONS = ('action_1', 'action_2', 'action_3')
+CROP_LABELS = dict(FarmInput.CROP_CHOICES)
+
+
+class RuleError(ValueError):
+    pass
+
+
+def crop_label(crop):
+    """Display name of a crop in the active language, for the {crop} in action texts"""
+    # The labels' msgids come from the form templates
+    return gettext(CROP_LABELS.get(crop, crop))
+
+
+class RuleTable:
+    """A compiled rules file: one text index per action and a gain for every input combination"""
+
+    def __init__(self, spec):
+        self.version = spec.get('version')
+        self.axes = [category_values(dim) for dim in RULE_DIMENSIONS]
+        self.positions = [{value: i for i, value in enumerate(axis)} for axis in self.axes]
+        self.shape = tuple(len(axis) for axis in self.axes)
+        self._grid = np.indices(self.shape)
+
+        self.texts = []
+        # Fields tested by the rules behind each text: what the action addresses
+        self.text_fields = []
+        text_ids = {}
+        self.actions = {}
+        for action in ACTIONS:
+            rules = spec.get('actions', {}).get(action)
+            if not rules:
+                raise RuleError(f"No rules for {action}")
+            table = np.full(self.shape, -1, dtype=np.int16)
+            for rule in rules:
+                text = rule['text']
+                if text not in text_ids:
+                    text_ids[text] = len(self.texts)
+                    self.texts.append(text)
+                    self.text_fields.append(set())
+                self.text_fields[text_ids[text]].update(rule.get('when', {}))
+                # First matching rule wins
+                table[(table == -1) & self._mask(rule.get('when', {}))] = text_ids[text]
+            if (table == -1).any():
+                raise RuleError(f"Rules for {action} do not cover every input; add a rule with an empty 'when'")
+            self.actions[action] = table
+
+        gain_spec = spec.get('gain', {})
+        gain = np.zeros(self.shape)
+        for term in gain_spec.get('terms', []):
+            gain += np.where(self._mask(term.get('when', {})), term['add'], 0)
+        self.gain = np.clip(gain, gain_spec.get('min', -np.inf), gain_spec.get('max', np.inf))
+
+    def _mask(self, when):
+        mask = np.ones(self.shape, dtype=bool)
+        for field, allowed in when.items():
+            if field not in RULE_DIMENSIONS:
+                raise RuleError(f"Rules cannot test '{field}'")
+            axis = RULE_DIMENSIONS.index(field)
+            try:
+                allowed_positions = [self.positions[axis][value] for value in allowed]
+            except KeyError as e:
+                raise RuleError(f"Unknown {field} value {e}")
+            mask &= np.isin(self._grid[axis], allowed_positions)
+        return mask
+
+    def encode(self, farm_inputs):
+        """Table coordinates for FarmInput-like objects or dicts, shape (n, len(RULE_DIMENSIONS))"""
+        coords = np.empty((len(farm_inputs), len(RULE_DIMENSIONS)), dtype=np.intp)
+        for i, farm_input in enumerate(farm_inputs):
+            get = farm_input.get if isinstance(farm_input, dict) else lambda key: getattr(farm_input, key)
+            for axis, field in enumerate(RULE_DIMENSIONS):
+                value = get(field)
+                if field in ('soil_health_card', 'pest_presence'):
+                    value = bool(value)
+                coords[i, axis] = self.positions[axis][value]
+        return coords
+
+    def evaluate(self, coords):
+        """Text indices per action and gains for an array of table coordinates"""
+        index = tuple(np.asarray(coords).T)
+        result = {action: table[index] for action, table in self.actions.items()}
+        result['estimated_gain'] = self.gain[index]
+        return result
+
+    def text(self, text_id, crop):
+        """Translated action text for the active language"""
+        return gettext(self.texts[text_id]).format(crop=crop)
+
+    def recommend(self, farm_input):
+        """Action texts and estimated gain for a single farm"""
+        result = self.evaluate(self.encode([farm_input]))
+        recommendation = {action: self.text(result[action][0], crop_label(farm_input.crop)) for action in ACTIONS}
+        recommendation['estimated_gain'] = float(result['estimated_gain'][0])
+        return recommendation
+
+
+class RecommendationRules:
+    """Loads and compiles the rules file, recompiling when it changes on disk"""
+
+    def __init__(self, path, check_interval=2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._table = None
+        self._mtime = None
+        self._checked = 0.0
+
+    def table(self):
+        now = time.monotonic()
+        if self._table is None or now - self._checked >= self.check_interval:
+            self._checked = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError as e:
+                if self._table is None:
+                    raise
+                print(f"Error checking recommendation rules: {e}")
+                return self._table
+            if mtime != self._mtime:
+                self._reload(mtime)
+        return self._table
+
+    def _reload(self, mtime):
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            try:
+                with open(self.path) as f:
+                    table = RuleTable(json.load(f))
+            except (OSError, ValueError, KeyError) as e:
+                # Keep serving the last good table if an edit is broken
+                if self._table is None:
+                    raise
+                print(f"Error reloading recommendation rules, keeping previous version: {e}")
+            else:
+                self._table = table
+            self._mtime = mtime
@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Recommendation
+from .summaries import rebuild_user_summary, record_user_summary
+
+
+@receiver(post_save, sender=Recommendation)
+def update_user_summary(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.user_id:
+        record_user_summary(instance)
+
+
+@receiver(post_delete, sender=Recommendation)
+def remove_from_user_summary(sender, instance, **kwargs):
+    if instance.user_id:
+        rebuild_user_summary(instance.user_id)
@@ -0,0 +1,81 @@
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Min, Sum
+
+from .models import DistrictSummary, Recommendation, UserSummary
+
+SUMMARY_FIELDS = [
+    'submissions', 'total_area', 'avg_predicted_yield', 'avg_estimated_gain',
+    'first_submission', 'last_submission',
+]
+
+
+def refresh_district_summaries():
+    """Recompute DistrictSummary from Recommendation with one GROUP BY query; returns the row count"""
+    groups = (
+        Recommendation.objects
+        .values('farm_input__district', 'farm_input__crop', 'farm_input__season')
+        .annotate(
+            submissions=Count('id'),
+            total_area=Sum('farm_input__field_area'),
+            avg_predicted_yield=Avg('predicted_yield'),
+            avg_estimated_gain=Avg('estimated_gain'),
+            first_submission=Min('created_at'),
+            last_submission=Max('created_at'),
+        )
+        .order_by()
+    )
+    summaries = [
+        DistrictSummary(
+            district=group['farm_input__district'],
+            crop=group['farm_input__crop'],
+            season=group['farm_input__season'],
+            **{field: group[field] for field in SUMMARY_FIELDS},
+        )
+        for group in groups
+    ]
+
+    with transaction.atomic():
+        DistrictSummary.objects.bulk_create(
+            summaries,
+            update_conflicts=True,
+            unique_fields=['district', 'crop', 'season'],
+            update_fields=SUMMARY_FIELDS + ['updated_at'],
+        )
+        # Drop combinations whose submissions have all been deleted
+        keep = {(s.district, s.crop, s.season) for s in summaries}
+        stale = [
+            pk for pk, district, crop, season
+            in DistrictSummary.objects.values_list('pk', 'district', 'crop', 'season')
+            if (district, crop, season) not in keep
+        ]
+        DistrictSummary.objects.filter(pk__in=stale).delete()
+    return len(summaries)
+
+
+def record_user_summary(recommendation):
+    """Add a newly saved recommendation to its user's UserSummary"""
+    with transaction.atomic():
+        UserSummary.objects.get_or_create(user_id=recommendation.user_id)
+        summary = UserSummary.objects.select_for_update().get(user_id=recommendation.user_id)
+        summary.add(recommendation)
+        summary.save()
+    return summary
+
+
+def rebuild_user_summary(user_id):
+    """Recompute one user's UserSummary from scratch (after deletions)"""
+    summary = UserSummary(user_id=user_id)
+    recommendations = (
+        Recommendation.objects.filter(user_id=user_id)
+        .select_related('farm_input')
+        .order_by('created_at')
+        .iterator(chunk_size=2000)
+    )
+    for recommendation in recommendations:
+        summary.add(recommendation)
+
+    with transaction.atomic():
+        UserSummary.objects.filter(user_id=user_id).delete()
+        if summary.submissions:
+            summary.save()
+    return summary
@@ -1,3 +1,776 @@
-from django.test import TestCase
+import asyncio
+import copy
+import csv
+import io
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+import warnings
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
 
-# Create your tests here.
+import numpy as np
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management import CommandError, call_command
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone, translation
+
+from .admin import FarmInputAdmin
+from .analogs import AnalogIndex
+from .anomalies import InputProfile
+from .async_views import _run_in_executor
+from .attributions import ForestAttributions, RuleAttributions
+from .compact_model import CompactForest, export_bundle
+from .evaluation import MODEL_PATH, DistrictAverage, TrainedModel, _summarise, error_metrics
+from .features import category_values
+from .history import InvalidCursor, history_page
+from .ml_model import (
+    BASE_YIELDS, COMPACT_MODEL_DIR, DEFAULT_BASE_YIELD, MODEL_CROPS, RULES_PATH, YIELD_MULTIPLIERS,
+    encode_model_features, yield_predictor,
+)
+from .models import DistrictWeather, FarmInput, InputAnomaly, Recommendation
+from .offline import district_bundle
+from .planner import PlanError, plan_crops, solve
+from .profiling import DataProfiler, iter_valid_rows
+from .rules_engine import ACTIONS, RULE_DIMENSIONS, RuleError, RuleTable
+from .summaries import refresh_district_summaries
+from .throttling import SingleFlight, TokenBucket, check_rate_limit, prediction_key
+from .weather import MAX_AGE, DistrictWeatherTable, district_weather, prefetch_district_weather, yield_factor
+from .weather_stub import start_stub
+
+
+class EvaluationTests(SimpleTestCase):
+    def test_error_metrics(self):
+        metrics = error_metrics([100, 200, 300], [110, 190, 330])
+        self.assertEqual(metrics['n'], 3)
+        self.assertAlmostEqual(metrics['mae'], 50 / 3)
+        self.assertAlmostEqual(metrics['rmse'], (1100 / 3) ** 0.5)
+        self.assertAlmostEqual(metrics['mape'], 25 / 3)
+        self.assertAlmostEqual(metrics['r2'], 1 - 1100 / 20000)
+        self.assertEqual(error_metrics([], []), {'n': 0})
+        self.assertIsNone(error_metrics([5, 5], [4, 6])['r2'])
+
+    def test_summarise_scores_the_model_on_covered_rows(self):
+        folds = [
+            {'year': 2020, 'actual': [100, 200, 300], 'crops': ['rice', 'rice', 'sugarcane'], 'covered': [True, True, False],
+             'predictions': {'rules': [110, 190, 330], 'model': [100, 220, 0]}},
+            {'year': 2021, 'actual': [400], 'crops': ['rice'], 'covered': [True],
+             'predictions': {'rules': [400], 'model': [380]}},
+        ]
+        summary = _summarise(folds)
+        self.assertEqual(summary['rules']['overall']['n'], 4)
+        self.assertEqual(set(summary['rules']['by_crop']), {'rice', 'sugarcane'})
+        self.assertEqual(summary['model']['overall']['n'], 3)
+        self.assertAlmostEqual(summary['model']['overall']['mae'], 40 / 3)
+        self.assertEqual(set(summary['model']['by_crop']), {'rice'})
+        self.assertEqual([fold['n'] for fold in summary['model']['folds']], [2, 1])
+        self.assertEqual(summary['model']['coverage'], 0.75)
+        self.assertNotIn('coverage', summary['rules'])
+
+    def test_district_average_falls_back_to_wider_means(self):
+        baseline = DistrictAverage()
+        baseline.fit([
+            {'district': 'puri', 'crop': 'rice', 'season': 'kharif', 'yield': 3000},
+            {'district': 'puri', 'crop': 'rice', 'season': 'kharif', 'yield': 3400},
+            {'district': 'cuttack', 'crop': 'rice', 'season': 'kharif', 'yield': 2000},
+        ])
+        rows = [
+            {'district': 'puri', 'crop': 'rice', 'season': 'kharif'},
+            {'district': 'khordha', 'crop': 'rice', 'season': 'kharif'},
+            {'district': 'puri', 'crop': 'wheat', 'season': 'rabi'},
+        ]
+        np.testing.assert_allclose(baseline.predict(rows), [
+            3200, 2800, yield_predictor.get_district_average('puri', 'wheat', 'rabi'),
+        ])
+
+    def test_model_is_refitted_without_changing_the_shipped_one(self):
+        rows = yield_predictor.load_data()
+        train = [row for row in rows if row['year'] < 2017]
+        test = [row for row in rows if row['year'] == 2017 and row['crop'] in MODEL_CROPS][:50]
+        with warnings.catch_warnings():
+            # The shipped estimators were fitted on a DataFrame
+            warnings.simplefilter('ignore', UserWarning)
+            shipped = TrainedModel()
+            before = shipped.predict(test)
+            refitted = copy.copy(shipped)
+            refitted.fit(train)
+            np.testing.assert_array_equal(shipped.predict(test), before)
+            self.assertIsNot(refitted.model, shipped.model)
+            self.assertFalse(np.allclose(refitted.predict(test), before))
+class CompactForestTests(SimpleTestCase):
+    def test_export_predicts_exactly_like_the_forest(self):
+        import joblib
+        bundle = joblib.load(MODEL_PATH)
+        with tempfile.TemporaryDirectory() as out_dir:
+            export_bundle(bundle, out_dir)
+            forest = CompactForest.load(out_dir, mmap=False)
+        X = encode_model_features(yield_predictor.load_data()[::10], forest.features)
+        with warnings.catch_warnings():
+            # The estimators were fitted on a DataFrame
+            warnings.simplefilter('ignore', UserWarning)
+            expected = bundle['model'].predict(bundle['scaler'].transform(bundle['imputer'].transform(X)))
+        np.testing.assert_array_equal(forest.predict(X), expected)
+class TokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_burst_then_refill(self):
+        bucket = TokenBucket('test', burst=3, per_minute=60)
+        self.assertEqual([bucket.allow('a', now=0) for _ in range(4)], [True, True, True, False])
+        # One token per second
+        self.assertFalse(bucket.allow('a', now=0.5))
+        self.assertTrue(bucket.allow('a', now=1.6))
+        self.assertFalse(bucket.allow('a', now=1.7))
+
+    def test_refill_is_capped_at_burst(self):
+        bucket = TokenBucket('test', burst=2, per_minute=60)
+        bucket.allow('a', now=0)
+        self.assertEqual([bucket.allow('a', now=1000) for _ in range(3)], [True, True, False])
+
+    def test_identities_and_scopes_are_separate(self):
+        bucket = TokenBucket('test', burst=1, per_minute=1)
+        self.assertTrue(bucket.allow('a', now=0))
+        self.assertFalse(bucket.allow('a', now=0))
+        self.assertTrue(bucket.allow('b', now=0))
+        self.assertTrue(TokenBucket('other', burst=1, per_minute=1).allow('a', now=0))
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def work():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 42
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do('k', work)))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(flight.do('k', work))) for _ in range(3)]
+        for thread in followers:
+            thread.start()
+        # Give the followers time to find the leader's call in flight
+        time.sleep(0.2)
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+        self.assertEqual(results, [42] * 4)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight._calls, {})
+
+    def test_errors_are_raised_and_key_is_released(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError('boom')
+
+        with self.assertRaises(ValueError):
+            flight.do('k', fail)
+        self.assertEqual(flight.do('k', lambda: 1), 1)
+
+
+FARM_INPUT = {
+    'district': 'puri', 'crop': 'rice', 'season': 'kharif', 'sowing_date': '2026-07-01', 'field_area': 1.5,
+    'irrigation': 'canal', 'soil_type': 'alluvial', 'seed_variety': 'hyv',
+}
+
+
+class PredictionKeyTests(SimpleTestCase):
+    def test_language_is_part_of_the_key(self):
+        farm_input = SimpleNamespace(**{
+            **FARM_INPUT, 'sowing_date': date(2026, 7, 1), 'soil_health_card': False, 'pest_presence': False,
+        })
+        with translation.override('en'):
+            english = prediction_key(farm_input)
+        with translation.override('hi'):
+            hindi = prediction_key(farm_input)
+        self.assertNotEqual(english, hindi)
+        self.assertEqual(english[:-1], hindi[:-1])
+
+
+def legacy_recommendation(farm_input):
+    """The if/elif rules that recommendations.json replaced"""
+    if farm_input.irrigation == 'none' and farm_input.crop in ['rice', 'sugarcane']:
+        action_1 = "URGENT: Install irrigation system immediately - these crops need consistent water supply for survival and yield"
+    elif farm_input.pest_presence:
+        action_1 = "IMMEDIATE: Apply integrated pest management - spray neem oil and set up pheromone traps within 2 days"
+    elif not farm_input.soil_health_card:
+        action_1 = "HIGH PRIORITY: Get soil health card from nearest agriculture office to optimize fertilizer application"
+    elif farm_input.irrigation == 'none':
+        action_1 = "CRITICAL: Install drip irrigation system to increase water efficiency and boost yield by 20-25%"
+    else:
+        action_1 = "OPTIMIZE: Monitor soil moisture daily and apply irrigation at critical crop growth stages"
+
+    if farm_input.soil_health_card:
+        action_2 = {
+            'rice': "Apply 120:60:40 NPK kg/ha in 3 splits - 50% basal, 25% tillering, 25% panicle stage",
+            'maize': "Apply 150:75:40 NPK kg/ha - 1/3 at sowing, 1/3 at knee-high, 1/3 at tasseling",
+            'wheat': "Apply 120:60:40 NPK kg/ha in 3 splits based on soil test recommendations",
+            'groundnut': "Apply 20:60:40 NPK kg/ha - groundnut fixes nitrogen naturally",
+            'cotton': "Apply 150:75:75 NPK kg/ha in splits with micronutrients",
+            'sugarcane': "Apply 300:150:150 NPK kg/ha in 4 splits throughout growing season",
+        }.get(farm_input.crop, "Apply balanced NPK fertilizer as per soil test in 2-3 splits")
+    else:
+        action_2 = "Apply balanced NPK fertilizer (consult agriculture officer) and get soil testing done immediately"
+
+    if farm_input.seed_variety == 'local':
+        action_3 = f"UPGRADE: Switch to hybrid or HYV {farm_input.crop} varieties for 15-20% higher yield next season"
+    elif farm_input.season == 'kharif':
+        action_3 = "WEATHER PREP: Monitor weather forecasts and provide drainage during heavy rains to prevent waterlogging"
+    elif farm_input.season == 'rabi':
+        action_3 = "TIMING: Ensure timely sowing and harvest to avoid heat stress and maximize market prices"
+    else:
+        action_3 = "FIELD MANAGEMENT: Maintain proper plant spacing, weed control, and regular field monitoring for diseases"
+
+    gain = {'none': 20, 'lift': 8, 'canal': 8, 'tubewell': 5}.get(farm_input.irrigation, 0)
+    gain += {'local': 15, 'hyv': 8}.get(farm_input.seed_variety, 0)
+    gain += 0 if farm_input.soil_health_card else 10
+    gain += 12 if farm_input.pest_presence else 0
+    return {'action_1': action_1, 'action_2': action_2, 'action_3': action_3, 'estimated_gain': min(max(gain, 5), 25)}
+
+
+class RuleTableTests(SimpleTestCase):
+    def setUp(self):
+        with open(RULES_PATH) as f:
+            self.table = RuleTable(json.load(f))
+
+    def test_matches_legacy_rules_on_every_input(self):
+        farm_inputs = [
+            SimpleNamespace(**dict(zip(RULE_DIMENSIONS, values)))
+            for values in itertools.product(*self.table.axes)
+        ]
+        self.assertEqual(len(farm_inputs), 5760)
+        result = self.table.evaluate(self.table.encode(farm_inputs))
+        for i, farm_input in enumerate(farm_inputs):
+            expected = legacy_recommendation(farm_input)
+            for action in ACTIONS:
+                self.assertEqual(self.table.text(result[action][i], farm_input.crop), expected[action], farm_input)
+            self.assertEqual(result['estimated_gain'][i], expected['estimated_gain'], farm_input)
+
+    def test_texts_use_the_active_language(self):
+        farm_input = SimpleNamespace(
+            crop='rice', season='kharif', irrigation='canal', seed_variety='local', soil_type='alluvial',
+            soil_health_card=True, pest_presence=False,
+        )
+        english = self.table.recommend(farm_input)['action_3']
+        self.assertEqual(english, "UPGRADE: Switch to hybrid or HYV Rice varieties for 15-20% higher yield next season")
+        with translation.override('hi'):
+            hindi = self.table.recommend(farm_input)['action_3']
+        self.assertEqual(hindi, "उन्नयन: अगले मौसम में 15-20% अधिक उपज के लिए धान की संकर या उन्नत (HYV) किस्में अपनाएं")
+
+    def test_uncovered_action_is_rejected(self):
+        spec = {'actions': {'action_1': [{'when': {'crop': ['rice']}, 'text': 'x'}]}}
+        with self.assertRaises(RuleError):
+            RuleTable(spec)
+
+
+def make_recommendation(user=None, **fields):
+    farm_input = FarmInput.objects.create(user=user, **{**FARM_INPUT, **fields})
+    return Recommendation.objects.create(
+        farm_input=farm_input, user=user, predicted_yield=3000, confidence_interval='±360', estimated_gain=10,
+        action_1='a', action_2='b', action_3='c', reasoning='r',
+    )
+
+
+class AdminTests(TestCase):
+    def setUp(self):
+        User.objects.create_superuser('admin', password='p')
+        self.client.login(username='admin', password='p')
+        self.recommendations = [make_recommendation(district=district) for district in ('puri', 'puri', 'cuttack')]
+
+    def test_csv_export_streams_the_selected_rows(self):
+        selected = [r.farm_input.pk for r in self.recommendations[:2]]
+        response = self.client.post('/admin/advisory/farminput/', {'action': 'export_csv', '_selected_action': selected})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0], FarmInputAdmin.export_fields)
+        self.assertEqual([int(row[0]) for row in rows[1:]], sorted(selected))
+        self.assertEqual(rows[1][1:4], ['puri', 'rice', 'kharif'])
+
+    def test_changelist_never_counts_the_whole_table(self):
+        for params in ({}, {'district__exact': 'puri'}):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/admin/advisory/farminput/', params)
+            self.assertEqual(response.status_code, 200)
+            counts = [query['sql'] for query in queries if 'COUNT(' in query['sql'].upper()]
+            for sql in counts:
+                self.assertIn('LIMIT', sql.upper(), sql)
+
+    def test_report_reads_the_district_summaries(self):
+        refresh_district_summaries()
+        response = self.client.get('/admin/advisory/districtsummary/report/')
+        self.assertEqual(response.status_code, 200)
+        rows = {row['district']: row for row in response.context['rows']}
+        self.assertEqual(set(rows), {'Puri', 'Cuttack'})
+        self.assertEqual(rows['Puri']['submissions'], 2)
+        self.assertEqual(rows['Puri']['total_area'], 3.0)
+        self.assertEqual(response.context['total_submissions'], 3)
+        self.assertContains(response, 'Cuttack')
+
+
+class AnalogIndexTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = np.random.default_rng(0)
+        cls.rows = [
+            {
+                'district': str(rng.choice(['puri', 'cuttack', 'khordha'])), 'crop': crop, 'season': season,
+                'irrigation': str(rng.choice(['canal', 'none'])), 'seed_variety': str(rng.choice(['hyv', 'local'])),
+                'soil_type': 'alluvial', 'field_area': float(rng.uniform(0.5, 3)),
+                'rainfall': float(rng.uniform(800, 1600)), 'yield': float(rng.uniform(2000, 4000)),
+            }
+            for crop, season, count in [('rice', 'kharif', 80), ('rice', 'rabi', 40), ('mung', 'zaid', 3)]
+            for _ in range(count)
+        ]
+        cls.index = AnalogIndex(cls.rows)
+
+    def test_results_are_the_nearest_rows_of_the_partition(self):
+        query = {**FARM_INPUT, 'rainfall': 1200}
+        analogs = self.index.query(query, k=5)
+        self.assertEqual(len(analogs), 5)
+        self.assertTrue(all((row['crop'], row['season']) == ('rice', 'kharif') for row in analogs))
+        partition = self.index.partitions[('rice', 'kharif')]
+        distances = np.linalg.norm(partition.vectors(partition.rows) - partition.vectors([query]), axis=1)
+        np.testing.assert_allclose([row['distance'] for row in analogs], np.sort(distances)[:5])
+
+    def test_batch_matches_single_queries(self):
+        queries = [
+            {**FARM_INPUT, 'rainfall': 1000},
+            {**FARM_INPUT, 'season': 'rabi', 'irrigation': 'none'},
+            {**FARM_INPUT, 'crop': 'mung', 'season': 'zaid', 'district': 'cuttack'},
+            {**FARM_INPUT, 'crop': 'cotton'},
+        ]
+        for batch, single in zip(self.index.query_batch(queries, k=4), [self.index.query(query, k=4) for query in queries]):
+            self.assertEqual([row['yield'] for row in batch], [row['yield'] for row in single])
+            np.testing.assert_allclose([row['distance'] for row in batch], [row['distance'] for row in single])
+
+    def test_k_larger_than_the_partition(self):
+        analogs = self.index.query({**FARM_INPUT, 'crop': 'mung', 'season': 'zaid'}, k=10)
+        self.assertEqual(len(analogs), 3)
+        self.assertEqual([row['distance'] for row in analogs], sorted(row['distance'] for row in analogs))
+        self.assertEqual(self.index.query({**FARM_INPUT, 'crop': 'cotton'}), [])
+
+
+class AsyncExecutorTests(SimpleTestCase):
+    def test_predictions_run_in_the_request_language(self):
+        async def language():
+            return await _run_in_executor(translation.get_language)
+
+        with translation.override('hi'):
+            self.assertEqual(asyncio.run(language()), 'hi')
+
+
+class HistoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('farmer', password='p')
+        self.other = User.objects.create_user('other', password='p')
+        self.recommendations = [make_recommendation(self.user) for _ in range(5)]
+        make_recommendation(self.other)
+        # Two rows share a timestamp so the id breaks the tie
+        same_time = timezone.now()
+        Recommendation.objects.filter(pk__in=[r.pk for r in self.recommendations[1:3]]).update(created_at=same_time)
+
+    def test_pages_cover_every_row_once_newest_first(self):
+        seen, cursor = [], None
+        while True:
+            rows, cursor = history_page(self.user, cursor, limit=2)
+            seen.extend(rows)
+            if cursor is None:
+                break
+        expected = Recommendation.objects.filter(user=self.user).order_by('-created_at', '-id')
+        self.assertEqual([r.pk for r in seen], [r.pk for r in expected])
+        self.assertEqual(len(seen), 5)
+
+    def test_rows_added_meanwhile_do_not_shift_pages(self):
+        first, cursor = history_page(self.user, limit=2)
+        make_recommendation(self.user)
+        second, _ = history_page(self.user, cursor, limit=2)
+        self.assertFalse({r.pk for r in first} & {r.pk for r in second})
+
+    def test_invalid_cursor(self):
+        for cursor in ('not-base64!', 'bm90IGEgY3Vyc29y', 'MjAyNi0wMS0wMXx4'):
+            with self.assertRaises(InvalidCursor):
+                history_page(self.user, cursor)
+        self.client.login(username='farmer', password='p')
+        self.assertEqual(self.client.get('/api/history/', {'cursor': 'bm90IGEgY3Vyc29y'}).status_code, 400)
+        self.assertRedirects(self.client.get('/history/', {'cursor': 'bm90IGEgY3Vyc29y'}), '/history/')
+
+    def test_api_pages(self):
+        self.client.login(username='farmer', password='p')
+        first = self.client.get('/api/history/', {'limit': 3}).json()
+        self.assertEqual(len(first['results']), 3)
+        second = self.client.get('/api/history/', {'limit': 3, 'cursor': first['next_cursor']}).json()
+        self.assertEqual(len(second['results']), 2)
+        self.assertIsNone(second['next_cursor'])
+        self.assertEqual(first['summary']['submissions'], 5)
+
+    def test_recommendations_of_other_users_are_hidden(self):
+        self.client.login(username='other', password='p')
+        response = self.client.get(f'/recommendation/{self.recommendations[0].pk}/')
+        self.assertRedirects(response, '/input/', fetch_redirect_response=False)
+        own = Recommendation.objects.get(user=self.other)
+        self.assertEqual(self.client.get(f'/recommendation/{own.pk}/').status_code, 200)
+
+
+class IngestYieldsTests(SimpleTestCase):
+    HEADER = 'year\tdistrict\tcrop\tseason\tirrigation\tsoil_type\tseed_variety\tfield_area\trainfall\tyield\n'
+
+    def ingest(self, line):
+        with tempfile.NamedTemporaryFile('w', suffix='.tsv', delete=False) as f:
+            f.write(self.HEADER + line + '\n')
+        self.addCleanup(os.remove, f.name)
+        call_command('ingest_yields', f.name, '--dry-run', stdout=open(os.devnull, 'w'))
+
+    def test_rejects_unknown_categories(self):
+        for bad in ('Puri\trice\tkharif\tcanal\talluvial\thyv', 'puri\trice\tkharif\tcanal\tclay\thyv'):
+            with self.assertRaisesMessage(CommandError, 'Line 2: unknown'):
+                self.ingest(f'2024\t{bad}\t1.5\t900\t3100')
+
+    def test_rejects_non_numeric_values(self):
+        with self.assertRaisesMessage(CommandError, 'non-numeric'):
+            self.ingest('2024\tpuri\trice\tkharif\tcanal\talluvial\thyv\t1.5\t900\tlots')
+
+    def test_accepts_valid_rows(self):
+        self.ingest('2024\tpuri\trice\tkharif\tcanal\talluvial\thyv\t1.5\t900\t3100')
+
+
+class ProfilingTests(SimpleTestCase):
+    HEADER = 'year\tdistrict\tcrop\tseason\tirrigation\tsoil_type\tseed_variety\tfield_area\trainfall\tyield\n'
+
+    def table(self, lines):
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.write(self.HEADER + ''.join(line + '\n' for line in lines))
+        self.addCleanup(os.remove, f.name)
+        return f.name
+
+    def test_chunk_size_does_not_change_the_profile(self):
+        path = os.path.join(settings.BASE_DIR, 'combined_tables.txt')
+        small = DataProfiler(chunk_size=7).profile(path).report()
+        large = DataProfiler(chunk_size=100000).profile(path).report()
+        for key in ('rows', 'reject_reasons', 'categories', 'outliers'):
+            self.assertEqual(small[key], large[key])
+        # Moments are merged in a different order, so they agree to float rounding
+        for column, stats in small['numeric'].items():
+            for name, value in stats.items():
+                self.assertAlmostEqual(value, large['numeric'][column][name], delta=abs(value) * 1e-12)
+        self.assertEqual(small['yield_by_crop'], large['yield_by_crop'])
+
+    def test_bad_rows_are_rejected_and_outliers_flagged(self):
+        good = [f'2020\tpuri\trice\tkharif\tcanal\talluvial\thyv\t1.5\t1200\t{2800 + 10 * i}' for i in range(40)]
+        path = self.table(good + [
+            '2020\tpuri\trice\tkharif\tcanal\talluvial\thyv\t1.5\t1200\t30000',  # outlier, line 42
+            '2020\tpuri\trice\tkharif\tcanal\talluvial\thyv\t1.5\t1200',         # short
+            '2020\tpuri\trice\tkharif\tcanal\talluvial\thyv\t1.5\t1200\tlots',   # non-numeric yield
+            '1800\tpuri\trice\tkharif\tcanal\talluvial\thyv\t1.5\t1200\t3000',   # year out of range
+            '2020\tmars\trice\tkharif\tcanal\talluvial\thyv\t1.5\t1200\t3000',   # unknown district
+        ])
+        report = DataProfiler(chunk_size=4).profile(path).report()
+        self.assertEqual(report['rows'], {'total': 45, 'accepted': 41, 'rejected': 4, 'reject_rate': 4 / 45})
+        self.assertEqual(report['reject_reasons'], {
+            'wrong_column_count': 1, 'non_numeric:yield': 1, 'out_of_range:year': 1, 'unknown:district': 1,
+        })
+        self.assertEqual(report['unknown_values'], {'district': {'mars': 1}})
+        self.assertEqual(report['outliers']['by_crop'], {'rice': 1})
+        self.assertEqual(report['outliers']['examples'], [{'line': 42, 'crop': 'rice', 'yield': 30000.0}])
+
+        # load_data goes through the same checks
+        rejected = Counter()
+        rows = list(iter_valid_rows(path, rejected=rejected))
+        self.assertEqual(len(rows), 41)
+        self.assertEqual(dict(rejected), report['reject_reasons'])
+        self.assertEqual(rows[0], {
+            'year': 2020, 'district': 'puri', 'crop': 'rice', 'season': 'kharif', 'irrigation': 'canal',
+            'soil_type': 'alluvial', 'seed_variety': 'hyv', 'field_area': 1.5, 'rainfall': 1200.0, 'yield': 2800.0,
+        })
+
+
+class ResubmissionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('farmer', password='p')
+        self.other = User.objects.create_user('other', password='p')
+        self.client.login(username='farmer', password='p')
+
+    def sync(self, *items):
+        response = self.client.post('/offline/sync/', json.dumps({'results': list(items)}), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_sync_finishes_inputs_saved_without_a_recommendation(self):
+        client_id = uuid.uuid4()
+        farm_input = FarmInput.objects.create(user=self.user, client_id=client_id, **FARM_INPUT)
+        first, repeat = self.sync({'client_id': str(client_id), **FARM_INPUT}, {'client_id': str(client_id), **FARM_INPUT})
+        self.assertEqual(first['status'], 'created')
+        self.assertEqual(Recommendation.objects.get(pk=first['recommendation_id']).farm_input, farm_input)
+        self.assertEqual(repeat, {'client_id': str(client_id), 'status': 'duplicate', 'recommendation_id': first['recommendation_id']})
+        self.assertEqual(self.sync({'client_id': str(client_id), **FARM_INPUT})[0]['status'], 'duplicate')
+        self.assertEqual(FarmInput.objects.count(), 1)
+
+    def test_sync_rejects_client_ids_of_other_users(self):
+        taken = uuid.uuid4()
+        FarmInput.objects.create(user=self.other, client_id=taken, **FARM_INPUT)
+        rejected, created = self.sync({'client_id': str(taken), **FARM_INPUT}, {'client_id': str(uuid.uuid4()), **FARM_INPUT})
+        self.assertEqual(rejected['status'], 'invalid')
+        self.assertEqual(created['status'], 'created')
+
+    def test_form_retry_finishes_inputs_saved_without_a_recommendation(self):
+        client_id = uuid.uuid4()
+        farm_input = FarmInput.objects.create(user=self.user, client_id=client_id, **FARM_INPUT)
+        response = self.client.post('/input/', {'client_id': str(client_id), **FARM_INPUT})
+        recommendation = Recommendation.objects.get(farm_input=farm_input)
+        self.assertRedirects(response, f'/recommendation/{recommendation.pk}/', fetch_redirect_response=False)
+        self.client.post('/input/', {'client_id': str(client_id), **FARM_INPUT})
+        self.assertEqual(Recommendation.objects.count(), 1)
+
+
+class OfflineBundleTests(SimpleTestCase):
+    def test_bundle_carries_translated_crop_names(self):
+        with translation.override('hi'):
+            bundle = district_bundle('puri')
+        self.assertEqual(bundle['language'], 'hi')
+        self.assertEqual(bundle['crop_labels']['rice'], 'धान')
+        self.assertIn('{crop}', ''.join(bundle['texts']))
+
+
+class RateLimitScaleTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.request = RequestFactory().get('/')
+        self.request.user = AnonymousUser()
+
+    def allowed(self):
+        return sum(check_rate_limit(self.request, 'farm_input') for _ in range(30))
+
+    def test_scale_multiplies_the_burst(self):
+        with override_settings(RATE_LIMIT_SCALE=1):
+            self.assertEqual(self.allowed(), 5)
+        cache.clear()
+        with override_settings(RATE_LIMIT_SCALE=2):
+            self.assertEqual(self.allowed(), 10)
+
+    @override_settings(RATE_LIMIT_SCALE=0)
+    def test_zero_turns_limits_off(self):
+        self.assertEqual(self.allowed(), 30)
+
+
+class WeatherTests(TestCase):
+    JULY = datetime(2026, 7, 15, 6, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        self.addCleanup(district_weather.invalidate)
+
+    def weather(self, **fields):
+        return SimpleNamespace(**{'fetched_at': self.JULY, 'rain_5d': 40, 'hot_days': 0, 'humidity_mean_5d': 70, **fields})
+
+    def farm(self, **fields):
+        return SimpleNamespace(**{'district': 'puri', 'crop': 'rice', 'season': 'kharif', 'irrigation': 'none', 'pest_presence': False, **fields})
+
+    def test_prefetch_stores_the_stub_forecast(self):
+        server = start_stub()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        with override_settings(WEATHER_API_KEY='stub', WEATHER_API_BASE_URL=f'http://127.0.0.1:{server.server_address[1]}'):
+            fetched, failures = prefetch_district_weather(['puri', 'cuttack'], workers=2)
+        self.assertEqual(failures, {})
+        rows = {row.district: row for row in DistrictWeather.objects.all()}
+        self.assertEqual(set(rows), {'puri', 'cuttack'})
+        for district, row in rows.items():
+            for field, value in fetched[district].items():
+                self.assertEqual(getattr(row, field), value)
+            self.assertTrue(55 <= row.humidity <= 95)
+            self.assertLessEqual(row.temp_min_5d, row.temp_max_5d)
+        self.assertEqual(district_weather.get('puri'), rows['puri'])
+
+    def test_forecast_only_adjusts_the_current_season(self):
+        dry = self.weather(rain_5d=5)
+        self.assertEqual(yield_factor(dry, self.farm()), 0.95)
+        self.assertEqual(yield_factor(dry, self.farm(season='rabi')), 1.0)
+        self.assertEqual(yield_factor(dry, self.farm(irrigation='canal')), 1.0)
+
+    def test_factor_is_clamped(self):
+        # 1.03 (rain for a rainfed farm) * 0.95 (waterlogging) * 0.94 (heat) * 0.97 (humid, with pests)
+        stormy = self.weather(rain_5d=200, hot_days=5, humidity_mean_5d=90)
+        self.assertEqual(yield_factor(stormy, self.farm(crop='maize', pest_presence=True)), 0.9)
+
+    def test_stale_rows_are_ignored(self):
+        fields = {
+            'temperature': 30, 'humidity': 80, 'rain_5d': 5, 'rainy_days': 0, 'temp_max_5d': 34,
+            'temp_min_5d': 26, 'hot_days': 0, 'humidity_mean_5d': 75, 'wind_max_5d': 4,
+        }
+        row = DistrictWeather.objects.create(district='puri', fetched_at=timezone.now() - MAX_AGE - timedelta(hours=1), **fields)
+        table = DistrictWeatherTable()
+        self.assertIsNone(table.get('puri'))
+        self.assertEqual(table.factor(self.farm()), 1.0)
+        row.fetched_at = timezone.now()
+        row.save()
+        table.invalidate()
+        self.assertEqual(table.get('puri'), row)
+
+
+class AttributionTests(SimpleTestCase):
+    def test_rule_effects_reproduce_rule_yields(self):
+        with open(RULES_PATH) as f:
+            table = RuleTable(json.load(f))
+        farm_inputs = [
+            SimpleNamespace(**dict(zip(RULE_DIMENSIONS, values)))
+            for values in itertools.product(*table.axes)
+        ]
+        effects = RuleAttributions(BASE_YIELDS, YIELD_MULTIPLIERS, DEFAULT_BASE_YIELD).log_effects(table.encode(farm_inputs))
+        log_yields = np.log([yield_predictor.rule_based_yield(farm_input) for farm_input in farm_inputs])
+        # The effects explain every difference between farms; what is left is the same for all
+        residual = log_yields - effects.sum(axis=1)
+        np.testing.assert_allclose(residual, residual[0])
+
+    def test_forest_contributions_sum_to_predictions(self):
+        model = CompactForest.load(COMPACT_MODEL_DIR)
+        rows = [
+            {'district': district, 'crop': crop, 'season': season, 'soil_type': soil_type, 'sowing_date': date(year, 7, 1)}
+            for district, crop, season, soil_type, year in itertools.product(
+                category_values('district')[:6], sorted(MODEL_CROPS), category_values('season'),
+                category_values('soil_type'), (2010, 2024),
+            )
+        ]
+        X = encode_model_features(rows, model.features)
+        predictions = model.predict(X)
+        bias, contributions = model.contributions(X)
+        np.testing.assert_allclose(bias + contributions.sum(axis=1), predictions, rtol=1e-9)
+        fractions = ForestAttributions(model).fractions(X)
+        np.testing.assert_allclose(bias * (1 + fractions.sum(axis=1)), predictions, rtol=1e-9)
+
+
+class PlannerTests(TestCase):
+    PLOTS = [
+        {'field_area': area, 'soil_type': soil_type, 'irrigation': irrigation}
+        for area, soil_type, irrigation in [
+            (1.2, 'alluvial', ['canal']), (0.8, 'saline', []), (2.5, 'lateritic', ['tubewell']),
+            (0.4, 'red_black', ['drip']), (1.6, 'alluvial', ['lift', 'canal']), (0.1, 'alluvial', []),
+        ]
+    ]
+
+    def brute_force(self, values, water, costs, water_limit, budget):
+        best = 0.0
+        rows = np.arange(len(values))
+        for choice in itertools.product(*(range(values.shape[1]) for _ in rows)):
+            choice = np.array(choice)
+            if water[rows, choice].sum() <= water_limit + 1e-6 and costs[rows, choice].sum() <= budget + 1e-6:
+                best = max(best, values[rows, choice].sum())
+        return best
+
+    def test_solve_respects_limits_and_bounds_the_optimum(self):
+        rng = np.random.default_rng(0)
+        for _ in range(20):
+            values = rng.uniform(0, 100, (5, 4))
+            water = rng.uniform(0, 50, (5, 4))
+            costs = rng.uniform(0, 50, (5, 4))
+            # Option 0 is fallow
+            values[:, 0] = water[:, 0] = costs[:, 0] = 0
+            water_limit, budget = rng.uniform(20, 120, 2)
+            for limits in ((water_limit, None), (None, budget), (water_limit, budget)):
+                choice, bound = solve(values, water, costs, *limits)
+                rows = np.arange(len(values))
+                self.assertLessEqual(water[rows, choice].sum(), (limits[0] or np.inf) + 1e-6)
+                self.assertLessEqual(costs[rows, choice].sum(), (limits[1] or np.inf) + 1e-6)
+                optimum = self.brute_force(values, water, costs, limits[0] or np.inf, limits[1] or np.inf)
+                self.assertLessEqual(values[rows, choice].sum(), optimum + 1e-6)
+                self.assertGreaterEqual(bound, optimum - 1e-6)
+
+    def test_plans_weigh_crops_by_value(self):
+        plan = plan_crops({'district': 'puri', 'season': 'rabi', 'plots': self.PLOTS})
+        self.assertNotIn('sugarcane', {row['crop'] for row in plan['plots']})
+        self.assertEqual(plan['gap'], 0.0)
+        self.assertEqual(str(plan['gap']), '0.0')
+        priced = plan_crops({'district': 'puri', 'season': 'rabi', 'plots': self.PLOTS, 'prices': {'sugarcane': 30}})
+        self.assertEqual({row['crop'] for row in priced['plots']}, {'sugarcane'})
+
+    def test_limits_give_a_mixed_plan(self):
+        plan = plan_crops({
+            'district': 'puri', 'season': 'rabi', 'plots': self.PLOTS, 'water_limit_m3': 20000, 'seed_budget': 20000,
+        })
+        self.assertGreater(len({row['crop'] for row in plan['plots']} - {None}), 1)
+        self.assertLessEqual(plan['total_water_m3'], 20000)
+        self.assertLessEqual(plan['total_seed_cost'], 20000)
+        self.assertGreaterEqual(plan['upper_bound'], plan['total_value'])
+        self.assertGreaterEqual(plan['gap'], 0)
+
+    def test_invalid_requests(self):
+        for data in ({'district': 'puri', 'season': 'rabi', 'plots': []},
+                     {'district': 'puri', 'season': 'rabi', 'plots': self.PLOTS, 'prices': {'coffee': 100}},
+                     {'district': 'puri', 'season': 'rabi', 'plots': self.PLOTS, 'prices': {'rice': -1}}):
+            with self.assertRaises(PlanError):
+                plan_crops(data)
+        body = json.dumps({'district': 'puri', 'season': 'monsoon', 'plots': self.PLOTS})
+        self.assertEqual(self.client.post('/api/plan/', body, content_type='application/json').status_code, 401)
+        User.objects.create_user('farmer', password='p')
+        self.client.login(username='farmer', password='p')
+        self.assertEqual(self.client.post('/api/plan/', body, content_type='application/json').status_code, 400)
+
+
+class InputProfileTests(SimpleTestCase):
+    NORMAL = {'district': 'puri', 'crop': 'rice', 'season': 'kharif', 'soil_type': 'alluvial', 'irrigation': 'canal', 'field_area': 1.5}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Puri rice in kharif only, on alluvial soil under canals, 1 to 2.5 ha
+        cls.profile = InputProfile([{**cls.NORMAL, 'field_area': 1 + i / 40} for i in range(60)])
+
+    def fields(self, **changes):
+        return [field for field, _ in self.profile.check({**self.NORMAL, **changes})]
+
+    def test_typical_input_is_not_flagged(self):
+        self.assertEqual(self.fields(), [])
+
+    def test_each_check_fires(self):
+        self.assertEqual(self.fields(district='cuttack', crop='wheat', season='rabi'), ['combination'])
+        self.assertEqual(self.fields(soil_type='saline'), ['soil_type'])
+        self.assertEqual(self.fields(irrigation='drip'), ['irrigation'])
+        self.assertEqual(self.fields(field_area=150), ['field_area'])
+
+    def test_small_plots_are_not_flagged(self):
+        self.assertEqual(self.fields(field_area=0.1), [])
+        self.assertEqual(self.fields(field_area=0.05), [])
+        self.assertEqual(self.fields(field_area=0.01), ['field_area'])
+
+    def test_batch_matches_single_checks(self):
+        rows = [self.NORMAL, {**self.NORMAL, 'field_area': 150}, {**self.NORMAL, 'district': 'mars'}]
+        self.assertEqual(self.profile.check_batch(rows), [self.profile.check(row) for row in rows])
+
+
+class AnomalySyncTests(TestCase):
+    def setUp(self):
+        User.objects.create_user('farmer', password='p')
+        self.client.login(username='farmer', password='p')
+
+    def sync(self, field_area):
+        item = {'client_id': str(uuid.uuid4()), **FARM_INPUT, 'field_area': field_area}
+        response = self.client.post('/offline/sync/', json.dumps({'results': [item]}), content_type='application/json')
+        return response.json()['results'][0]
+
+    def test_flags_are_returned_and_saved(self):
+        result = self.sync(150)
+        self.assertEqual(result['status'], 'created')
+        self.assertEqual(len(result['warnings']), 1)
+        self.assertEqual(list(InputAnomaly.objects.values_list('field', flat=True)), ['field_area'])
+        self.assertNotIn('warnings', self.sync(0.1))
+
+    @override_settings(REJECT_INPUT_ANOMALIES=True)
+    def test_flagged_areas_can_be_rejected(self):
+        result = self.sync(150)
+        self.assertEqual(result['status'], 'invalid')
+        self.assertIn('field_area', result['errors'])
+        self.assertFalse(FarmInput.objects.exists())
@@ -0,0 +1,157 @@
+"""
+Rate limiting and request coalescing for the prediction endpoints.
+
+Token buckets live in the local cache backend (CACHES['default']), one per
+user and one per client IP for each scope in settings.RATE_LIMITS.
+Identical in-flight prediction requests are coalesced so only one of them
+runs the model; the rest wait for its result.
+"""
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import translation
+
+
+class Metrics:
+    """Process-local counters behind the metrics endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+
+        rates = {}
+        for scope in getattr(settings, 'RATE_LIMITS', {}):
+            total = counts.get(f'ratelimit.{scope}.requests', 0)
+            rejected = counts.get(f'ratelimit.{scope}.rejected', 0)
+            rates[f'ratelimit.{scope}.rejection_rate'] = rejected / total if total else 0.0
+        total = counts.get('prediction.requests', 0)
+        coalesced = counts.get('prediction.coalesced', 0)
+        rates['prediction.coalescing_rate'] = coalesced / total if total else 0.0
+        return {'counters': counts, 'rates': rates}
+
+
+metrics = Metrics()
+
+
+class TokenBucket:
+    """Token bucket whose state is kept in the cache under a per-client key"""
+
+    # The local-memory cache has no atomic read-modify-write, so serialise
+    # updates within the process
+    _lock = threading.Lock()
+
+    def __init__(self, scope, burst, per_minute):
+        self.scope = scope
+        self.capacity = float(burst)
+        self.refill_per_second = per_minute / 60.0
+
+    def allow(self, identity, now=None):
+        """Take one token for `identity`; False if the bucket is empty"""
+        now = time.monotonic() if now is None else now
+        key = f'ratelimit:{self.scope}:{identity}'
+        # Idle buckets are full again after this long, so let the cache drop them
+        timeout = int(self.capacity / self.refill_per_second) + 1 if self.refill_per_second else None
+
+        with self._lock:
+            tokens, updated = cache.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.refill_per_second)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            cache.set(key, (tokens, now), timeout)
+        return allowed
+
+
+def client_ip(request):
+    """Client address, honouring X-Forwarded-For only behind a trusted proxy"""
+    if getattr(settings, 'RATE_LIMIT_TRUST_FORWARDED_FOR', False):
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', 'unknown')
+
+
+def check_rate_limit(request, scope):
+    """True if the request may proceed; both the user and IP buckets must have a token"""
+    limits = getattr(settings, 'RATE_LIMITS', {}).get(scope)
+    scale = getattr(settings, 'RATE_LIMIT_SCALE', 1)
+    if not limits or scale <= 0:
+        return True
+
+    metrics.incr(f'ratelimit.{scope}.requests')
+    bucket = TokenBucket(scope, limits['burst'] * scale, limits['per_minute'] * scale)
+    identities = [f'ip:{client_ip(request)}']
+    if request.user.is_authenticated:
+        identities.append(f'user:{request.user.pk}')
+
+    # Check every bucket (no short-circuit) so each one is charged
+    allowed = all([bucket.allow(identity) for identity in identities])
+    if not allowed:
+        metrics.incr(f'ratelimit.{scope}.rejected')
+    return allowed
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run a function once per key at a time; concurrent callers with the same key share the result"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            metrics.incr('prediction.coalesced')
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+prediction_flight = SingleFlight()
+
+
+def prediction_key(farm_input):
+    """Everything predict_yield and generate_recommendations look at"""
+    return (
+        farm_input.district, farm_input.crop, farm_input.season,
+        farm_input.irrigation, farm_input.soil_type, farm_input.seed_variety,
+        bool(farm_input.soil_health_card), bool(farm_input.pest_presence),
+        farm_input.sowing_date.year if farm_input.sowing_date else None,
+        # Recommendation texts are translated into the request's language
+        translation.get_language(),
+    )
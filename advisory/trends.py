@@ -0,0 +1,291 @@
+"""
+Year-over-year yield trends for every district x crop x season series.
+
+The history is held as (series x year) matrices of yield totals and row
+counts, so a year can be missing from any series. Two models are fitted for
+all series at once with NumPy; the only Python loop is over years:
+
+- linear: an OLS trend line, fitted from running sums (n, sum t, sum y,
+  sum t*y, sum t^2)
+- holt: Holt's linear exponential smoothing (level + trend)
+
+Each model's one-step-ahead error, and that of the plain running mean, is
+accumulated as the years are fed in. A series forecasts with a trend model
+only when that model has tracked it clearly better than the mean; most
+series are noisy enough that the mean wins.
+
+All of this state is updated year by year, so ingesting a new season costs
+one more step. Fitted state is cached in an .npz file keyed by the history
+it was fitted on.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# Holt smoothing constants for the level and the trend
+HOLT_ALPHA = 0.5
+HOLT_BETA = 0.3
+
+# A trend line needs this many years; shorter series forecast their mean
+MIN_TREND_YEARS = 3
+
+METHODS = ['mean', 'linear', 'holt']
+
+# Fraction by which a trend model's one-step error must undercut the mean's.
+# Year-to-year noise dominates most series; in backtests on 2020-2023
+# smaller margins picked more trends and were less accurate.
+TREND_MARGIN = 0.3
+
+CACHE_VERSION = 1
+
+STATE_ARRAYS = [
+    'sums', 'counts',
+    'n', 'st', 'sy', 'sty', 'stt',
+    'level', 'trend', 'started',
+    'mean_error', 'linear_error', 'holt_error', 'scored',
+]
+
+
+def series_key(row):
+    return (row['district'], row['crop'], row['season'])
+
+
+class TrendModel:
+    """Vectorized per-series trend fits with incremental updates as new years arrive"""
+
+    def __init__(self, base_year=None):
+        self.base_year = base_year
+        self.keys = []
+        self.index = {}
+        self.years = []
+        # Per (series, year) yield totals and row counts; means are sums / counts
+        self.sums = np.zeros((0, 0))
+        self.counts = np.zeros((0, 0))
+        self._reset_fit(0)
+
+    def _reset_fit(self, s):
+        # OLS running sums over the years seen so far (t = year - base_year)
+        self.n = np.zeros(s)
+        self.st = np.zeros(s)
+        self.sy = np.zeros(s)
+        self.sty = np.zeros(s)
+        self.stt = np.zeros(s)
+        # Holt state
+        self.level = np.zeros(s)
+        self.trend = np.zeros(s)
+        self.started = np.zeros(s, dtype=bool)
+        # Accumulated absolute one-step-ahead errors of each model
+        self.mean_error = np.zeros(s)
+        self.linear_error = np.zeros(s)
+        self.holt_error = np.zeros(s)
+        self.scored = np.zeros(s)
+        # Years before this one are folded into the fits
+        self.fitted_until = None
+
+    @classmethod
+    def fit(cls, rows):
+        """Fit every series in the history rows"""
+        model = cls()
+        model.ingest(rows)
+        return model
+
+    # -- data --------------------------------------------------------------
+
+    def _add_rows(self, rows):
+        """Accumulate rows into the sums/counts matrices; returns the lowest year touched"""
+        rows = list(rows)
+        if not rows:
+            return None
+        if self.base_year is None:
+            self.base_year = min(int(row['year']) for row in rows)
+
+        new_keys = [key for key in dict.fromkeys(series_key(row) for row in rows) if key not in self.index]
+        for key in new_keys:
+            self.index[key] = len(self.keys)
+            self.keys.append(key)
+        # Keep the year axis contiguous so column j is always years[0] + j
+        row_years = {int(row['year']) for row in rows} | set(self.years)
+        years = list(range(min(row_years), max(row_years) + 1))
+        offset = self.years[0] - years[0] if self.years else 0
+
+        s, t = len(self.keys), len(years)
+        sums = np.zeros((s, t))
+        counts = np.zeros((s, t))
+        old_s, old_t = self.sums.shape
+        sums[:old_s, offset:offset + old_t] = self.sums
+        counts[:old_s, offset:offset + old_t] = self.counts
+        self.sums, self.counts, self.years = sums, counts, years
+
+        series = np.array([self.index[series_key(row)] for row in rows])
+        columns = np.array([int(row['year']) - years[0] for row in rows])
+        np.add.at(self.sums, (series, columns), [float(row['yield']) for row in rows])
+        np.add.at(self.counts, (series, columns), 1)
+
+        if new_keys:
+            self._grow_fit(s)
+        return int(columns.min()) + years[0]
+
+    def _grow_fit(self, s):
+        """Extend the fitted state arrays for newly seen series"""
+        grow = s - len(self.n)
+        for name in STATE_ARRAYS[2:]:
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate([array, np.zeros(grow, dtype=array.dtype)]))
+
+    def ingest(self, rows):
+        """Add history rows and bring the fits up to date.
+
+        Rows for years after the last fitted year are folded in step by step.
+        Rows for an already fitted (or earlier) year change the series from
+        that point on, so the fits are recomputed from the stored matrices.
+        """
+        lowest_year = self._add_rows(rows)
+        if lowest_year is None:
+            return self
+        if self.fitted_until is not None and lowest_year < self.fitted_until:
+            self._reset_fit(len(self.keys))
+        start = 0 if self.fitted_until is None else self.fitted_until - self.years[0]
+        for column in range(start, len(self.years)):
+            self._step(column)
+        return self
+
+    # -- fitting -----------------------------------------------------------
+
+    def _linear_params(self):
+        """Slope and intercept of each series' trend line (slope 0 below MIN_TREND_YEARS)"""
+        denominator = self.n * self.stt - self.st ** 2
+        enough = (self.n >= MIN_TREND_YEARS) & (denominator > 0)
+        slope = np.zeros_like(self.n)
+        np.divide(self.n * self.sty - self.st * self.sy, denominator, out=slope, where=enough)
+        mean_t = np.divide(self.st, self.n, out=np.zeros_like(self.n), where=self.n > 0)
+        mean_y = np.divide(self.sy, self.n, out=np.zeros_like(self.n), where=self.n > 0)
+        return slope, mean_y - slope * mean_t
+
+    def _step(self, column):
+        """Fold one year (column of the matrix) into every series' fits"""
+        counts = self.counts[:, column]
+        observed = counts > 0
+        y = np.divide(self.sums[:, column], counts, out=np.zeros_like(counts), where=observed)
+        t = float(self.years[column] - self.base_year)
+
+        # Score both models' forecasts for this year before learning from it
+        scorable = observed & self.started & (self.n >= MIN_TREND_YEARS)
+        slope, intercept = self._linear_params()
+        mean = np.divide(self.sy, self.n, out=np.zeros_like(self.n), where=self.n > 0)
+        self.mean_error += np.where(scorable, np.abs(mean - y), 0)
+        self.linear_error += np.where(scorable, np.abs(intercept + slope * t - y), 0)
+        self.holt_error += np.where(scorable, np.abs(self.level + self.trend - y), 0)
+        self.scored += scorable
+
+        # OLS sums
+        self.n += observed
+        self.st += np.where(observed, t, 0)
+        self.sy += y
+        self.sty += y * t
+        self.stt += np.where(observed, t * t, 0)
+
+        # Holt: missing years advance the level along the trend
+        first = observed & ~self.started
+        update = observed & self.started
+        predicted = self.level + self.trend
+        level = np.where(update, HOLT_ALPHA * y + (1 - HOLT_ALPHA) * predicted, predicted)
+        trend = np.where(update, HOLT_BETA * (level - self.level) + (1 - HOLT_BETA) * self.trend, self.trend)
+        self.level = np.where(first, y, np.where(self.started, level, 0))
+        self.trend = np.where(first, 0, np.where(self.started, trend, 0))
+        self.started |= observed
+        self.fitted_until = self.years[column] + 1
+
+    # -- forecasting -------------------------------------------------------
+
+    def _selected(self):
+        """Index of each series' method in METHODS"""
+        trend = np.where(self.holt_error < self.linear_error, 2, 1)
+        trend_error = np.minimum(self.holt_error, self.linear_error)
+        # A trend has to have tracked the series clearly better than the mean
+        use_trend = (self.scored > 0) & (trend_error < (1 - TREND_MARGIN) * self.mean_error)
+        return np.where(use_trend, trend, 0)
+
+    def forecast(self, year=None):
+        """Forecast yield for `year` (default: the year after the last fitted one) for all series.
+
+        Returns (forecast, method) arrays aligned with self.keys, method being
+        one of METHODS. Negative forecasts are clipped to 0.
+        """
+        last_year = self.years[-1] if self.years else self.base_year
+        year = last_year + 1 if year is None else year
+        slope, intercept = self._linear_params()
+        mean = np.divide(self.sy, self.n, out=np.zeros_like(self.n), where=self.n > 0)
+        linear = intercept + slope * (year - self.base_year)
+        holt = self.level + self.trend * (year - last_year)
+
+        selected = self._selected()
+        forecast = np.choose(selected, [mean, linear, holt])
+        return np.maximum(forecast, 0), np.array(METHODS)[selected]
+
+    def forecast_series(self, district, crop, season, year=None):
+        """Forecast for one series, or None if it has no history"""
+        i = self.index.get((district, crop, season))
+        if i is None or self.n[i] == 0:
+            return None
+        forecast, method = self.forecast(year)
+        slope, _ = self._linear_params()
+        last_year = self.years[-1]
+        return {
+            'year': last_year + 1 if year is None else year,
+            'forecast': float(forecast[i]),
+            'method': str(method[i]),
+            'slope_per_year': float(slope[i]),
+            'years_of_history': int(self.n[i]),
+            'mean_abs_error': float(
+                [self.mean_error, self.linear_error, self.holt_error][self._selected()[i]][i] / self.scored[i]
+            ) if self.scored[i] else None,
+        }
+
+    # -- caching -----------------------------------------------------------
+
+    def save(self, path, signature):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        meta = {
+            'version': CACHE_VERSION,
+            'signature': signature,
+            'base_year': self.base_year,
+            'years': self.years,
+            'fitted_until': self.fitted_until,
+            'keys': self.keys,
+            'alpha': HOLT_ALPHA,
+            'beta': HOLT_BETA,
+        }
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, meta=np.array(json.dumps(meta)), **{name: getattr(self, name) for name in STATE_ARRAYS})
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, signature):
+        """The cached model if it was fitted on the same history and settings, else None"""
+        try:
+            with np.load(path) as data:
+                meta = json.loads(str(data['meta']))
+                if (meta['version'], meta['signature'], meta['alpha'], meta['beta']) != (
+                    CACHE_VERSION, signature, HOLT_ALPHA, HOLT_BETA
+                ):
+                    return None
+                model = cls(meta['base_year'])
+                for name in STATE_ARRAYS:
+                    setattr(model, name, data[name])
+        except (OSError, KeyError, ValueError):
+            return None
+        model.years = meta['years']
+        model.fitted_until = meta['fitted_until']
+        model.keys = [tuple(key) for key in meta['keys']]
+        model.index = {key: i for i, key in enumerate(model.keys)}
+        return model
+
+
+def history_signature(rows):
+    """Stable hash of the rows a model is fitted on"""
+    digest = hashlib.sha1()
+    for row in rows:
+        digest.update(f"{row['year']}|{row['district']}|{row['crop']}|{row['season']}|{row['yield']}\n".encode())
+    return digest.hexdigest()
@@ -1,18 +1,33 @@
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views
 from django.views.i18n import set_language
 from . import views
 
+# Under ASGI, serve the prediction pages from the async views
+if settings.ASYNC_VIEWS:
+    from . import async_views as prediction_views
+else:
+    prediction_views = views
+
 urlpatterns = [
     path('', views.home, name='home'),
-    path('input/', views.farm_input, name='farm_input'),
-    path('recommendation/<int:recommendation_id>/', views.recommendation, name='recommendation'),
+    path('input/', prediction_views.farm_input, name='farm_input'),
+    path('recommendation/<int:recommendation_id>/', prediction_views.recommendation, name='recommendation'),
+    path('history/', views.history, name='history'),
+    path('api/history/', views.history_api, name='history_api'),
+    path('api/plan/', views.plan_api, name='plan_api'),
     path('about/', views.about, name='about'),
     path('login/', auth_views.LoginView.as_view(template_name='advisory/login.html'), name='login'),
     path('logout/', auth_views.LogoutView.as_view(next_page='home'), name='logout'),
     path('signup/', views.signup, name='signup'),
     path('contact/', views.contact, name='contact'),
-    path('weather/', views.weather_forecast, name='weather_forecast'),
+    path('weather/', prediction_views.weather_forecast, name='weather_forecast'),
+    path('offline/bundles/<str:district>/', views.offline_bundle, name='offline_bundle'),
+    path('offline/sync/', views.offline_sync, name='offline_sync'),
+    path('sw.js', views.service_worker, name='service_worker'),
+    path('manifest.webmanifest', views.web_manifest, name='web_manifest'),
+    path('metrics/', views.prediction_metrics, name='prediction_metrics'),
     # path('chatbot/', views.chatbot, name='chatbot'),
     path('i18n/setlang/', set_language, name='set_language'),
 ]
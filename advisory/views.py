@@ -4,11 +4,23 @@ from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.views import LoginView
 from django.http import JsonResponse
+from django.db import IntegrityError, transaction
+from django.urls import reverse
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, require_POST
 from django.conf import settings
 from .forms import FarmInputForm, SignupForm, ContactForm
-from .models import FarmInput, Recommendation, Contact
+from .models import FarmInput, Recommendation, Contact, UserSummary
 from .ml_model import yield_predictor
+from .analogs import get_analog_index
+from .offline import district_bundle
+from .anomalies import get_input_profile, record_anomalies
+from .planner import PlanError, plan_crops
+from .history import InvalidCursor, history_item, history_page, summary_item
+from .throttling import check_rate_limit, metrics, prediction_flight, prediction_key
+import json
 import traceback
+import uuid
 import requests
 # import openai
 import os
@@ -17,35 +29,88 @@ def home(request):
     """Home page view"""
     return render(request, 'advisory/home.html')
 
+def _predict(farm_input_obj):
+    """Yield prediction and recommendations for one farm input"""
+    predicted_yield, confidence = yield_predictor.predict_yield(farm_input_obj)
+    recommendations = yield_predictor.generate_recommendations(farm_input_obj, predicted_yield)
+    return predicted_yield, confidence, recommendations
+
+def _recommendation_fields(farm_input_obj, predicted_yield, confidence, recommendations):
+    """Validated Recommendation field values for a prediction"""
+    # Ensure all required fields are present
+    if not all(key in recommendations for key in ['action_1', 'action_2', 'action_3', 'reasoning', 'estimated_gain']):
+        raise ValueError("Incomplete recommendation data generated")
+
+    return dict(
+        farm_input=farm_input_obj,
+        user=farm_input_obj.user,
+        predicted_yield=float(predicted_yield),
+        confidence_interval=str(confidence),
+        estimated_gain=float(recommendations['estimated_gain']),
+        action_1=str(recommendations['action_1']),
+        action_2=str(recommendations['action_2']),
+        action_3=str(recommendations['action_3']),
+        reasoning=str(recommendations['reasoning'])
+    )
+
+def _client_id(value):
+    """UUID from a browser-supplied client_id, or None"""
+    try:
+        return uuid.UUID(str(value)) if value else None
+    except ValueError:
+        return None
+
+def _previous_submission(client_id):
+    """FarmInput already saved under a client_id (with its recommendation, if any), or None"""
+    return FarmInput.objects.filter(client_id=client_id).select_related('user', 'recommendation').first()
+
+def _anomaly_warning(anomalies):
+    return "Some inputs look unusual: " + ' '.join(message for _, message in anomalies) + " Please check them."
+
+def _save_recommendation(farm_input_obj, predicted_yield, confidence, recommendations):
+    return Recommendation.objects.create(
+        **_recommendation_fields(farm_input_obj, predicted_yield, confidence, recommendations)
+    )
+
 @login_required(login_url='/login/')
 def farm_input(request):
     """Farm input form view"""
     if request.method == 'POST':
         form = FarmInputForm(request.POST)
+        if not check_rate_limit(request, 'farm_input'):
+            messages.error(request, "Too many requests. Please wait a minute and try again.")
+            return render(request, 'advisory/farm_input.html', {'form': form}, status=429)
         if form.is_valid():
             try:
-                farm_input_obj = form.save()
-                
-                # Generate ML prediction
-                predicted_yield, confidence = yield_predictor.predict_yield(farm_input_obj)
-                recommendations = yield_predictor.generate_recommendations(farm_input_obj, predicted_yield)
-                
-                # Ensure all required fields are present
-                if not all(key in recommendations for key in ['action_1', 'action_2', 'action_3', 'reasoning', 'estimated_gain']):
-                    raise ValueError("Incomplete recommendation data generated")
+                # A resubmitted form (retry after a dropped connection) returns the first result
+                client_id = _client_id(request.POST.get('client_id'))
+                previous = _previous_submission(client_id) if client_id else None
+                if previous and previous.user_id != request.user.pk:
+                    # Someone else's client_id; save this one without it
+                    client_id = previous = None
+                elif previous and hasattr(previous, 'recommendation'):
+                    return redirect('recommendation', recommendation_id=previous.recommendation.id)
+
+                if previous:
+                    # The first attempt saved the input but failed before its recommendation
+                    farm_input_obj = previous
+                else:
+                    farm_input_obj = form.save(commit=False)
+                    farm_input_obj.user = request.user
+                    farm_input_obj.client_id = client_id
+                    farm_input_obj.save()
+                    if form.anomalies:
+                        record_anomalies([farm_input_obj], [form.anomalies])
+                        messages.warning(request, _anomaly_warning(form.anomalies))
                 
-                # Save recommendation
-                recommendation = Recommendation.objects.create(
-                    farm_input=farm_input_obj,
-                    predicted_yield=float(predicted_yield),
-                    confidence_interval=str(confidence),
-                    estimated_gain=float(recommendations['estimated_gain']),
-                    action_1=str(recommendations['action_1']),
-                    action_2=str(recommendations['action_2']),
-                    action_3=str(recommendations['action_3']),
-                    reasoning=str(recommendations['reasoning'])
+                # Generate ML prediction; identical concurrent submissions share one computation
+                metrics.incr('prediction.requests')
+                predicted_yield, confidence, recommendations = prediction_flight.do(
+                    prediction_key(farm_input_obj), lambda: _predict(farm_input_obj)
                 )
                 
+                recommendation = _save_recommendation(farm_input_obj, predicted_yield, confidence, recommendations)
+                
                 messages.success(request, "AI recommendation generated successfully!")
                 return redirect('recommendation', recommendation_id=recommendation.id)
                 
@@ -60,33 +125,55 @@ def farm_input(request):
     
     return render(request, 'advisory/farm_input.html', {'form': form})
 
+def _recommendation_context(recommendation):
+    """Template context for a recommendation; recommendation.farm_input must already be loaded"""
+    # Get district average for comparison
+    farm_input = recommendation.farm_input
+    district_avg = yield_predictor.get_district_average(farm_input.district, farm_input.crop, farm_input.season)
+    
+    # Calculate total production
+    total_production = recommendation.predicted_yield * farm_input.field_area
+    
+    # Calculate improvement percentage
+    improvement = 0
+    if district_avg > 0:
+        improvement = ((recommendation.predicted_yield - district_avg) / district_avg) * 100
+    
+    # Closest historical farms for comparison; the page still renders without them
+    try:
+        analogs = get_analog_index().query(farm_input, k=5)
+    except Exception as e:
+        print(f"Analog search failed: {e}")
+        analogs = []
+    districts = dict(FarmInput.DISTRICT_CHOICES)
+    irrigation = dict(FarmInput.IRRIGATION_CHOICES)
+    seeds = dict(FarmInput.SEED_CHOICES)
+    soils = dict(FarmInput.SOIL_CHOICES)
+    for analog in analogs:
+        analog['district_display'] = districts.get(analog['district'], analog['district'])
+        analog['irrigation_display'] = irrigation.get(analog['irrigation'], analog['irrigation'])
+        analog['seed_variety_display'] = seeds.get(analog['seed_variety'], analog['seed_variety'])
+        analog['soil_type_display'] = soils.get(analog['soil_type'], analog['soil_type'])
+
+    context = {
+        'recommendation': recommendation,
+        'analogs': analogs,
+        'total_production': total_production,
+        'yield_comparison': {
+            'predicted': recommendation.predicted_yield,
+            'district_avg': district_avg,
+            'improvement': improvement
+        }
+    }
+    return context
+
 @login_required(login_url='/login/')
 def recommendation(request, recommendation_id):
     """Display recommendation results"""
     try:
-        recommendation = Recommendation.objects.get(id=recommendation_id)
-        
-        # Get district average for comparison
-        farm_input = recommendation.farm_input
-        district_avg = yield_predictor.get_district_average(farm_input.district, farm_input.crop, farm_input.season)
-        
-        # Calculate total production
-        total_production = recommendation.predicted_yield * farm_input.field_area
-        
-        # Calculate improvement percentage
-        improvement = 0
-        if district_avg > 0:
-            improvement = ((recommendation.predicted_yield - district_avg) / district_avg) * 100
-        
-        context = {
-            'recommendation': recommendation,
-            'total_production': total_production,
-            'yield_comparison': {
-                'predicted': recommendation.predicted_yield,
-                'district_avg': district_avg,
-                'improvement': improvement
-            }
-        }
+        # Only the user's own recommendations; ids are sequential
+        recommendation = Recommendation.objects.filter(user=request.user).select_related('farm_input').get(id=recommendation_id)
+        context = _recommendation_context(recommendation)
         
         return render(request, 'advisory/recommendation.html', context)
     except Recommendation.DoesNotExist:
@@ -96,6 +183,52 @@ def recommendation(request, recommendation_id):
         messages.error(request, f"Error loading recommendation: {str(e)}")
         return redirect('farm_input')
 
+@login_required(login_url='/login/')
+def history(request):
+    """The signed-in user's past recommendations"""
+    try:
+        recommendations, next_cursor = history_page(request.user, request.GET.get('cursor'))
+    except InvalidCursor:
+        return redirect('history')
+    context = {
+        'recommendations': recommendations,
+        'next_cursor': next_cursor,
+        'summary': UserSummary.objects.filter(user=request.user).first(),
+    }
+    return render(request, 'advisory/history.html', context)
+
+def history_api(request):
+    """JSON history: ?cursor=<next_cursor>&limit=<n>"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    try:
+        recommendations, next_cursor = history_page(
+            request.user, request.GET.get('cursor'), request.GET.get('limit', 20)
+        )
+    except (InvalidCursor, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({
+        'results': [history_item(r) for r in recommendations],
+        'next_cursor': next_cursor,
+        'summary': summary_item(UserSummary.objects.filter(user=request.user).first()),
+    })
+
+@require_POST
+def plan_api(request):
+    """Best crop, seed and irrigation per plot: {"district", "season", "plots": [{field_area, soil_type, irrigation}, ...]}"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    if not check_rate_limit(request, 'plan'):
+        return JsonResponse({'error': 'Too many requests'}, status=429)
+    try:
+        plan = plan_crops(json.loads(request.body))
+    except PlanError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except ValueError:
+        return JsonResponse({'error': 'Expected a JSON object'}, status=400)
+    metrics.incr('plan.plots', len(plan['plots']))
+    return JsonResponse(plan)
+
 def about(request):
     """About page view"""
     return render(request, 'advisory/about.html')
@@ -150,8 +283,33 @@ def signup(request):
         form = SignupForm()
     return render(request, 'advisory/signup.html', {'form': form})
 
+def _daily_forecasts(forecast_data):
+    """Group the 3-hourly forecast into the next 5 days"""
+    daily_forecasts = {}
+    for item in forecast_data['list']:
+        date = item['dt_txt'].split(' ')[0]
+        if date not in daily_forecasts:
+            daily_forecasts[date] = {
+                'temp_min': item['main']['temp_min'],
+                'temp_max': item['main']['temp_max'],
+                'humidity': item['main']['humidity'],
+                'description': item['weather'][0]['description'],
+                'icon': item['weather'][0]['icon'],
+                'wind_speed': item['wind']['speed'],
+                'date': date
+            }
+        else:
+            daily_forecasts[date]['temp_min'] = min(daily_forecasts[date]['temp_min'], item['main']['temp_min'])
+            daily_forecasts[date]['temp_max'] = max(daily_forecasts[date]['temp_max'], item['main']['temp_max'])
+    return list(daily_forecasts.values())[:5]
+
 def weather_forecast(request):
     """Weather forecast view"""
+    if not check_rate_limit(request, 'weather'):
+        error_msg = "Too many weather requests. Please wait a minute and try again."
+        messages.error(request, error_msg)
+        return render(request, 'advisory/weather.html', {'error': error_msg}, status=429)
+
     location = request.GET.get('location', 'Bhubaneswar')  # Default to Bhubaneswar
     api_key = settings.WEATHER_API_KEY
     base_url = settings.WEATHER_API_BASE_URL
@@ -176,27 +334,9 @@ def weather_forecast(request):
             messages.error(request, error_msg)
             return render(request, 'advisory/weather.html', {'error': error_msg})
 
-        # Process forecast data (group by day)
-        daily_forecasts = {}
-        for item in forecast_data['list']:
-            date = item['dt_txt'].split(' ')[0]
-            if date not in daily_forecasts:
-                daily_forecasts[date] = {
-                    'temp_min': item['main']['temp_min'],
-                    'temp_max': item['main']['temp_max'],
-                    'humidity': item['main']['humidity'],
-                    'description': item['weather'][0]['description'],
-                    'icon': item['weather'][0]['icon'],
-                    'wind_speed': item['wind']['speed'],
-                    'date': date
-                }
-            else:
-                daily_forecasts[date]['temp_min'] = min(daily_forecasts[date]['temp_min'], item['main']['temp_min'])
-                daily_forecasts[date]['temp_max'] = max(daily_forecasts[date]['temp_max'], item['main']['temp_max'])
-
         context = {
             'current_weather': current_data,
-            'daily_forecasts': list(daily_forecasts.values())[:5],  # Next 5 days
+            'daily_forecasts': _daily_forecasts(forecast_data),
             'location': location
         }
         return render(request, 'advisory/weather.html', context)
@@ -205,6 +345,145 @@ def weather_forecast(request):
         messages.error(request, f"Error fetching weather data: {str(e)}")
         return render(request, 'advisory/weather.html', {'error': str(e)})
 
+MAX_SYNC_BATCH = 100
+
+def _bundle_etag(request, district):
+    if district in dict(FarmInput.DISTRICT_CHOICES):
+        return district_bundle(district)['version']
+    return None
+
+@gzip_page
+@condition(etag_func=_bundle_etag)
+def offline_bundle(request, district):
+    """Versioned prediction bundle for one district, for the offline form"""
+    if district not in dict(FarmInput.DISTRICT_CHOICES):
+        return JsonResponse({'error': f"Unknown district '{district}'"}, status=404)
+    response = JsonResponse(district_bundle(district))
+    # Revalidate on every online fetch; the service worker serves it when offline
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+@require_POST
+def offline_sync(request):
+    """Save farm inputs entered while offline, in one batch: {"results": [{client_id, <form fields>}, ...]}"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    if not check_rate_limit(request, 'sync'):
+        return JsonResponse({'error': 'Too many requests'}, status=429)
+    try:
+        items = json.loads(request.body)['results']
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise ValueError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected {"results": [...]}'}, status=400)
+    if len(items) > MAX_SYNC_BATCH:
+        return JsonResponse({'error': f'At most {MAX_SYNC_BATCH} results per request'}, status=400)
+
+    client_ids = [_client_id(item.get('client_id')) for item in items]
+    already_synced = {}
+    # Saved by an earlier attempt that failed before the recommendation
+    unfinished = {}
+    taken = set()
+    for previous in FarmInput.objects.filter(client_id__in=[c for c in client_ids if c]).select_related('recommendation'):
+        if previous.user_id != request.user.pk:
+            taken.add(previous.client_id)
+        elif hasattr(previous, 'recommendation'):
+            already_synced[previous.client_id] = previous.recommendation.id
+        else:
+            unfinished[previous.client_id] = previous
+
+    # Validate every new entry first so the batch is checked for anomalies in one pass
+    forms = [
+        FarmInputForm(item, check_anomalies=False)
+        if client_id and client_id not in already_synced and client_id not in unfinished and client_id not in taken
+        else None
+        for item, client_id in zip(items, client_ids)
+    ]
+    valid = [form for form in forms if form is not None and form.is_valid()]
+    for form, anomalies in zip(valid, get_input_profile().check_batch([form.cleaned_data for form in valid])):
+        form.anomalies = anomalies
+        form.reject_anomalies(anomalies)
+
+    results = []
+    pending = []
+    for item, client_id, form in zip(items, client_ids, forms):
+        result = {'client_id': item.get('client_id')}
+        results.append(result)
+        if client_id is None:
+            result.update(status='invalid', errors={'client_id': ['A UUID is required.']})
+        elif client_id in taken:
+            result.update(status='invalid', errors={'client_id': ['This client_id is already in use.']})
+        elif client_id in already_synced:
+            result.update(status='duplicate', recommendation_id=already_synced[client_id])
+        elif client_id in unfinished:
+            already_synced[client_id] = None
+            pending.append((result, unfinished.pop(client_id), []))
+        elif form.is_valid():
+            farm_input_obj = form.save(commit=False)
+            farm_input_obj.user = request.user
+            farm_input_obj.client_id = client_id
+            # Repeats within the batch are saved once
+            already_synced[client_id] = None
+            pending.append((result, farm_input_obj, form.anomalies))
+        else:
+            result.update(status='invalid', errors=form.errors.get_json_data())
+
+    farm_inputs = [farm_input_obj for _, farm_input_obj, _ in pending]
+    recommendations = yield_predictor.generate_recommendations_batch(farm_inputs)
+    saved = []
+    try:
+        with transaction.atomic():
+            for (result, farm_input_obj, anomalies), recommendation_data in zip(pending, recommendations):
+                try:
+                    # A savepoint per entry, so a concurrent request saving the same client_id fails only this one
+                    with transaction.atomic():
+                        if farm_input_obj.pk is None:
+                            farm_input_obj.save()
+                        predicted_yield, confidence = yield_predictor.predict_yield(farm_input_obj)
+                        recommendation = _save_recommendation(farm_input_obj, predicted_yield, confidence, recommendation_data)
+                except IntegrityError:
+                    result.update(status='duplicate', recommendation_id=Recommendation.objects.filter(
+                        farm_input__client_id=farm_input_obj.client_id, user=request.user
+                    ).values_list('id', flat=True).first())
+                    continue
+                saved.append((farm_input_obj, anomalies))
+                already_synced[farm_input_obj.client_id] = recommendation.id
+                result.update(
+                    status='created',
+                    recommendation_id=recommendation.id,
+                    url=reverse('recommendation', args=[recommendation.id]),
+                    predicted_yield=recommendation.predicted_yield,
+                )
+                if anomalies:
+                    result['warnings'] = [message for _, message in anomalies]
+            record_anomalies([farm_input_obj for farm_input_obj, _ in saved], [anomalies for _, anomalies in saved])
+    except Exception as e:
+        print(f"Error in offline_sync view: {e}")
+        return JsonResponse({'error': 'Could not save results, please retry'}, status=500)
+
+    for result in results:
+        if result.get('status') == 'duplicate' and result['recommendation_id'] is None:
+            result['recommendation_id'] = already_synced[_client_id(result['client_id'])]
+    metrics.incr('offline.synced', len(saved))
+    return JsonResponse({'results': results})
+
+def service_worker(request):
+    """The PWA service worker; served from the site root so it can control every page"""
+    response = render(request, 'advisory/sw.js', {'cache_version': settings.OFFLINE_CACHE_VERSION},
+                      content_type='application/javascript')
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+def web_manifest(request):
+    """PWA web app manifest"""
+    return render(request, 'advisory/manifest.webmanifest', content_type='application/manifest+json')
+
+def prediction_metrics(request):
+    """Rate limiting and request coalescing counters (staff only)"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+    return JsonResponse(metrics.snapshot())
+
 # def chatbot(request):
 #     """Chatbot API endpoint"""
 #     if request.method == 'POST':
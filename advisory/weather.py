@@ -0,0 +1,180 @@
+"""
+District weather prefetched from the OpenWeatherMap API, for yield adjustments.
+
+`prefetch_district_weather` fetches current conditions and the 5-day forecast
+for every district concurrently over one pooled HTTP session. It stores a row
+of features per district in DistrictWeather; run it from cron with
+`manage.py prefetch_weather`. Predictions read those rows from an in-memory
+copy (`district_weather`), so no request waits on the weather API.
+"""
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .models import DistrictWeather
+
+# District headquarters (lat, lon); queried by coordinates because several
+# district names are ambiguous as city names
+DISTRICT_COORDINATES = {
+    'angul': (20.84, 85.10), 'balangir': (20.71, 83.49), 'balasore': (21.49, 86.93),
+    'bargarh': (21.33, 83.62), 'bhadrak': (21.06, 86.50), 'boudh': (20.84, 84.32),
+    'cuttack': (20.46, 85.88), 'deogarh': (21.54, 84.73), 'dhenkanal': (20.66, 85.60),
+    'gajapati': (18.78, 84.09), 'ganjam': (19.36, 84.98), 'jagatsinghpur': (20.26, 86.17),
+    'jajpur': (20.85, 86.33), 'jharsuguda': (21.86, 84.01), 'kalahandi': (19.91, 83.17),
+    'kandhamal': (20.47, 84.23), 'kendrapara': (20.50, 86.42), 'keonjhar': (21.63, 85.58),
+    'khordha': (20.18, 85.62), 'koraput': (18.81, 82.71), 'malkangiri': (18.35, 81.89),
+    'mayurbhanj': (21.94, 86.72), 'nabarangpur': (19.23, 82.55), 'nayagarh': (20.13, 85.10),
+    'nuapada': (20.82, 82.54), 'puri': (19.81, 85.83), 'rayagada': (19.17, 83.42),
+    'sambalpur': (21.47, 83.97), 'sonepur': (20.83, 83.91), 'sundargarh': (22.12, 84.03),
+}
+
+REQUEST_TIMEOUT = 10
+RAINY_DAY_MM = 2.5
+HOT_DAY_C = 38
+
+# Months of each season; the forecast only adjusts farms in the current season
+SEASON_MONTHS = {
+    'kharif': {6, 7, 8, 9, 10},
+    'rabi': {11, 12, 1, 2},
+    'zaid': {3, 4, 5},
+}
+
+# Ignore rows older than this (the prefetch job has stopped running)
+MAX_AGE = timedelta(hours=24)
+
+# Total weather adjustment is kept within ±10%
+FACTOR_RANGE = (0.9, 1.1)
+
+
+def weather_features(current, forecast):
+    """DistrictWeather fields from the /weather and /forecast responses"""
+    daily_rain = defaultdict(float)
+    daily_max = defaultdict(lambda: float('-inf'))
+    humidity = []
+    for item in forecast['list']:
+        day = item['dt_txt'].split(' ')[0]
+        daily_rain[day] += item.get('rain', {}).get('3h', 0.0)
+        daily_max[day] = max(daily_max[day], item['main']['temp_max'])
+        humidity.append(item['main']['humidity'])
+    return {
+        'temperature': current['main']['temp'],
+        'humidity': current['main']['humidity'],
+        'rain_5d': round(sum(daily_rain.values()), 1),
+        'rainy_days': sum(1 for rain in daily_rain.values() if rain >= RAINY_DAY_MM),
+        'temp_max_5d': max(item['main']['temp_max'] for item in forecast['list']),
+        'temp_min_5d': min(item['main']['temp_min'] for item in forecast['list']),
+        'hot_days': sum(1 for temp in daily_max.values() if temp >= HOT_DAY_C),
+        'humidity_mean_5d': round(sum(humidity) / len(humidity), 1),
+        'wind_max_5d': max(item['wind']['speed'] for item in forecast['list']),
+    }
+
+
+def _session(workers):
+    """HTTP session with a connection pool for `workers` threads and retries on transient errors"""
+    retry = Retry(total=2, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=['GET'])
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def fetch_district(session, district, timeout=REQUEST_TIMEOUT):
+    """Weather features for one district"""
+    lat, lon = DISTRICT_COORDINATES[district]
+    params = {'lat': lat, 'lon': lon, 'appid': settings.WEATHER_API_KEY, 'units': 'metric'}
+    responses = []
+    for endpoint in ('weather', 'forecast'):
+        response = session.get(f"{settings.WEATHER_API_BASE_URL}/{endpoint}", params=params, timeout=timeout)
+        response.raise_for_status()
+        responses.append(response.json())
+    return weather_features(*responses)
+
+
+def prefetch_district_weather(districts=None, workers=8, timeout=REQUEST_TIMEOUT):
+    """Fetch and store weather for the districts; returns the saved features and the errors, by district"""
+    districts = districts or list(DISTRICT_COORDINATES)
+    fetched, failures = {}, {}
+    with _session(workers) as session, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fetch_district, session, district, timeout): district for district in districts}
+        for future in as_completed(futures):
+            district = futures[future]
+            try:
+                fetched[district] = future.result()
+            except (requests.RequestException, ValueError, KeyError) as e:
+                # Error messages include the request URL; keep the key out of logs
+                failures[district] = str(e).replace(settings.WEATHER_API_KEY, '***') if settings.WEATHER_API_KEY else str(e)
+
+    # Written from this thread in one transaction; SQLite allows a single writer
+    fetched_at = timezone.now()
+    with transaction.atomic():
+        for district, features in fetched.items():
+            DistrictWeather.objects.update_or_create(district=district, defaults={'fetched_at': fetched_at, **features})
+    district_weather.invalidate()
+    return fetched, failures
+
+
+def yield_factor(weather, farm_input):
+    """Yield multiplier for a farm from its district's forecast"""
+    if farm_input.season not in SEASON_MONTHS or timezone.localtime(weather.fetched_at).month not in SEASON_MONTHS[farm_input.season]:
+        return 1.0
+
+    factor = 1.0
+    if farm_input.irrigation == 'none':
+        # Rainfed crops depend on the rain that is coming
+        if farm_input.season == 'kharif' and weather.rain_5d < 10:
+            factor *= 0.95
+        elif weather.rain_5d >= 25:
+            factor *= 1.03
+    if weather.rain_5d >= 150 and farm_input.crop not in ('rice', 'sugarcane'):
+        # Waterlogging
+        factor *= 0.95
+    if weather.hot_days >= 4:
+        factor *= 0.94
+    elif weather.hot_days >= 2:
+        factor *= 0.97
+    if farm_input.pest_presence and weather.humidity_mean_5d >= 85:
+        # Humid spells help pests and disease spread
+        factor *= 0.97
+    return min(max(factor, FACTOR_RANGE[0]), FACTOR_RANGE[1])
+
+
+class DistrictWeatherTable:
+    """In-memory copy of the DistrictWeather rows, reloaded every `refresh_seconds`"""
+
+    def __init__(self, refresh_seconds=300):
+        self.refresh_seconds = refresh_seconds
+        self._rows = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def get(self, district):
+        """The district's weather, or None when missing or older than MAX_AGE"""
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds:
+            with self._lock:
+                if self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds:
+                    self._rows = {row.district: row for row in DistrictWeather.objects.all()}
+                    self._loaded_at = time.monotonic()
+        weather = self._rows.get(district)
+        if weather is None or timezone.now() - weather.fetched_at > MAX_AGE:
+            return None
+        return weather
+
+    def factor(self, farm_input):
+        weather = self.get(farm_input.district)
+        return yield_factor(weather, farm_input) if weather else 1.0
+
+
+district_weather = DistrictWeatherTable()
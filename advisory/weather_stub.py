@@ -0,0 +1,137 @@
+"""
+Stand-in for the OpenWeatherMap endpoints used by the weather views, for
+load tests and local development without an API key.
+
+    python -m advisory.weather_stub --port 8089 --delay-ms 100
+    WEATHER_API_KEY=stub WEATHER_API_BASE_URL=http://127.0.0.1:8089 python manage.py runserver
+
+Serves /weather (current conditions) and /forecast (5 days, 3-hourly) in the
+OpenWeatherMap response format. Values are deterministic for a given location
+and day, and --delay-ms simulates the upstream round trip. Needs only the
+standard library, so it can run next to any server under test.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CONDITIONS = [
+    ('clear sky', '01d'),
+    ('few clouds', '02d'),
+    ('scattered clouds', '03d'),
+    ('overcast clouds', '04d'),
+    ('light rain', '10d'),
+    ('moderate rain', '10d'),
+    ('heavy intensity rain', '10d'),
+    ('thunderstorm', '11d'),
+]
+
+
+def _rng(location, day):
+    seed = hashlib.sha256(f'{location.lower()}|{day.isoformat()}'.encode()).digest()
+    return random.Random(int.from_bytes(seed[:8], 'big'))
+
+
+def _conditions(location, moment):
+    """Temperature, humidity, wind and sky for a location at a given time"""
+    rng = _rng(location, moment.date())
+    base = rng.uniform(24, 34)
+    # Warmest mid-afternoon, coolest before dawn
+    temp = base + 4 * (1 - abs(moment.hour - 15) / 12)
+    description, icon = CONDITIONS[rng.randrange(len(CONDITIONS))]
+    return {
+        'main': {
+            'temp': round(temp, 2),
+            'feels_like': round(temp + rng.uniform(0, 3), 2),
+            'temp_min': round(temp - rng.uniform(0, 2), 2),
+            'temp_max': round(temp + rng.uniform(0, 2), 2),
+            'pressure': rng.randint(998, 1012),
+            'humidity': rng.randint(55, 95),
+        },
+        'weather': [{'main': description.split()[-1].title(), 'description': description, 'icon': icon}],
+        'wind': {'speed': round(rng.uniform(0.5, 8), 2), 'deg': rng.randrange(360)},
+        'rain': {'3h': round(rng.uniform(0, 12), 1)} if 'rain' in description or 'thunder' in description else {},
+    }
+
+
+def current_weather(location, now=None):
+    now = now or datetime.now(timezone.utc)
+    return {'name': location, 'cod': 200, 'dt': int(now.timestamp()), **_conditions(location, now)}
+
+
+def forecast(location, now=None):
+    now = now or datetime.now(timezone.utc)
+    start = now.replace(hour=now.hour - now.hour % 3, minute=0, second=0, microsecond=0) + timedelta(hours=3)
+    items = []
+    for step in range(40):
+        moment = start + timedelta(hours=3 * step)
+        items.append({
+            'dt': int(moment.timestamp()),
+            'dt_txt': moment.strftime('%Y-%m-%d %H:%M:%S'),
+            **_conditions(location, moment),
+        })
+    return {'cod': '200', 'cnt': len(items), 'list': items, 'city': {'name': location}}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    delay = 0.0
+    endpoints = {'/weather': current_weather, '/forecast': forecast}
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        endpoint = self.endpoints.get(url.path.rstrip('/').rsplit('/data/2.5', 1)[-1])
+        if 'lat' in params and 'lon' in params:
+            location = f"{params['lat'][0]},{params['lon'][0]}"
+        else:
+            location = params.get('q', [''])[0]
+
+        if endpoint is None:
+            status, body = 404, {'cod': '404', 'message': 'Not found'}
+        elif not params.get('appid'):
+            status, body = 401, {'cod': 401, 'message': 'Invalid API key.'}
+        elif not location:
+            status, body = 400, {'cod': '400', 'message': 'Nothing to geocode'}
+        else:
+            status, body = 200, endpoint(location)
+
+        if self.delay:
+            time.sleep(self.delay)
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(host='127.0.0.1', port=0, delay_ms=0):
+    """Serve the stub from a daemon thread; returns the server (server_address has the real port)"""
+    handler = type('Handler', (StubHandler,), {'delay': delay_ms / 1000})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve fake OpenWeatherMap responses")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--delay-ms', type=float, default=0, help="Added latency per response")
+    args = parser.parse_args()
+    server = start_stub(args.host, args.port, args.delay_ms)
+    print(f"Weather stub on http://{args.host}:{server.server_address[1]} (Ctrl-C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -48,12 +48,21 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'advisory.context_processors.pwa',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'agri_platform.wsgi.application'
+ASGI_APPLICATION = 'agri_platform.asgi.application'
+
+# Route the form, recommendation and weather pages to advisory/async_views.py.
+# Enable when serving agri_platform.asgi with uvicorn workers.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False').lower() == 'true'
+
+# Threads per worker process for model inference in the async views
+PREDICTION_WORKERS = int(os.getenv('PREDICTION_WORKERS', '4'))
 
 DATABASES = {
     'default': {
@@ -97,6 +106,29 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Local per-process cache; also holds the rate limiter's token buckets
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'agri-platform',
+    }
+}
+
+# Token buckets per user and per client IP: `burst` requests at once,
+# refilled at `per_minute` requests per minute
+RATE_LIMITS = {
+    'farm_input': {'burst': 5, 'per_minute': 6},
+    'weather': {'burst': 10, 'per_minute': 20},
+    'sync': {'burst': 5, 'per_minute': 10},
+    'plan': {'burst': 5, 'per_minute': 10},
+}
+
+# Multiplies every burst and per-minute limit; 0 turns rate limiting off (load tests only)
+RATE_LIMIT_SCALE = float(os.getenv('RATE_LIMIT_SCALE', '1'))
+
+# Only enable behind a reverse proxy that sets X-Forwarded-For itself
+RATE_LIMIT_TRUST_FORWARDED_FOR = os.getenv('RATE_LIMIT_TRUST_FORWARDED_FOR', 'False').lower() == 'true'
+
 # Twilio Credentials (replace with your actual credentials or set as environment variables)
 TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
 TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
@@ -108,3 +140,23 @@ DEVELOPER_MOBILE_NUMBER = os.getenv('DEVELOPER_MOBILE_NUMBER')
 # Weather API Configuration
 WEATHER_API_KEY = os.getenv('WEATHER_API_KEY')
 WEATHER_API_BASE_URL = os.getenv('WEATHER_API_BASE_URL')
+
+# Adjust predicted yields with the district forecasts stored by
+# `manage.py prefetch_weather` (see advisory/weather.py)
+WEATHER_ADJUSTMENTS = os.getenv('WEATHER_ADJUSTMENTS', 'False').lower() == 'true'
+
+# Offline (PWA) mode: a service worker caches the form, and the browser predicts
+# from per-district bundles while offline (see advisory/offline.py). Bump
+# OFFLINE_CACHE_VERSION when offline.js or the cached pages change.
+PWA_ENABLED = os.getenv('PWA_ENABLED', 'False').lower() == 'true'
+OFFLINE_CACHE_VERSION = '2'
+
+# Farm inputs unlike the historical records are flagged for review in the
+# admin (advisory/anomalies.py). With this on, implausible field areas are
+# also rejected as form errors.
+REJECT_INPUT_ANOMALIES = os.getenv('REJECT_INPUT_ANOMALIES', 'False').lower() == 'true'
+
+# Serve predictions from the trained model (advisory/models/farm_model) for the
+# crops it covers. Off by default until it beats the rule engine in
+# `manage.py evaluate_models`.
+USE_TRAINED_MODEL = os.getenv('USE_TRAINED_MODEL', 'False').lower() == 'true'
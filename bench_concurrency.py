@@ -0,0 +1,129 @@
+"""
+Concurrency benchmark for the WSGI and ASGI deployments.
+
+Start the server under test, then point this script at it, e.g.
+
+    gunicorn agri_platform.wsgi:application -w 4 --threads 8
+    python bench_concurrency.py --label wsgi --username demo --password ...
+
+    ASYNC_VIEWS=true gunicorn agri_platform.asgi:application -w 4 -k uvicorn.workers.UvicornWorker
+    python bench_concurrency.py --label asgi --username demo --password ...
+
+The script logs in, submits one farm input, then has N concurrent clients
+request the resulting recommendation page for a fixed number of rounds.
+"""
+import argparse
+import asyncio
+import json
+import re
+import time
+
+import httpx
+
+CSRF_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+FARM_INPUT = {
+    'district': 'khordha',
+    'crop': 'rice',
+    'season': 'kharif',
+    'sowing_date': '2024-06-20',
+    'field_area': '2.5',
+    'irrigation': 'canal',
+    'soil_type': 'alluvial',
+    'soil_health_card': 'on',
+    'seed_variety': 'hybrid',
+}
+
+
+async def _post_form(client, url, data):
+    page = await client.get(url)
+    match = CSRF_RE.search(page.text)
+    if not match:
+        raise SystemExit(f"No CSRF token on {url} (status {page.status_code})")
+    return await client.post(url, data={**data, 'csrfmiddlewaretoken': match.group(1)}, headers={'Referer': str(page.url)})
+
+
+async def login_and_submit(base_url, username, password):
+    """Session cookies and the URL of a freshly generated recommendation"""
+    async with httpx.AsyncClient(base_url=base_url, follow_redirects=False, timeout=30) as client:
+        response = await _post_form(client, '/login/', {'username': username, 'password': password})
+        if response.status_code != 302:
+            raise SystemExit(f"Login failed (status {response.status_code})")
+        response = await _post_form(client, '/input/', FARM_INPUT)
+        location = response.headers.get('location', '')
+        if response.status_code != 302 or '/recommendation/' not in location:
+            raise SystemExit(f"Farm input was not accepted (status {response.status_code})")
+        return dict(client.cookies), location
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run_level(base_url, path, cookies, concurrency, rounds, timeout):
+    """Requests per second, latency percentiles (ms) and error count at one concurrency level"""
+    latencies = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, cookies=cookies, limits=limits, timeout=timeout) as client:
+        async def worker():
+            nonlocal errors
+            for _ in range(rounds):
+                start = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    if response.status_code != 200:
+                        errors += 1
+                        continue
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'concurrency': concurrency,
+        'requests': concurrency * rounds,
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50), 1),
+        'p95_ms': round(percentile(latencies, 95), 1),
+        'p99_ms': round(percentile(latencies, 99), 1),
+    }
+
+
+async def main(args):
+    cookies, path = await login_and_submit(args.url, args.username, args.password)
+    results = []
+    print(f"{'clients':>8} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for concurrency in args.concurrency:
+        result = await run_level(args.url, path, cookies, concurrency, args.rounds, args.timeout)
+        results.append(result)
+        print(f"{result['concurrency']:>8} {result['rps']:>8} {result['p50_ms']:>8} "
+              f"{result['p95_ms']:>8} {result['p99_ms']:>8} {result['errors']:>7}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'label': args.label, 'url': args.url, 'path': path, 'results': results}, f, indent=2)
+        print(f"Saved results to {args.output}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare WSGI and ASGI deployments under concurrent load")
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--label', default='server', help="Name stored with the results, e.g. wsgi or asgi")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[100, 250, 500, 1000])
+    parser.add_argument('--rounds', type=int, default=5, help="Requests per client at each level")
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    asyncio.run(main(parser.parse_args()))
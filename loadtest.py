@@ -0,0 +1,400 @@
+"""
+Peak-season load test with a synthetic farmer workload.
+
+Each virtual farmer has its own session: it signs up (or logs in) through the
+login/signup views, then repeatedly opens the farm input form, submits a
+farm sampled from combined_tables.txt, follows the redirect to the
+recommendation and checks the weather for its district. The test is run at
+increasing numbers of concurrent farmers, reporting throughput, latency
+percentiles and error rates at each level.
+
+The script can start the server itself, pointed at advisory.weather_stub so
+no weather API key is needed:
+
+    python loadtest.py --server runserver
+    python loadtest.py --server gunicorn --workers 4 --threads 8
+    python loadtest.py --server uvicorn --workers 4 --concurrency 50 100 200 400
+
+or test a server that is already running (start it with
+WEATHER_API_BASE_URL pointing at `python -m advisory.weather_stub`):
+
+    python loadtest.py --url http://127.0.0.1:8000
+
+Apply migrations first; synthetic accounts (loadfarmer00000, ...) are reused
+between runs. A synthetic farmer submits far more often than a real one (the
+farm_input limit allows 6 submits a minute), so a server the script starts
+runs with rate limiting off. Pass --rate-limit-scale 1 to keep the production
+limits; the script then sets RATE_LIMIT_TRUST_FORWARDED_FOR=true and gives
+every farmer its own X-Forwarded-For address, so the per-IP limits apply per
+farmer, as they would in the field. Throttled (429) responses are reported
+apart from errors.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+import httpx
+
+from advisory.features import FEATURE_CODES
+from advisory.weather_stub import start_stub
+from bench_concurrency import percentile
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(BASE_DIR, 'combined_tables.txt')
+
+CSRF_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+# Sowing windows (month, day) per season
+SOWING_WINDOWS = {
+    'kharif': ((6, 15), (7, 31)),
+    'rabi': ((11, 1), (12, 31)),
+    'zaid': ((2, 15), (3, 31)),
+}
+
+# Not in the yield table; rough shares of farmers with a soil health card and
+# reporting pests
+SOIL_HEALTH_CARD_RATE = 0.4
+PEST_PRESENCE_RATE = 0.25
+
+
+class Workload:
+    """Farm inputs drawn from the rows of the yield table, keeping their correlations"""
+
+    def __init__(self, path, season=None):
+        fields = ['district', 'crop', 'season', 'irrigation', 'soil_type', 'seed_variety']
+        self.rows = []
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f, delimiter='\t'):
+                if season and row['season'] != season:
+                    continue
+                if all(row[field] in FEATURE_CODES[field] for field in fields):
+                    try:
+                        area = float(row['field_area'])
+                    except ValueError:
+                        continue
+                    if area > 0:
+                        self.rows.append({**{field: row[field] for field in fields}, 'field_area': f'{area:.2f}'})
+        if not self.rows:
+            raise SystemExit(f"No usable rows in {path}" + (f" for season {season}" if season else ""))
+
+    def sample(self, rng):
+        farm = dict(rng.choice(self.rows))
+        (start_month, start_day), (end_month, end_day) = SOWING_WINDOWS[farm['season']]
+        year = date.today().year
+        start = date(year, start_month, start_day)
+        span = (date(year, end_month, end_day) - start).days
+        farm['sowing_date'] = (start + timedelta(days=rng.randint(0, span))).isoformat()
+        if rng.random() < SOIL_HEALTH_CARD_RATE:
+            farm['soil_health_card'] = 'on'
+        if rng.random() < PEST_PRESENCE_RATE:
+            farm['pest_presence'] = 'on'
+        return farm
+
+    def summary(self):
+        return {
+            'rows': len(self.rows),
+            'crops': dict(Counter(row['crop'] for row in self.rows).most_common()),
+            'seasons': dict(Counter(row['season'] for row in self.rows).most_common()),
+        }
+
+
+class Stats:
+    """Latencies of successful requests, errors and throttled requests per step"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)
+        self.throttled = Counter()
+        self.visits = 0
+
+    def requests(self, steps=None):
+        steps = steps or self.latencies.keys() | self.errors.keys() | self.throttled.keys()
+        return sum(len(self.latencies[s]) + sum(self.errors[s].values()) + self.throttled[s] for s in steps)
+
+    def report(self, steps, elapsed):
+        latencies = sorted(ms for step in steps for ms in self.latencies[step])
+        requests = self.requests(steps)
+        errors = sum(sum(self.errors[step].values()) for step in steps)
+        throttled = sum(self.throttled[step] for step in steps)
+        return {
+            'requests': requests,
+            'visits': self.visits,
+            'elapsed_s': round(elapsed, 2),
+            'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+            'visits_per_s': round(self.visits / elapsed, 2) if elapsed else 0.0,
+            'p50_ms': round(percentile(latencies, 50), 1),
+            'p95_ms': round(percentile(latencies, 95), 1),
+            'p99_ms': round(percentile(latencies, 99), 1),
+            'error_rate': round(errors / requests, 4) if requests else 0.0,
+            'throttled_rate': round(throttled / requests, 4) if requests else 0.0,
+            'steps': {
+                step: {
+                    'ok': len(self.latencies[step]),
+                    'errors': dict(self.errors[step]),
+                    'throttled': self.throttled[step],
+                    'p50_ms': round(percentile(sorted(self.latencies[step]), 50), 1),
+                    'p95_ms': round(percentile(sorted(self.latencies[step]), 95), 1),
+                    'p99_ms': round(percentile(sorted(self.latencies[step]), 99), 1),
+                }
+                for step in steps if self.requests([step])
+            },
+        }
+
+
+async def _request(client, stats, step, method, url, expect, check=None, **kwargs):
+    """The response if its status is in `expect` (and it passed `check`), else None; recorded in `stats`"""
+    start = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+    except httpx.TimeoutException:
+        stats.errors[step]['timeout'] += 1
+        return None
+    except httpx.HTTPError as e:
+        stats.errors[step][type(e).__name__] += 1
+        return None
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    if response.status_code == 429:
+        stats.throttled[step] += 1
+    elif response.status_code not in expect:
+        stats.errors[step][f'HTTP {response.status_code}'] += 1
+    elif check and not check(response):
+        stats.errors[step]['bad content'] += 1
+    else:
+        stats.latencies[step].append(elapsed_ms)
+        return response
+    return None
+
+
+async def _post_form(client, stats, page_step, step, url, data, expect):
+    """GET the form page for its CSRF token, then POST `data` to it"""
+    page = await _request(client, stats, page_step, 'GET', url, (200,))
+    if page is None:
+        return None
+    match = CSRF_RE.search(page.text)
+    if not match:
+        stats.errors[step]['no CSRF token'] += 1
+        return None
+    return await _request(client, stats, step, 'POST', url, expect, data={**data, 'csrfmiddlewaretoken': match.group(1)})
+
+
+def synthetic_ip(index):
+    return f'10.{(index >> 16) & 255}.{(index >> 8) & 255}.{index & 255}'
+
+
+async def open_session(base_url, index, args, stats):
+    """A logged-in client for virtual farmer `index`, signing it up on first use"""
+    client = httpx.AsyncClient(
+        base_url=base_url, timeout=args.timeout, follow_redirects=False,
+        headers={'X-Forwarded-For': synthetic_ip(index)},
+    )
+    username = f'{args.user_prefix}{index:05d}'
+    credentials = {'username': username, 'password': args.password}
+    # LoginView re-renders the form (200) for unknown users
+    response = await _post_form(client, stats, 'login', 'login', '/login/', credentials, (200, 302))
+    if response is not None and response.status_code == 302:
+        return client
+    response = await _post_form(client, stats, 'signup', 'signup', '/signup/', {
+        'username': username, 'email': f'{username}@example.com',
+        'password1': args.password, 'password2': args.password,
+    }, (302,))
+    if response is None:
+        await client.aclose()
+        return None
+    return client
+
+
+def _weather_ok(response):
+    return 'alert-danger' not in response.text
+
+
+async def visit(client, workload, rng, stats):
+    """One farmer visit: form, submission, recommendation, weather"""
+    farm = workload.sample(rng)
+    response = await _post_form(client, stats, 'form', 'submit', '/input/', farm, (302,))
+    if response is not None:
+        location = response.headers.get('location', '')
+        if '/recommendation/' in location:
+            await _request(client, stats, 'recommendation', 'GET', location, (200,))
+        else:
+            stats.errors['submit'][f'redirected to {location or "nowhere"}'] += 1
+    await _request(client, stats, 'weather', 'GET', '/weather/', (200,), check=_weather_ok,
+                   params={'location': farm['district'].title()})
+    stats.visits += 1
+
+
+async def run_level(sessions, workload, args, seed):
+    """Every session visits repeatedly for args.duration seconds"""
+    stats = Stats()
+    deadline = time.monotonic() + args.duration
+
+    async def farmer(client, rng):
+        # Stagger the first visits so the level does not open with a burst
+        await asyncio.sleep(rng.uniform(0, args.think_ms / 1000))
+        while time.monotonic() < deadline:
+            await visit(client, workload, rng, stats)
+            if args.think_ms:
+                await asyncio.sleep(min(rng.expovariate(1000 / args.think_ms), max(0.0, deadline - time.monotonic())))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(farmer(client, random.Random(seed * 100003 + i)) for i, client in enumerate(sessions)))
+    return stats, time.perf_counter() - start
+
+
+def launch_server(args, weather_url, log):
+    host, port = args.host, str(args.port)
+    commands = {
+        'runserver': [sys.executable, 'manage.py', 'runserver', f'{host}:{port}', '--noreload'],
+        'gunicorn': ['gunicorn', 'agri_platform.wsgi:application', '--bind', f'{host}:{port}',
+                     '--workers', str(args.workers), '--threads', str(args.threads)],
+        'uvicorn': ['uvicorn', 'agri_platform.asgi:application', '--host', host, '--port', port,
+                    '--workers', str(args.workers), '--no-access-log'],
+    }
+    env = {
+        **os.environ,
+        'WEATHER_API_KEY': os.environ.get('LOADTEST_WEATHER_API_KEY', 'stub'),
+        'WEATHER_API_BASE_URL': weather_url,
+        'RATE_LIMIT_TRUST_FORWARDED_FOR': 'true',
+        'RATE_LIMIT_SCALE': str(args.rate_limit_scale),
+    }
+    if args.server == 'uvicorn':
+        env.setdefault('ASYNC_VIEWS', 'true')
+    return subprocess.Popen(commands[args.server], cwd=BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_until_ready(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            if httpx.get(url + '/', timeout=2).status_code < 500:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def _print_level(concurrency, result):
+    steps = result['steps']
+    print(f"{concurrency:>8} {result['rps']:>8} {result['visits_per_s']:>9} {result['p50_ms']:>8} "
+          f"{result['p95_ms']:>8} {result['p99_ms']:>8} {result['error_rate']:>7.2%} {result['throttled_rate']:>7.2%}  "
+          + '  '.join(f"{step} {steps[step]['p95_ms']}" for step in ('submit', 'recommendation', 'weather') if step in steps))
+
+
+async def main(args):
+    workload = Workload(args.data, None if args.season == 'all' else args.season)
+    print(f"Workload: {len(workload.rows)} farms from {os.path.basename(args.data)} (season: {args.season})")
+
+    server = log = stub = None
+    base_url = args.url
+    if args.server != 'none':
+        stub = start_stub(delay_ms=args.weather_delay_ms)
+        weather_url = f'http://127.0.0.1:{stub.server_address[1]}'
+        log = tempfile.NamedTemporaryFile('w+', prefix=f'loadtest-{args.server}-', suffix='.log', delete=False)
+        server = launch_server(args, weather_url, log)
+        base_url = f'http://{args.host}:{args.port}'
+        print(f"Started {args.server} on {base_url} (log: {log.name}), weather stub on {weather_url}")
+        if not wait_until_ready(base_url, server):
+            server.kill()
+            log.seek(0)
+            raise SystemExit(f"{args.server} did not start:\n{log.read()[-3000:]}")
+
+    sessions = []
+    setup_stats = Stats()
+    levels = []
+    try:
+        print(f"{'farmers':>8} {'req/s':>8} {'visits/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'errors':>7} {'429s':>7}  p95 ms by step")
+        for level, concurrency in enumerate(args.concurrency):
+            # Log in the extra farmers this level needs; they stay logged in for later levels
+            setup_start = time.perf_counter()
+            limit = asyncio.Semaphore(args.setup_concurrency)
+
+            async def login(index):
+                async with limit:
+                    return await open_session(base_url, index, args, setup_stats)
+
+            new = await asyncio.gather(*(login(i) for i in range(len(sessions), concurrency)))
+            sessions.extend(client for client in new if client is not None)
+            if len(sessions) < concurrency:
+                raise SystemExit(f"Only {len(sessions)} of {concurrency} farmers could log in: "
+                                 f"{dict(setup_stats.errors['signup'])}")
+            setup_s = time.perf_counter() - setup_start
+
+            stats, elapsed = await run_level(sessions[:concurrency], workload, args, seed=args.seed + level)
+            result = {'concurrency': concurrency, 'setup_s': round(setup_s, 2),
+                      **stats.report(['form', 'submit', 'recommendation', 'weather'], elapsed)}
+            levels.append(result)
+            _print_level(concurrency, result)
+            if result['error_rate'] > args.max_error_rate:
+                print(f"Stopping: error rate {result['error_rate']:.2%} is above {args.max_error_rate:.2%}")
+                break
+    finally:
+        await asyncio.gather(*(client.aclose() for client in sessions))
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+            log.close()
+        if stub is not None:
+            stub.shutdown()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'server': args.server,
+                'url': base_url,
+                'workers': args.workers if args.server in ('gunicorn', 'uvicorn') else None,
+                'threads': args.threads if args.server == 'gunicorn' else None,
+                'duration_s': args.duration,
+                'think_ms': args.think_ms,
+                'rate_limit_scale': args.rate_limit_scale if args.server != 'none' else None,
+                'weather_delay_ms': args.weather_delay_ms if stub else None,
+                'workload': workload.summary(),
+                'accounts': setup_stats.report(['login', 'signup'], 1.0)['steps'],
+                'levels': levels,
+            }, f, indent=2)
+        print(f"Saved results to {args.output}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load test the site with synthetic farmers at increasing concurrency")
+    parser.add_argument('--server', choices=['none', 'runserver', 'gunicorn', 'uvicorn'], default='none',
+                        help="Start this server for the test (default: use --url)")
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help="Server to test when --server is none")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765, help="Port for the started server")
+    parser.add_argument('--workers', type=int, default=4, help="gunicorn/uvicorn worker processes")
+    parser.add_argument('--threads', type=int, default=8, help="gunicorn threads per worker")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[25, 50, 100, 200],
+                        help="Concurrent farmers at each level")
+    parser.add_argument('--duration', type=float, default=60, help="Seconds per level")
+    parser.add_argument('--think-ms', type=float, default=2000, help="Mean pause between a farmer's visits")
+    parser.add_argument('--season', choices=['kharif', 'rabi', 'zaid', 'all'], default='kharif',
+                        help="Sample farms from this season's rows")
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--rate-limit-scale', type=float, default=0,
+                        help="RATE_LIMIT_SCALE for the started server: 0 turns the limits off, 1 keeps production limits")
+    parser.add_argument('--weather-delay-ms', type=float, default=100, help="Simulated weather API latency")
+    parser.add_argument('--user-prefix', default='loadfarmer')
+    parser.add_argument('--password', default='Kharif-Peak-Load-2024')
+    parser.add_argument('--setup-concurrency', type=int, default=8, help="Parallel logins/signups")
+    parser.add_argument('--timeout', type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument('--max-error-rate', type=float, default=0.05, help="Stop escalating above this error rate")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    asyncio.run(main(parser.parse_args()))
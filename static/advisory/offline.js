@@ -0,0 +1,335 @@
+/*
+ * Offline mode for the farm input form (PWA_ENABLED, see advisory/offline.py).
+ *
+ * - Registers the service worker, which caches the form, static assets and
+ *   district bundles.
+ * - Submits the form with fetch; if the network fails, predicts from the
+ *   district's bundle in the browser and queues the entry.
+ * - Sends queued entries to the server in one batch once back online.
+ */
+(function () {
+    'use strict';
+
+    const SUBMIT_TIMEOUT_MS = 15000;
+    const SYNC_BATCH = 100;
+    const config = document.currentScript.dataset;
+    // Per user, so entries queued by one user are never synced to another's account
+    const QUEUE_KEY = `krishi-offline-queue-${config.user}`;
+
+    if ('serviceWorker' in navigator) {
+        navigator.serviceWorker.register(config.swUrl).catch(error => console.warn('Service worker registration failed', error));
+    }
+
+    function bundleUrl(district) {
+        return config.bundleUrl.replace('__district__', encodeURIComponent(district));
+    }
+
+    function csrfToken() {
+        const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+        if (match) {
+            return decodeURIComponent(match[1]);
+        }
+        const input = document.querySelector('input[name="csrfmiddlewaretoken"]');
+        return input ? input.value : '';
+    }
+
+    function newClientId() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        const bytes = crypto.getRandomValues(new Uint8Array(16));
+        bytes[6] = (bytes[6] & 0x0f) | 0x40;
+        bytes[8] = (bytes[8] & 0x3f) | 0x80;
+        const hex = Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+        return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+    }
+
+    function loadQueue() {
+        try {
+            return JSON.parse(localStorage.getItem(QUEUE_KEY)) || [];
+        } catch (error) {
+            return [];
+        }
+    }
+
+    function saveQueue(queue) {
+        localStorage.setItem(QUEUE_KEY, JSON.stringify(queue));
+        updateStatus();
+    }
+
+    async function loadBundle(district) {
+        const response = await fetch(bundleUrl(district), {credentials: 'same-origin'});
+        if (!response.ok) {
+            throw new Error(`Bundle for ${district}: HTTP ${response.status}`);
+        }
+        return response.json();
+    }
+
+    // Same lookup as RuleTable.evaluate: C-order index over the bundle dimensions
+    function predict(bundle, values) {
+        let index = 0;
+        for (const dimension of bundle.dimensions) {
+            const position = dimension.values.indexOf(String(values[dimension.field]));
+            if (position < 0) {
+                throw new Error(`Unknown ${dimension.field}: ${values[dimension.field]}`);
+            }
+            index = index * dimension.values.length + position;
+        }
+        const predicted = bundle.yield[index];
+        const result = {
+            predicted_yield: predicted,
+            confidence_interval: '±' + Math.round(predicted * bundle.confidence_fraction),
+            estimated_gain: bundle.estimated_gain[index],
+            bundle_version: bundle.version,
+        };
+        for (const action of Object.keys(bundle.actions)) {
+            result[action] = bundle.texts[bundle.actions[action][index]]
+                .replace('{crop}', (bundle.crop_labels || {})[values.crop] || values.crop);
+        }
+        Object.assign(result, bundle.by_crop_season[`${values.crop}|${values.season}`] || {});
+        return result;
+    }
+
+    function formValues(form) {
+        const data = new FormData(form);
+        const values = {};
+        for (const field of ['district', 'crop', 'season', 'sowing_date', 'field_area', 'irrigation', 'soil_type', 'seed_variety']) {
+            values[field] = data.get(field);
+        }
+        values.soil_health_card = Boolean(form.elements.soil_health_card && form.elements.soil_health_card.checked);
+        values.pest_presence = Boolean(form.elements.pest_presence && form.elements.pest_presence.checked);
+        return values;
+    }
+
+    function clientIdInput(form) {
+        let input = form.querySelector('input[name="client_id"]');
+        if (!input) {
+            input = document.createElement('input');
+            input.type = 'hidden';
+            input.name = 'client_id';
+            input.value = newClientId();
+            form.appendChild(input);
+        }
+        return input;
+    }
+
+    function panel(id, form) {
+        let element = document.getElementById(id);
+        if (!element) {
+            element = document.createElement('div');
+            element.id = id;
+            form.closest('.card').insertAdjacentElement('afterend', element);
+        }
+        return element;
+    }
+
+    function addText(parent, tag, text, className) {
+        const element = document.createElement(tag);
+        element.textContent = text;
+        if (className) {
+            element.className = className;
+        }
+        parent.appendChild(element);
+        return element;
+    }
+
+    function selectedLabel(form, field) {
+        const select = form.elements[field];
+        return select && select.selectedIndex >= 0 ? select.options[select.selectedIndex].text : '';
+    }
+
+    function showResult(form, values, result) {
+        const container = panel('offlineResult', form);
+        container.replaceChildren();
+        const card = addText(container, 'div', '', 'card border-0 shadow-lg mt-4');
+        const body = addText(card, 'div', '', 'card-body p-4');
+        addText(body, 'h4', 'Offline estimate', 'mb-1');
+        addText(body, 'p', `${selectedLabel(form, 'crop')}, ${selectedLabel(form, 'district')}, ${selectedLabel(form, 'season')}. ` +
+            'Calculated on this device; it will be saved to your history when you are back online.', 'text-muted small');
+
+        const figures = addText(body, 'div', '', 'row g-3 text-center mb-3');
+        const area = parseFloat(values.field_area) || 0;
+        for (const [label, value] of [
+            ['Predicted yield (kg/ha)', `${result.predicted_yield} ${result.confidence_interval}`],
+            ['Expected gain', `${result.estimated_gain.toFixed(1)}%`],
+            ['Total (kg)', Math.round(result.predicted_yield * area)],
+            ['District average (kg/ha)', result.district_avg ? Math.round(result.district_avg) : '-'],
+        ]) {
+            const column = addText(figures, 'div', '', 'col-6 col-md-3');
+            addText(column, 'div', String(value), 'fs-5 fw-bold');
+            addText(column, 'div', label, 'small text-muted');
+        }
+
+        const list = addText(body, 'ol', '', 'mb-0');
+        for (const action of ['action_1', 'action_2', 'action_3']) {
+            addText(list, 'li', result[action], 'mb-2');
+        }
+        container.scrollIntoView({behavior: 'smooth'});
+    }
+
+    function showMessage(form, text, level) {
+        const container = panel('offlineResult', form);
+        container.replaceChildren();
+        addText(container, 'div', text, `alert alert-${level} mt-4`);
+    }
+
+    function updateStatus() {
+        const form = document.getElementById('farmForm');
+        if (!form) {
+            return;
+        }
+        const pending = loadQueue().length;
+        const status = panel('offlineStatus', form);
+        status.replaceChildren();
+        if (pending) {
+            addText(status, 'div', `${pending} offline result${pending === 1 ? '' : 's'} waiting to sync.`, 'alert alert-warning mt-3 mb-0');
+        }
+    }
+
+    async function predictOffline(form) {
+        const values = formValues(form);
+        let bundle;
+        try {
+            bundle = await loadBundle(values.district);
+        } catch (error) {
+            showMessage(form, 'You are offline and this district has not been downloaded yet. ' +
+                'Open this form once while online with the district selected.', 'danger');
+            return;
+        }
+        const result = predict(bundle, values);
+        const input = clientIdInput(form);
+        const queue = loadQueue();
+        queue.push(Object.assign({client_id: input.value, entered_at: new Date().toISOString(), offline: result}, values));
+        saveQueue(queue);
+        // The next submission is a new entry
+        input.value = newClientId();
+        showResult(form, values, result);
+    }
+
+    async function submitOnline(form) {
+        const controller = new AbortController();
+        const timer = setTimeout(() => controller.abort(), SUBMIT_TIMEOUT_MS);
+        try {
+            return await fetch(form.action || location.href, {
+                method: 'POST', body: new FormData(form), credentials: 'same-origin', signal: controller.signal,
+            });
+        } finally {
+            clearTimeout(timer);
+        }
+    }
+
+    async function handleSubmit(event) {
+        const form = event.target;
+        if (form.id !== 'farmForm' || !form.checkValidity()) {
+            return;
+        }
+        event.preventDefault();
+        event.stopPropagation();
+        clientIdInput(form);
+
+        const button = form.querySelector('[type="submit"]');
+        const label = button.innerHTML;
+        button.disabled = true;
+        button.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i>' + label.replace(/<[^>]*>/g, '').trim();
+        try {
+            if (navigator.onLine) {
+                try {
+                    const response = await submitOnline(form);
+                    if (response.redirected) {
+                        location.href = response.url;
+                        return;
+                    }
+                    // Form errors or rate limiting: show the page the server rendered
+                    const html = await response.text();
+                    document.open();
+                    document.write(html);
+                    document.close();
+                    return;
+                } catch (error) {
+                    // Network failure or timeout: fall through to the offline estimate
+                }
+            }
+            await predictOffline(form);
+        } finally {
+            button.disabled = false;
+            button.innerHTML = label;
+        }
+    }
+
+    let syncing = false;
+
+    async function syncQueue() {
+        if (syncing || !navigator.onLine || !loadQueue().length) {
+            return;
+        }
+        syncing = true;
+        try {
+            const batch = loadQueue().slice(0, SYNC_BATCH);
+            const response = await fetch(config.syncUrl, {
+                method: 'POST',
+                credentials: 'same-origin',
+                headers: {'Content-Type': 'application/json', 'X-CSRFToken': csrfToken()},
+                body: JSON.stringify({results: batch}),
+            });
+            if (!response.ok) {
+                return;
+            }
+            const data = await response.json();
+            // created, duplicate and invalid are all final; anything else is retried
+            const finished = new Set(data.results.filter(result => result.status).map(result => result.client_id));
+            saveQueue(loadQueue().filter(item => !finished.has(item.client_id)));
+            const invalid = data.results.filter(result => result.status === 'invalid').length;
+            if (invalid) {
+                console.warn(`${invalid} offline results were rejected by the server`, data.results);
+            }
+            if (loadQueue().length) {
+                syncing = false;
+                return syncQueue();
+            }
+        } catch (error) {
+            // Still offline; try again on the next 'online' event or page load
+        } finally {
+            syncing = false;
+        }
+    }
+
+    function prefetchBundle(district) {
+        if (district && navigator.onLine) {
+            // The service worker keeps the response for offline use
+            loadBundle(district).catch(() => {});
+        }
+    }
+
+    async function handleLogout(event) {
+        const form = event.target;
+        if (new URL(form.action, location.href).pathname !== config.logoutUrl) {
+            return;
+        }
+        event.preventDefault();
+        // Drop cached pages before the next user of this device signs in
+        try {
+            const keys = await caches.keys();
+            await Promise.all(keys.filter(key => key.startsWith('krishi-')).map(key => caches.delete(key)));
+        } catch (error) {
+            console.warn('Could not clear the offline cache', error);
+        }
+        if (navigator.serviceWorker && navigator.serviceWorker.controller) {
+            navigator.serviceWorker.controller.postMessage({type: 'logout'});
+        }
+        // submit() does not fire the submit event again
+        form.submit();
+    }
+
+    document.addEventListener('submit', handleSubmit, true);
+    document.addEventListener('submit', handleLogout, true);
+    window.addEventListener('online', syncQueue);
+    document.addEventListener('DOMContentLoaded', () => {
+        const form = document.getElementById('farmForm');
+        if (form && form.elements.district) {
+            prefetchBundle(form.elements.district.value);
+            form.elements.district.addEventListener('change', event => prefetchBundle(event.target.value));
+        }
+        updateStatus();
+        syncQueue();
+    });
+})();
@@ -0,0 +1,107 @@
+{% load static %}// Service worker for the offline mode (PWA_ENABLED). Rendered by views.service_worker.
+const CACHE = 'krishi-{{ cache_version }}';
+const BUNDLE_PATH = '/offline/bundles/';
+const FORM_URL = '{% url "farm_input" %}';
+// The only pages kept for offline use; others hold personal data (history,
+// recommendations) that must not outlive the session on a shared phone
+const PAGES = [FORM_URL, '{% url "home" %}'];
+const PRECACHE = [
+    ...PAGES,
+    '{% static "advisory/offline.js" %}',
+    '{% static "advisory/icon.svg" %}',
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+    'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css',
+];
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(CACHE)
+            .then(cache => Promise.all(PRECACHE.map(url =>
+                // A missing asset should not stop the worker from installing
+                cache.add(new Request(url, {mode: url.startsWith('http') ? 'no-cors' : 'same-origin'}))
+                    .catch(error => console.warn('Precache failed for', url, error))
+            )))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys()
+            .then(keys => Promise.all(keys.filter(key => key !== CACHE).map(key => caches.delete(key))))
+            .then(() => self.clients.claim())
+    );
+});
+
+async function networkOnly(request, fallbackUrl) {
+    try {
+        return await fetch(request);
+    } catch (error) {
+        const cached = await caches.match(fallbackUrl);
+        if (cached) {
+            return cached;
+        }
+        throw error;
+    }
+}
+
+async function networkFirst(request, fallbackUrl) {
+    const cache = await caches.open(CACHE);
+    try {
+        const response = await fetch(request);
+        if (response.ok) {
+            cache.put(request, response.clone());
+        }
+        return response;
+    } catch (error) {
+        const cached = await cache.match(request, {ignoreSearch: true})
+            || (fallbackUrl && await cache.match(fallbackUrl));
+        if (cached) {
+            return cached;
+        }
+        throw error;
+    }
+}
+
+async function cacheFirst(request) {
+    const cached = await caches.match(request);
+    if (cached) {
+        return cached;
+    }
+    const response = await fetch(request);
+    if (response.ok || response.type === 'opaque') {
+        const cache = await caches.open(CACHE);
+        cache.put(request, response.clone());
+    }
+    return response;
+}
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+    const url = new URL(request.url);
+
+    if (request.mode === 'navigate') {
+        // The form and home page: fresh when online, last copy when not.
+        // Other pages are never stored; offline they fall back to the form.
+        if (url.origin === location.origin && PAGES.includes(url.pathname)) {
+            event.respondWith(networkFirst(request, FORM_URL));
+        } else {
+            event.respondWith(networkOnly(request, FORM_URL));
+        }
+    } else if (url.origin === location.origin && url.pathname.startsWith(BUNDLE_PATH)) {
+        event.respondWith(networkFirst(request));
+    } else if (url.origin !== location.origin || url.pathname.startsWith('{% get_static_prefix %}')) {
+        event.respondWith(cacheFirst(request));
+    }
+});
+
+self.addEventListener('message', event => {
+    if (event.data && event.data.type === 'logout') {
+        // Cached pages carry the user's name; drop everything on logout
+        event.waitUntil(caches.delete(CACHE));
+    }
+});